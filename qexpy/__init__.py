@@ -36,14 +36,16 @@ from .utils import define_unit, clear_unit_definitions
 from .settings import ErrorMethod, PrintStyle, UnitStyle, SigFigMode
 from .settings import get_settings, reset_default_configuration
 from .settings import set_sig_figs_for_value, set_sig_figs_for_error, set_error_method, \
-    set_print_style, set_unit_style, set_monte_carlo_sample_size, set_plot_dimensions
+    set_print_style, set_unit_style, set_monte_carlo_sample_size, set_plot_dimensions, \
+    set_monte_carlo_chunk_size, set_monte_carlo_workers, set_monte_carlo_seed
 
-from .data import Measurement, MeasurementArray, XYDataSet
+from .data import Measurement, MeasurementArray, MeasurementColumn, XYDataSet
+from .data import MeasurementAccumulator, MeasurementArrayBuilder
 from .data import get_covariance, set_covariance, get_correlation, set_correlation
 from .data import sqrt, exp, sin, sind, cos, cosd, tan, tand, sec, secd, cot, cotd, \
     csc, cscd, asin, acos, atan, log, log10, pi, e
 from .data import std, mean, sum  # pylint: disable=redefined-builtin
-from .data import reset_correlations
+from .data import reset_correlations, session, propagate
 
 from .fitting import fit, FitModel
 
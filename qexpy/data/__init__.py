@@ -2,8 +2,11 @@
 
 from .data import MeasuredValue as Measurement
 from .datasets import ExperimentalValueArray as MeasurementArray, XYDataSet
+from .datasets import MeasurementArrayBuilder
+from .columns import MeasuredValueColumn as MeasurementColumn
+from .accumulators import MeasurementAccumulator
 from .data import get_covariance, set_covariance, get_correlation, set_correlation
-from .data import reset_correlations
+from .data import reset_correlations, session, propagate
 from .operations import sqrt, exp, sin, sind, cos, cosd, tan, tand, sec, secd, cot, cotd, \
     csc, cscd, asin, acos, atan, log, log10, pi, e
 from .operations import std, mean, sum_ as sum  # pylint: disable=redefined-builtin
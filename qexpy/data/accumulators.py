@@ -0,0 +1,312 @@
+"""Defines accumulators that record repeated measurements one sample at a time
+
+A RepeatedlyMeasuredValue is created from the complete list of readings, so a reading taken
+in a data acquisition loop means recording the whole list again. An accumulator instead keeps
+running statistics of the readings it has seen, which are updated in constant time with each
+new reading, using the numerically stable updates of Welford's algorithm. A MeasuredValue can
+be taken from the accumulator at any time, as a snapshot of the current statistics.
+
+"""
+
+import warnings
+
+import numpy as np
+
+from collections import deque
+from numbers import Real
+from typing import List, Union
+
+from qexpy.utils import IllegalArgumentError, UndefinedActionError
+
+from . import data as dt  # pylint: disable=cyclic-import
+
+
+class _CoMoment:  # pylint: disable=too-few-public-methods
+    """The running co-moment between the paired readings of two accumulators
+
+    The readings of the two accumulators are paired in the order in which they are added.
+    The accumulator that is ahead leaves the deviation of each of its readings from its
+    previous mean in the queue, until the other accumulator catches up with a reading of its
+    own, which completes the pair.
+
+    """
+
+    def __init__(self):
+        self.comoment = 0.0
+        self.count = 0
+        self.leader = None
+        self.pending = deque()
+
+    def update(self, accumulator: "MeasurementAccumulator", old_delta: float, new_delta: float):
+        """Updates the co-moment with the deviations of a new reading of an accumulator"""
+        if self.pending and self.leader is not accumulator:
+            self.comoment += self.pending.popleft() * new_delta
+            self.count += 1
+        else:
+            self.leader = accumulator
+            self.pending.append(old_delta)
+
+
+class MeasurementAccumulator:  # pylint: disable=too-many-instance-attributes
+    """Running statistics of a series of repeated measurements
+
+    The accumulator is the streaming counterpart of the :py:class:`.RepeatedlyMeasuredValue`.
+    It finds the same statistics without storing the readings, and each new reading is added
+    in constant time and memory.
+
+    Args:
+        unit (str): The unit of the measurements
+        name (str): The name of the measurements
+
+    Examples:
+        >>> import qexpy as q
+
+        >>> a = q.MeasurementAccumulator(unit="m", name="length")
+        >>> for reading in [10, 9.8, 9.9, 10.1, 10.2]:
+        ...     a.add(reading, 0.1)
+        >>> a.mean
+        10.0
+        >>> a.std
+        0.1581138830084187
+        >>> print(a.snapshot())
+        length = 10.00 +/- 0.07 [m]
+
+        >>> # The covariance between two series of readings can be tracked as they are added
+        >>> b = q.MeasurementAccumulator()
+        >>> c = q.MeasurementAccumulator()
+        >>> b.track_covariance(c)
+        >>> b.extend([0.8, 0.9, 1, 1.1])
+        >>> c.extend([2, 2.2, 2.1, 2.3])
+        >>> b.covariance(c)
+        0.013333333333333334
+
+    """
+
+    def __init__(self, unit: str = "", name: str = ""):
+        """Constructor for MeasurementAccumulator"""
+
+        if not isinstance(unit, str):
+            raise TypeError("The unit provided is not a string!")
+        if not isinstance(name, str):
+            raise TypeError("The name provided is not a string!")
+        self.unit, self.name = unit, name
+
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0  # the sum of the squared deviations from the mean
+
+        # The running error weighted mean, where each reading is weighted by the inverse
+        # square of its error. The weights are undefined if any reading has no error.
+        self._weight = 0.0
+        self._weighted_mean = 0.0
+        self._has_zero_error = False
+
+        # The co-moments with the other accumulators, keyed by their ids
+        self._links = {}
+
+        # The most recent snapshot of the accumulator
+        self._snapshot = None  # type: dt.MeasuredValue
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def count(self) -> int:
+        """int: The number of readings added to the accumulator"""
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        """float: The mean of the readings"""
+        return self._mean if self._count else np.nan
+
+    @property
+    def variance(self) -> float:
+        """float: The sample variance of the readings"""
+        return self._m2 / (self._count - 1) if self._count > 1 else np.nan
+
+    @property
+    def std(self) -> float:
+        """float: The standard deviation of the readings"""
+        return float(np.sqrt(self.variance))
+
+    @property
+    def error_on_mean(self) -> float:
+        """float: The error on the mean or the standard error"""
+        return self.std / np.sqrt(self._count) if self._count else np.nan
+
+    @property
+    def error_weighted_mean(self) -> float:
+        """float: Error weighted mean if individual errors are specified"""
+        if self._has_zero_error or not self._count:
+            warnings.warn(
+                "One or more errors are 0, the error weighted mean cannot be calculated.")
+            return np.nan
+        return self._weighted_mean
+
+    @property
+    def propagated_error(self) -> float:
+        """float: Error propagated with errors passed in if present"""
+        if self._has_zero_error or not self._count:
+            warnings.warn(
+                "One or more errors are 0, the propagated error cannot be calculated.")
+            return np.nan
+        return float(1 / np.sqrt(self._weight))
+
+    def add(self, value: Real, error: Real = None):
+        """Adds a reading to the accumulator
+
+        Args:
+            value (Real): the value of the reading
+            error (Real): the uncertainty on the reading
+
+        """
+
+        if not isinstance(value, Real):
+            raise TypeError("Cannot add a {} as a reading!".format(type(value).__name__))
+        self.__add_error(error)
+
+        self._count += 1
+        old_delta = value - self._mean
+        self._mean += old_delta / self._count
+        new_delta = value - self._mean
+        self._m2 += old_delta * new_delta
+
+        if error:
+            weight = 1 / error ** 2
+            self._weight += weight
+            self._weighted_mean += (value - self._weighted_mean) * weight / self._weight
+
+        for _, link in self._links.values():
+            link.update(self, old_delta, new_delta)
+
+    def extend(self, values: List[Real], errors: Union[List[Real], Real] = None):
+        """Adds a series of readings to the accumulator
+
+        Args:
+            values (List): the values of the readings
+            errors (List|Real): the uncertainties on the readings
+
+        """
+
+        values = np.asarray(values, dtype=float)
+        if errors is None or isinstance(errors, Real):
+            errors = np.full(len(values), 0.0 if errors is None else float(errors))
+        errors = np.asarray(errors, dtype=float)
+        if len(errors) != len(values):
+            raise ValueError("The lengths of uncertainties and data do not match")
+        if values.size == 0:
+            return
+
+        if self._links:
+            # The readings have to be paired with the readings of the other accumulators
+            for value, error in zip(values, errors):
+                self.add(float(value), float(error))
+            return
+
+        if np.any(errors < 0):
+            raise ValueError("The uncertainty of any measurement cannot be negative!")
+        if not np.all(errors):
+            self._has_zero_error = True
+
+        # The statistics of the batch are merged with the running statistics
+        count = self._count + len(values)
+        mean = float(np.mean(values))
+        delta = mean - self._mean
+        self._m2 += float(np.sum((values - mean) ** 2)) + delta ** 2 * self._count * len(
+            values) / count
+        self._mean += delta * len(values) / count
+        self._count = count
+
+        if not self._has_zero_error:
+            weights = 1 / errors ** 2
+            weight = float(np.sum(weights))
+            self._weight += weight
+            weighted_mean = float(np.dot(weights, values)) / weight
+            self._weighted_mean += (weighted_mean - self._weighted_mean) * weight / self._weight
+
+    def track_covariance(self, other: "MeasurementAccumulator"):
+        """Tracks the covariance between the readings of this and another accumulator
+
+        The readings of the two accumulators are paired in the order in which they are added,
+        so the covariance has to be tracked before any readings are added to either of them.
+
+        """
+
+        if not isinstance(other, MeasurementAccumulator):
+            raise IllegalArgumentError("Cannot track covariance with non-accumulator values")
+        if other is self or id(other) in self._links:
+            return
+        if self._count or other._count:  # pylint: disable=protected-access
+            raise UndefinedActionError(
+                "The covariance can only be tracked before any readings are added.")
+        link = _CoMoment()
+        self._links[id(other)] = other, link
+        other._links[id(self)] = self, link  # pylint: disable=protected-access
+
+    def covariance(self, other: "MeasurementAccumulator") -> float:
+        """The sample covariance between the paired readings of two accumulators"""
+
+        if id(other) not in self._links:
+            raise UndefinedActionError(
+                "The covariance between these accumulators is not tracked.")
+        _, link = self._links[id(other)]
+        return link.comoment / (link.count - 1) if link.count > 1 else np.nan
+
+    def correlation(self, other: "MeasurementAccumulator") -> float:
+        """The correlation factor between the paired readings of two accumulators"""
+        return self.covariance(other) / (self.std * other.std)
+
+    def snapshot(self) -> "dt.MeasuredValue":
+        """Records the current statistics of the accumulator as a measurement
+
+        The value of the measurement is the mean of the readings, and its uncertainty is the
+        error on the mean. The measurement does not change as more readings are added.
+
+        """
+
+        if not self._count:
+            raise UndefinedActionError("Cannot take a snapshot of an empty accumulator.")
+        self._snapshot = dt.MeasuredValue(
+            self._mean, self.error_on_mean, unit=self.unit, name=self.name)
+        return self._snapshot
+
+    def set_covariance(self, other: "MeasurementAccumulator", cov: Real = None):
+        """Sets the covariance between the latest snapshots of two accumulators
+
+        A snapshot is taken of an accumulator that does not have one yet. If the covariance
+        is not specified, it is found from the covariance between the paired readings of the
+        accumulators, divided by the number of pairs, which is the covariance between their
+        means, just as the uncertainty of a snapshot is the error on the mean.
+
+        """
+
+        if cov is None:
+            cov = self.covariance(other) / self._links[id(other)][1].count
+        # pylint: disable=protected-access
+        dt.set_covariance(self._latest_snapshot(), other._latest_snapshot(), cov)
+
+    def set_correlation(self, other: "MeasurementAccumulator", corr: Real = None):
+        """Sets the correlation between the latest snapshots of two accumulators
+
+        A snapshot is taken of an accumulator that does not have one yet. If the correlation
+        is not specified, the correlation between the readings of the accumulators is used.
+
+        """
+
+        if corr is None:
+            corr = self.correlation(other)
+        # pylint: disable=protected-access
+        dt.set_correlation(self._latest_snapshot(), other._latest_snapshot(), corr)
+
+    def _latest_snapshot(self) -> "dt.MeasuredValue":
+        return self._snapshot if self._snapshot is not None else self.snapshot()
+
+    def __add_error(self, error: Real):
+        """Checks the uncertainty on a new reading"""
+        if error is not None and not isinstance(error, Real):
+            raise TypeError("Cannot add a {} as an uncertainty!".format(type(error).__name__))
+        if error is not None and error < 0:
+            raise ValueError("The uncertainty of any measurement cannot be negative!")
+        if not error:
+            self._has_zero_error = True
@@ -0,0 +1,623 @@
+"""Defines array-backed columns of experimental values
+
+A column stores a series of values and their uncertainties in contiguous float64 buffers,
+with one name and one unit shared by the whole column. Unlike the ExperimentalValueArray,
+which holds one ExperimentalValue object per element, a column only materializes individual
+MeasuredValue objects when an element is indexed, so it scales to millions of readings.
+
+"""
+
+import math as m
+import warnings
+
+import numpy as np
+
+from abc import ABC, abstractmethod
+from typing import Dict, Union
+from numbers import Real, Integral
+
+from qexpy import utils
+import qexpy.settings.literals as lit
+
+from . import data as dt, operations as op  # pylint: disable=cyclic-import
+from . import utils as dut
+
+ARRAY_TYPES = np.ndarray, list
+
+
+class ExperimentalValueColumn(ABC):
+    """Base class for columns of values backed by contiguous buffers
+
+    Args:
+        unit (str): the unit shared by all values in the column
+        name (str): the name of the column
+
+    """
+
+    def __init__(self, unit: str = "", name: str = ""):
+        """Constructor for ExperimentalValueColumn"""
+
+        if unit is not None and not isinstance(unit, str):
+            raise TypeError("The unit provided is not a string!")
+        self._unit = utils.parse_unit_string(unit) if unit else {}  # type: Dict[str, int]
+
+        if name is not None and not isinstance(name, str):
+            raise TypeError("The name provided is not a string!")
+        self._name = name if name else ""  # type: str
+
+    # Makes numpy defer to the reflected operators of the column in binary operations, so
+    # that an expression such as "np.ndarray * column" produces a DerivedValueColumn.
+    __array_ufunc__ = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def __str__(self):
+        name = "{} = ".format(self.name) if self.name else ""
+        unit = " ({})".format(self.unit) if self.unit else ""
+        return "{}[ {} ]{}".format(name, self._print_value_errors(), unit)
+
+    def __repr__(self):
+        return "{}([ {} ])".format(self.__class__.__name__, self._print_value_errors())
+
+    def __neg__(self):
+        return DerivedValueColumn(dt.Formula(lit.NEG, [self]))
+
+    @utils.check_operand_type("pow")
+    def __pow__(self, power):
+        return DerivedValueColumn(dt.Formula(lit.POW, dut.wrap_in_column_operands(self, power)))
+
+    @utils.check_operand_type("pow")
+    def __rpow__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.POW, dut.wrap_in_column_operands(other, self)))
+
+    @utils.check_operand_type("+")
+    def __add__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.ADD, dut.wrap_in_column_operands(self, other)))
+
+    @utils.check_operand_type("+")
+    def __radd__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.ADD, dut.wrap_in_column_operands(other, self)))
+
+    @utils.check_operand_type("-")
+    def __sub__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.SUB, dut.wrap_in_column_operands(self, other)))
+
+    @utils.check_operand_type("-")
+    def __rsub__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.SUB, dut.wrap_in_column_operands(other, self)))
+
+    @utils.check_operand_type("*")
+    def __mul__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.MUL, dut.wrap_in_column_operands(self, other)))
+
+    @utils.check_operand_type("*")
+    def __rmul__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.MUL, dut.wrap_in_column_operands(other, self)))
+
+    @utils.check_operand_type("/")
+    def __truediv__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.DIV, dut.wrap_in_column_operands(self, other)))
+
+    @utils.check_operand_type("/")
+    def __rtruediv__(self, other):
+        return DerivedValueColumn(dt.Formula(lit.DIV, dut.wrap_in_column_operands(other, self)))
+
+    @utils.check_operand_type(">")
+    def __gt__(self, other):
+        return self.values > dut.wrap_in_column_operands(self, other)[1].value
+
+    @utils.check_operand_type(">=")
+    def __ge__(self, other):
+        return self.values >= dut.wrap_in_column_operands(self, other)[1].value
+
+    @utils.check_operand_type("<")
+    def __lt__(self, other):
+        return self.values < dut.wrap_in_column_operands(self, other)[1].value
+
+    @utils.check_operand_type("<=")
+    def __le__(self, other):
+        return self.values <= dut.wrap_in_column_operands(self, other)[1].value
+
+    @abstractmethod
+    def __getitem__(self, key):
+        raise NotImplementedError
+
+    @property
+    def value(self) -> np.ndarray:
+        """np.ndarray: The center values of the column
+
+        This is the same as "values". It allows a column to be an operand in a Formula, where
+        the derivative formulas access the "value" of each operand.
+
+        """
+        return self.values
+
+    @property
+    @abstractmethod
+    def values(self) -> np.ndarray:
+        """np.ndarray: The center values of the column"""
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def errors(self) -> np.ndarray:
+        """np.ndarray: The uncertainties of the column"""
+        raise NotImplementedError
+
+    @property
+    def size(self) -> int:
+        """int: The number of values in this column"""
+        return len(self)
+
+    @property
+    def name(self):
+        """str: The name of this column
+
+        Elements materialized from the column are named in the form of "name_index", where
+        the index is the position of the element in the column it was originally recorded in.
+
+        """
+        return self._name
+
+    @name.setter
+    def name(self, new_name: str):
+        if not isinstance(new_name, str):
+            raise TypeError("Cannot set name to \"{}\"!".format(type(new_name).__name__))
+        self._name = new_name
+
+    @property
+    def unit(self):
+        """str: The unit shared by all values in this column"""
+        return utils.construct_unit_string(self._unit) if self._unit else ""
+
+    @unit.setter
+    def unit(self, unit_string: str):
+        if not isinstance(unit_string, str):
+            raise TypeError("Cannot set unit to \"{}\"!".format(type(unit_string).__name__))
+        self._unit = utils.parse_unit_string(unit_string) if unit_string else {}
+
+    def mean(self) -> "dt.ExperimentalValue":
+        """The mean of the column"""
+        name = "mean of {}".format(self.name) if self.name else ""
+        return dt.MeasuredValue(
+            float(np.mean(self.values)), self.error_on_mean(), unit=self.unit, name=name)
+
+    def std(self, ddof=1) -> float:
+        """The standard deviation of the column"""
+        return float(np.std(self.values, ddof=ddof))
+
+    def sum(self) -> "dt.ExperimentalValue":
+        """The sum of the column"""
+        errors = self.errors
+        return dt.MeasuredValue(float(np.sum(self.values)), float(np.sqrt(
+            np.dot(errors, errors))), unit=self.unit, name=self.name)
+
+    def error_on_mean(self) -> float:
+        """The error on the mean of the column"""
+        return self.std() / m.sqrt(len(self))
+
+    def error_weighted_mean(self) -> float:
+        """The error weighted mean of the column"""
+        result, _ = utils.calculate_weighted_mean(self.values, self.errors)
+        if np.isnan(result):
+            warnings.warn(
+                "One or more errors are 0, the error weighted mean cannot be calculated.")
+        return result
+
+    def propagated_error(self) -> float:
+        """The propagated error from the error weighted mean calculation"""
+        _, error = utils.calculate_weighted_mean(self.values, self.errors)
+        if np.isnan(error):
+            warnings.warn(
+                "One or more errors are 0, the propagated error cannot be calculated.")
+        return error
+
+    def _print_value_errors(self) -> str:
+        """Prints the value-error pairs, summarized for long columns like numpy arrays"""
+        printer = utils.get_printer()
+        values, errors = self.values, self.errors
+        if len(values) <= np.get_printoptions()["threshold"]:
+            return ", ".join(printer(val, err) for val, err in zip(values, errors))
+        edge = np.get_printoptions()["edgeitems"]
+        head = (printer(val, err) for val, err in zip(values[:edge], errors[:edge]))
+        tail = (printer(val, err) for val, err in zip(values[-edge:], errors[-edge:]))
+        return ", ".join([*head, "...", *tail])
+
+
+class MeasuredValueColumn(ExperimentalValueColumn):
+    """A column of measurements stored in contiguous value and error buffers, alias:
+    MeasurementColumn
+
+    A MeasuredValueColumn records a series of measurements of the same quantity without
+    creating one object per measurement. The values and uncertainties are kept in two float64
+    buffers, and an element only becomes a :py:class:`~qexpy.data.data.MeasuredValue` when it
+    is indexed. Materialized elements are cached, so indexing the same position twice gives
+    back the same measurement. A column is usually created by passing ``columnar=True`` to
+    :py:class:`~qexpy.data.datasets.ExperimentalValueArray`.
+
+    Args:
+        data (List|np.ndarray): the center values of the measurements
+        error (Real|List|np.ndarray): the uncertainties on the measurements
+
+    Keyword Args:
+        relative_error (Real|List|np.ndarray): the relative uncertainties
+        unit (str): the unit of the measurements
+        name (str): the name of the column
+
+    Examples:
+        >>> import qexpy as q
+
+        >>> a = q.MeasurementArray([1, 2, 3, 4, 5], 0.5, name="length", unit="m",
+        >>>                        columnar=True)
+        >>> a.values  # the buffers are returned without copying
+        array([1., 2., 3., 4., 5.])
+        >>> print(a[1])
+        length_1 = 2.0 +/- 0.5 [m]
+
+        >>> # slicing gives a view on the same buffers
+        >>> print(a[2:4])
+        length = [ 3.0 +/- 0.5, 4.0 +/- 0.5 ] (m)
+
+    """
+
+    # pylint: disable=protected-access
+
+    def __init__(self, data, error=None, relative_error=None, unit: str = "", name: str = ""):
+        """Constructor for MeasuredValueColumn"""
+
+        super().__init__(unit, name)
+
+        if not isinstance(data, ARRAY_TYPES):
+            raise TypeError("You have not provided valid data to initialize the column.")
+        values = np.asarray(data)
+        if values.dtype.kind not in "biuf":
+            raise TypeError("Some values in the array are not real numbers")
+
+        self._values = np.ascontiguousarray(values, dtype=float).ravel()
+        self._errors = _get_error_buffer_helper(self._values, error, relative_error)
+
+        # A column taken from another column by indexing holds the same measurements as the
+        # original. Each column keeps a reference to the column in which the measurements
+        # were recorded, and the positions of its elements in that column, so that they can
+        # be matched to the same measurements. The positions are a range for basic slices,
+        # and an array of indices for columns produced by advanced indexing.
+        self._root = self  # type: MeasuredValueColumn
+        self._positions = range(len(self._values))  # type: Union[range, np.ndarray]
+
+        # The measurements that have been materialized, keyed by position in the root.
+        self._elements = {}  # type: Dict[int, dt.MeasuredValue]
+
+    def __getitem__(self, key):
+        if isinstance(key, Integral):
+            return self.__get_element(int(key))
+        if isinstance(key, slice):
+            # A basic slice is a view on the buffers of this column
+            return self.__get_subset(
+                self._values[key], self._errors[key], self._positions[key])
+
+        # Advanced indexing (boolean masks, arrays of indices) copies the selected data into
+        # a new column, the same way numpy does with a regular array.
+        return self.__get_subset(
+            np.ascontiguousarray(self._values[key]), np.ascontiguousarray(self._errors[key]),
+            np.asarray(self._positions)[key])
+
+    def __setitem__(self, key, value):
+        if isinstance(value, Real):
+            values, errors = value, None
+        elif isinstance(value, tuple) and len(value) == 2:
+            values, errors = value[0], np.asarray(value[1], dtype=float)
+            if np.any(errors < 0):
+                raise ValueError("The uncertainty of any measurement cannot be negative!")
+        elif isinstance(value, dt.ExperimentalValue):
+            values, errors = value.value, value.error
+        else:
+            raise TypeError(
+                "Cannot assign a {} to a measurement column".format(type(value).__name__))
+
+        # Columns produced by advanced indexing do not share buffers with the root column,
+        # in which case the values are written to both.
+        targets = [(self, key)]
+        if not np.may_share_memory(self._values, self._root._values):
+            targets.append((self._root, np.asarray(self._positions)[key]))
+        for column, index in targets:
+            column._values[index] = values
+            if errors is not None:
+                column._errors[index] = errors
+        self._root._refresh_elements()
+        dt.ExperimentalValue._revision += 1
+
+    @property
+    def values(self) -> np.ndarray:
+        """np.ndarray: A read-only view of the buffer of center values"""
+        self._root._sync()
+        return _read_only_view(self._values)
+
+    @property
+    def errors(self) -> np.ndarray:
+        """np.ndarray: A read-only view of the buffer of uncertainties"""
+        self._root._sync()
+        return _read_only_view(self._errors)
+
+    def derivative(self, other) -> Union[np.ndarray, int]:
+        """Calculates the element-wise derivative of this column with respect to another
+
+        The derivative of each element is 1 if the other column holds the same measurement
+        at the same index, and 0 otherwise.
+
+        """
+        if not isinstance(other, MeasuredValueColumn):
+            return 0
+        if other._root is not self._root:
+            if not isinstance(self._root, ItemColumn) or not isinstance(other._root, ItemColumn):
+                return 0
+            # Columns over the items of measurement arrays can hold the same measurements
+            # without sharing a root, in which case the measurements are matched by ID.
+            ids = self._root._ids[np.asarray(self._positions)]
+            return (ids == other._root._ids[np.asarray(other._positions)]).astype(float)
+        if isinstance(self._positions, range) and isinstance(other._positions, range):
+            if self._positions == other._positions:
+                return 1
+        return (np.asarray(self._positions) == np.asarray(other._positions)).astype(float)
+
+    def __get_element(self, index: int) -> "dt.MeasuredValue":
+        """Materializes the measurement at an index of this column"""
+
+        if index < -len(self) or index >= len(self):
+            raise IndexError("Index {} is out of bounds for a column of size {}".format(
+                index, len(self)))
+
+        root = self._root
+        position = int(self._positions[index])
+        if position not in root._elements:
+            name = "{}_{}".format(root.name, position) if root.name else ""
+            element = dt.ColumnElement(
+                float(root._values[position]), float(root._errors[position]), name=name,
+                column=root, position=position)
+            element._unit = root._unit
+            root._elements[position] = element
+        return root._elements[position]
+
+    def __get_subset(self, values, errors, positions) -> "MeasuredValueColumn":
+        """Creates a column that holds a subset of the measurements in this column"""
+
+        result = MeasuredValueColumn.__new__(MeasuredValueColumn)
+        result._unit, result._name = self._unit, self._name
+        result._values, result._errors = values, errors
+        result._root, result._positions = self._root, positions
+        return result
+
+    def _refresh_elements(self):
+        """Updates materialized elements after the buffers of the column are changed
+
+        The values derived from an element that has changed are marked as out of date.
+
+        """
+        for position, element in self._elements.items():
+            value, error = float(self._values[position]), float(self._errors[position])
+            if (value, error) != (element._value, element._error):
+                element._value, element._error = value, error
+                element._invalidate_dependents()
+
+    def _sync(self):
+        """Updates the buffers of the column if they are collected from other values"""
+
+
+class ItemColumn(MeasuredValueColumn):
+    """A column over the values held in an ExperimentalValueArray
+
+    Calculations with an ExperimentalValueArray are done with this column in place of the
+    array. The elements of the column are the items of the array, so the elements of a column
+    derived from it are derived from the same values. The buffers are collected from the
+    items, and collected again after any value has changed.
+
+    Args:
+        items (np.ndarray): the values in the array
+
+    Keyword Args:
+        unit (dict): the unit shared by the values
+        name (str): the name of the array
+
+    """
+
+    # pylint: disable=protected-access
+
+    def __init__(self, items: np.ndarray, unit: Dict[str, int] = None, name: str = ""):
+        """Constructor for ItemColumn"""
+
+        items = np.array(items, dtype=object).ravel()
+        super().__init__(*_collect_buffers(items), name=name)
+        self._unit = unit if unit else {}
+
+        # The IDs of the items, with which the same measurements are found in other columns
+        self._ids = np.fromiter((item._id for item in items), dtype=np.int64, count=len(items))
+
+        self._elements = dict(enumerate(items))
+        self._revision = dt.ExperimentalValue._revision
+
+    def _sync(self):
+        """Collects the buffers from the items again if any value has changed"""
+        if self._revision != dt.ExperimentalValue._revision:
+            self._values[:], self._errors[:] = _collect_buffers(self._elements.values())
+            self._revision = dt.ExperimentalValue._revision
+
+
+class DerivedValueColumn(ExperimentalValueColumn):
+    """A column of values derived from calculations with columns
+
+    The DerivedValueColumn is the result of arithmetic or math functions applied to columns,
+    or to an :py:class:`~qexpy.data.datasets.ExperimentalValueArray` of measurements when the
+    derivative method is used. Just like the :py:class:`~qexpy.data.data.DerivedValue`, it
+    keeps the formula that it is derived from, but the formula is evaluated for the entire
+    column at once, with the derivative method, using vectorized operations on the buffers of
+    the source columns. The values and errors are calculated the first time they are
+    requested, and again after any of the measurements have changed.
+
+    If an element of a source column is correlated with, or is also, another measurement in
+    the formula, the errors are propagated for each element separately instead.
+
+    Indexing the column with an integer returns a DerivedValue for that element, which can
+    be used with all error methods, including the Monte Carlo method.
+
+    Examples:
+        >>> import qexpy as q
+
+        >>> a = q.MeasurementArray([1, 2, 3], 0.1, columnar=True)
+        >>> b = q.Measurement(2, 0.1)
+        >>> c = q.sin(a) * b
+        >>> c.values
+        array([1.68294197, 1.81859485, 0.28224002])
+        >>> c.errors
+        array([0.13695911, 0.1232694 , 0.19850077])
+        >>> c[0]
+        DerivedValue(1.7 +/- 0.1)
+
+    """
+
+    def __init__(self, formula: "dt.Formula"):
+        """Constructor for DerivedValueColumn"""
+
+        super().__init__()
+
+        # The expression tree representing how this column is derived.
+        self._formula = formula  # type: dt.Formula
+
+        self._unit = op.propagate_units(formula)
+
+        # The buffered results of the formula, and the revision of the values they are for
+        self._values = None  # type: np.ndarray
+        self._errors = None  # type: np.ndarray
+        self._revision = dt.ExperimentalValue._revision  # pylint: disable=protected-access
+
+    def __getitem__(self, key):
+        if isinstance(key, Integral):
+            if key < -len(self) or key >= len(self):
+                raise IndexError("Index {} is out of bounds for a column of size {}".format(
+                    key, len(self)))
+            element = dt.DerivedValue(_index_formula(self._formula, int(key)))
+            if self.name:
+                element.name = "{}_{}".format(self.name, int(key) % len(self))
+            return element
+        result = DerivedValueColumn(_index_formula(self._formula, key))
+        result.name = self.name
+        return result
+
+    @property
+    def values(self) -> np.ndarray:
+        """np.ndarray: The center values of the column"""
+        self.__check_revision()
+        if self._values is None:
+            self._values = _read_only_view(op.evaluate_column(self._formula))
+        return self._values
+
+    @property
+    def errors(self) -> np.ndarray:
+        """np.ndarray: The uncertainties of the column, propagated with the derivative method
+        """
+        self.__check_revision()
+        if self._errors is None:
+            if op.has_dependent_column_elements(self._formula):
+                errors = np.fromiter(
+                    (element.error for element in self), dtype=float, count=len(self))
+            else:
+                errors = op.propagate_column_error(self._formula, len(self))
+            self._errors = _read_only_view(errors)
+        return self._errors
+
+    def recalculate(self):
+        """Recalculates the values, errors and unit of the column
+
+        The values and errors of a DerivedValueColumn are buffered, and calculated again
+        when any measurement has changed. If the unit of a source is changed, call this
+        method to update the unit of this column, as well as the intermediate columns this
+        column is derived from.
+
+        """
+        stack, visited = [self], set()
+        while stack:
+            column = stack.pop()
+            if id(column) in visited:
+                continue
+            visited.add(id(column))
+            column._values, column._errors = None, None
+            column._unit = op.propagate_units(column._formula)
+            stack.extend(operand for operand in column._formula.operands
+                         if isinstance(operand, DerivedValueColumn))
+
+    def derivative(self, other) -> Union[np.ndarray, float]:
+        """Calculates the element-wise derivative of this column with respect to a value"""
+        return 1 if other is self else op.differentiate(self._formula, other)
+
+    def __check_revision(self):
+        """Clears the buffered results if any value has changed since they were calculated"""
+        revision = dt.ExperimentalValue._revision  # pylint: disable=protected-access
+        if self._revision != revision:
+            self._values, self._errors, self._revision = None, None, revision
+
+
+def _index_formula(formula, key):
+    """Finds the formula for a subset of the elements of a column formula
+
+    Each column in the formula is replaced with its subset of elements, and so are arrays
+    wrapped in Constant objects. Scalar values are shared by all elements.
+
+    """
+    if isinstance(formula, ExperimentalValueColumn):
+        return formula[key]
+    if isinstance(formula, dt.Constant) and isinstance(formula.value, np.ndarray):
+        value = formula.value[key]
+        return dt.Constant(float(value) if isinstance(key, Integral) else value)
+    if isinstance(formula, dt.Formula):
+        return dt.Formula(
+            formula.operator, [_index_formula(operand, key) for operand in formula.operands])
+    return formula
+
+
+def _collect_buffers(items) -> (np.ndarray, np.ndarray):
+    """Collects the values and errors of measurements in one pass over them"""
+    buffers = np.fromiter(
+        (x for item in items for x in (item.value, item.error)), dtype=float,
+        count=2 * len(items)).reshape(-1, 2)
+    return buffers[:, 0].copy(), buffers[:, 1].copy()
+
+
+def _read_only_view(buffer: np.ndarray) -> np.ndarray:
+    """Wraps a buffer in a view that cannot be written into"""
+    view = buffer.view()
+    view.flags.writeable = False
+    return view
+
+
+def _get_error_buffer_helper(values: np.ndarray, error, rel_error) -> np.ndarray:
+    """Helper method that produces the error buffer for a MeasuredValueColumn"""
+
+    if error is None and rel_error is None:
+        return np.zeros_like(values)
+
+    if error is not None:
+        source, factor = error, None
+    else:
+        source, factor = rel_error, np.abs(values)
+
+    if isinstance(source, Real):
+        errors = np.full_like(values, float(source))
+    elif isinstance(source, ARRAY_TYPES):
+        errors = np.asarray(source)
+        if errors.dtype.kind not in "biuf":
+            raise TypeError("The error or relative error provided is invalid!")
+        if errors.size != values.size:
+            raise ValueError("The length of the error and data arrays don't match.")
+        errors = np.array(errors, dtype=float).ravel()
+    else:
+        raise TypeError("The error or relative error provided is invalid!")
+
+    if factor is not None:
+        errors *= factor
+
+    if np.any(errors < 0):
+        raise ValueError("The uncertainty of any measurement cannot be negative!")
+
+    return errors
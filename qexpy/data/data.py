@@ -7,11 +7,14 @@ propagation and other features (such as unit propagation) built-in.
 """
 
 import uuid
+import weakref
+import itertools
 import warnings
 import numpy as np
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Union
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Union
 from numbers import Real
 from collections import namedtuple
 
@@ -23,6 +26,7 @@ import qexpy.settings as sts
 import qexpy.settings.literals as lit
 
 from . import operations as op
+from . import columns as cols  # pylint: disable=cyclic-import
 from . import utils as dut
 
 ARRAY_TYPES = list, np.ndarray
@@ -38,6 +42,81 @@ Formula = namedtuple("Formula", "operator, operands")
 # A data structure to store the correlation between two values.
 Correlation = namedtuple("Correlation", "correlation, covariance")
 
+# The results of evaluating several values at once, with the covariance matrix between them
+Propagation = namedtuple("Propagation", "values, errors, covariance")
+
+# The raw data of a repeatedly measured value. The "values" and "errors" are float arrays,
+# with the "errors" being None if no uncertainties were recorded with the raw data, and the
+# "array" is the ExperimentalValueArray of the raw data, which is only built when requested.
+RawData = namedtuple("RawData", "values, errors, array")
+
+
+class CorrelationStore:
+    """A sparse store of the correlations between measurements
+
+    The correlations are kept in an adjacency list, which maps the ID of each measurement that
+    is correlated with others to the records of its correlations, keyed by the IDs of its
+    partners. Finding the correlated pairs in a set of measurements only visits the partners
+    of its members, so an uncorrelated set is done with in a single pass.
+
+    The correlations of a measurement are removed when it is garbage collected, so the store
+    does not grow with the number of measurements ever created.
+
+    """
+
+    def __init__(self):
+        self.__partners = {}  # type: Dict[int, Dict[int, Correlation]]
+        self.__watched = set()  # the IDs of the measurements with a finalizer attached
+
+    def get(self, id1: int, id2: int) -> Correlation:
+        """Gets the correlation between two measurements, or None if they are uncorrelated"""
+        return self.__partners.get(id1, {}).get(id2)
+
+    def set(self, first: "ExperimentalValue", second: "ExperimentalValue", record: Correlation):
+        """Records the correlation between two measurements"""
+        # pylint: disable=protected-access
+        self.__partners.setdefault(first._id, {})[second._id] = record
+        self.__partners.setdefault(second._id, {})[first._id] = record
+        for measurement in first, second:
+            if measurement._id not in self.__watched:
+                self.__watched.add(measurement._id)
+                weakref.finalize(measurement, self.remove, measurement._id)
+
+    def find_pairs(self, ids: List[int]) -> List[Tuple[int, int]]:
+        """Finds the correlated pairs in a list of measurements
+
+        Returns:
+            The pairs of positions (i, j) in the list, with i < j, of the measurements that
+            are correlated with each other, in ascending order.
+
+        """
+        if not self.__partners:
+            return []
+        positions = {_id: position for position, _id in enumerate(ids)}
+        return sorted((positions[_id], positions[partner])
+                      for _id in ids for partner in self.__partners.get(_id, {})
+                      if positions.get(partner, -1) > positions[_id])
+
+    def remove(self, _id: int):
+        """Removes all correlations of a measurement"""
+        self.__watched.discard(_id)
+        for partner in self.__partners.pop(_id, {}):
+            partners = self.__partners.get(partner, {})
+            partners.pop(_id, None)
+            if not partners:
+                self.__partners.pop(partner, None)
+
+    def clear(self) -> List[int]:
+        """Removes all correlations
+
+        Returns:
+            The IDs of the measurements that had correlations.
+
+        """
+        ids = list(self.__partners)
+        self.__partners.clear()
+        return ids
+
 
 class ExperimentalValue(ABC):
     """Base class for quantities with a value and an uncertainty
@@ -86,12 +165,33 @@ class ExperimentalValue(ABC):
 
     """
 
-    # Static register that stores references to all instantiated values in a session.
-    _register = {}  # type: Dict[uuid.UUID, "ExperimentalValue"]
+    # The attributes of all sub-classes are declared here, so that they share the same memory
+    # layout, which allows a value to be casted to a MeasuredValue by assigning its __class__.
+    # The sub-classes declare no slots of their own.
+    __slots__ = (
+        "_unit", "_name", "_id", "_uuid", "_dependents",  # all values
+        "_value", "_error",  # constants and measurements
+        "_raw_data", "_mean", "_std", "_error_on_mean",  # repeated measurements
+        "_formula", "_error_method", "_evaluators",  # derived values
+        "_column", "_position",  # elements of columns
+        "__weakref__")
+
+    # Static register that stores weak references to all instantiated values, so that values
+    # are not kept alive by the register, and are removed from it when garbage collected.
+    _register = weakref.WeakValueDictionary()  # type: Dict[int, "ExperimentalValue"]
+
+    # The IDs of the values created in each open session, the innermost session last.
+    _sessions = []  # type: List[List[int]]
+
+    # Static database that stores all correlations between measurements, keyed by their IDs.
+    _correlations = CorrelationStore()
 
-    # Static database that stores all correlations between measurements. The key of this
-    # database is the UUIDs of the two measurements concatenated in natual order.
-    _correlations = {}  # type: Dict[str, Correlation]
+    # The source of the IDs of all instantiated values.
+    _id_counter = itertools.count()
+
+    # The number of changes made to any value, with which the buffered results of columns
+    # derived from measurements are checked to be up to date.
+    _revision = 0
 
     def __init__(self, unit: str = "", name: str = "", save=True):
         """Constructor for ExperimentalValue"""
@@ -106,11 +206,20 @@ class ExperimentalValue(ABC):
             raise TypeError("The name provided is not a string!")
         self._name = name  # type: str
 
-        # Each instance is given a unique ID for easy reference
-        self._id = uuid.uuid4()  # type: uuid.UUID
+        # Each instance is given a unique ID for easy reference. The IDs are consecutive
+        # integers, which are cheaper to create and to hash than UUIDs.
+        self._id = next(ExperimentalValue._id_counter)  # type: int
+
+        # The UUID of this instance, which is only generated if requested
+        self._uuid = None  # type: uuid.UUID
+
+        # The derived values with this value as an operand, which are notified when it changes
+        self._dependents = None  # type: List[weakref.ref]
 
         if save:  # save this value in the register
             self._register[self._id] = self
+            if self._sessions:
+                self._sessions[-1].append(self._id)
 
     def __str__(self):
         name_string = "{} = ".format(self.name) if self.name else ""
@@ -120,6 +229,13 @@ class ExperimentalValue(ABC):
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, self.print_value_error())
 
+    @property
+    def uuid(self) -> uuid.UUID:
+        """uuid.UUID: A universally unique identifier of this value, for export"""
+        if self._uuid is None:
+            self._uuid = uuid.uuid4()
+        return self._uuid
+
     @property
     @abstractmethod
     def value(self):
@@ -167,6 +283,42 @@ class ExperimentalValue(ABC):
                 "Cannot set unit of value to \"{}\"".format(type(new_unit).__name__))
         self._unit = utils.parse_unit_string(new_unit) if new_unit else {}
 
+    def _add_dependent(self, value: "DerivedValue"):
+        """Records a derived value which has this value as an operand of its formula
+
+        The derived values are kept as weak references in a plain list. The references to
+        values that no longer exist are pruned each time the list reaches a power of two in
+        length, which keeps the list bounded by twice the number of live dependents.
+
+        """
+        dependents = self._dependents
+        if dependents is None:
+            self._dependents = [weakref.ref(value)]
+            return
+        size = len(dependents)
+        if size >= 16 and not size & (size - 1):
+            dependents[:] = [ref for ref in dependents if ref() is not None]
+        dependents.append(weakref.ref(value))
+
+    def _invalidate_dependents(self):
+        """Marks the results of the derived values depending on this value as out of date
+
+        This includes the values depending on it through other derived values, which are all
+        recalculated the next time they are accessed. A derived value that was overridden by
+        the user no longer depends on its formula, so its own dependents are not affected.
+
+        """
+        # pylint: disable=protected-access
+        ExperimentalValue._revision += 1
+        stack, visited = [self], set()
+        while stack:
+            for ref in list(stack.pop()._dependents or ()):
+                dependent = ref()
+                if isinstance(dependent, DerivedValue) and dependent._id not in visited:
+                    visited.add(dependent._id)
+                    dependent._clear_results()
+                    stack.append(dependent)
+
     @utils.check_operand_type("==")
     def __eq__(self, other):
         return self.value == dut.wrap_in_experimental_value(other).value
@@ -192,7 +344,7 @@ class ExperimentalValue(ABC):
 
     @utils.check_operand_type("pow")
     def __pow__(self, power):
-        if isinstance(power, ARRAY_TYPES):
+        if isinstance(power, (*ARRAY_TYPES, cols.ExperimentalValueColumn)):
             return power.__rpow__(self)
         return DerivedValue(Formula(lit.POW, [self, dut.wrap_in_experimental_value(power)]))
 
@@ -203,40 +355,52 @@ class ExperimentalValue(ABC):
 
     @utils.check_operand_type("+")
     def __add__(self, other):
-        if isinstance(other, ARRAY_TYPES):
+        if isinstance(other, (*ARRAY_TYPES, cols.ExperimentalValueColumn)):
             return other.__radd__(self)
+        if isinstance(other, Real):
+            return dut.scale_and_shift(self, 1, other)
         return DerivedValue(Formula(lit.ADD, [self, dut.wrap_in_experimental_value(other)]))
 
     @utils.check_operand_type("+")
     def __radd__(self, other):
+        if isinstance(other, Real):
+            return dut.scale_and_shift(self, 1, other)
         return DerivedValue(Formula(lit.ADD, [
             dut.wrap_in_experimental_value(other), self]))
 
     @utils.check_operand_type("-")
     def __sub__(self, other):
-        if isinstance(other, ARRAY_TYPES):
+        if isinstance(other, (*ARRAY_TYPES, cols.ExperimentalValueColumn)):
             return other.__rsub__(self)
+        if isinstance(other, Real):
+            return dut.scale_and_shift(self, 1, -other)
         return DerivedValue(Formula(lit.SUB, [self, dut.wrap_in_experimental_value(other)]))
 
     @utils.check_operand_type("-")
     def __rsub__(self, other):
+        if isinstance(other, Real):
+            return dut.scale_and_shift(self, -1, other)
         return DerivedValue(Formula(lit.SUB, [
             dut.wrap_in_experimental_value(other), self]))
 
     @utils.check_operand_type("*")
     def __mul__(self, other):
-        if isinstance(other, ARRAY_TYPES):
+        if isinstance(other, (*ARRAY_TYPES, cols.ExperimentalValueColumn)):
             return other.__rmul__(self)
+        if isinstance(other, Real):
+            return dut.scale_and_shift(self, other, 0)
         return DerivedValue(Formula(lit.MUL, [self, dut.wrap_in_experimental_value(other)]))
 
     @utils.check_operand_type("*")
     def __rmul__(self, other):
+        if isinstance(other, Real):
+            return dut.scale_and_shift(self, other, 0)
         return DerivedValue(Formula(lit.MUL, [
             dut.wrap_in_experimental_value(other), self]))
 
     @utils.check_operand_type("/")
     def __truediv__(self, other):
-        if isinstance(other, ARRAY_TYPES):
+        if isinstance(other, (*ARRAY_TYPES, cols.ExperimentalValueColumn)):
             return other.__rtruediv__(self)
         return DerivedValue(Formula(lit.DIV, [self, dut.wrap_in_experimental_value(other)]))
 
@@ -320,22 +484,27 @@ class ExperimentalValue(ABC):
         return utils.get_printer()(self.value, self.error)
 
     @staticmethod
-    def get(variable_id: uuid.UUID) -> "ExperimentalValue":
-        """Retrieves a value from the register using its UUID"""
-        return ExperimentalValue._register[
-            variable_id] if variable_id in ExperimentalValue._register else None
+    def get(variable_id: int) -> "ExperimentalValue":
+        """Retrieves a value from the register using its ID"""
+        return ExperimentalValue._register.get(variable_id)
 
 
 class Constant(ExperimentalValue):
     """A value with no uncertainty"""
 
+    __slots__ = ()
+
     def __init__(self, value, **kwargs):
-        super().__init__(**kwargs, save=False)
-        self._value_error = ValueWithError(value, 0)
+        if kwargs:
+            super().__init__(**kwargs, save=False)
+        else:  # skip the checks on the unit and the name, which are both empty
+            self._unit, self._name, self._uuid, self._dependents = {}, "", None, None
+            self._id = next(ExperimentalValue._id_counter)
+        self._value = value
 
     @property
     def value(self) -> float:
-        return self._value_error.value
+        return self._value
 
     @property
     def error(self) -> 0:
@@ -366,6 +535,8 @@ class MeasuredValue(ExperimentalValue):
 
     """
 
+    __slots__ = ()
+
     def __new__(cls, data, error=None, **kwargs):  # pylint: disable=unused-argument
         if isinstance(data, Real):
             instance = super().__new__(cls)
@@ -393,6 +564,7 @@ class MeasuredValue(ExperimentalValue):
         if not isinstance(value, Real):
             raise TypeError("Cannot assign a {} to the value!".format(type(value).__name__))
         self._value = value
+        self._invalidate_dependents()
 
     @property
     def error(self):
@@ -405,6 +577,7 @@ class MeasuredValue(ExperimentalValue):
         if error < 0:
             raise ValueError("The error must be a positive real number!")
         self._error = error
+        self._invalidate_dependents()
 
     @property
     def relative_error(self):
@@ -419,8 +592,11 @@ class MeasuredValue(ExperimentalValue):
             raise ValueError("The error must be a positive real number!")
         new_error = self.value * float(relative_error)
         self._error = new_error
+        self._invalidate_dependents()
 
     def derivative(self, other: "ExperimentalValue") -> float:
+        if isinstance(other, cols.ExperimentalValueColumn):
+            return 0  # a single measurement is not derived from a column
         if not isinstance(other, ExperimentalValue):
             raise IllegalArgumentError(
                 "You can only find derivative with respect to another ExperimentalValue")
@@ -432,8 +608,10 @@ class MeasuredValue(ExperimentalValue):
 
         if not isinstance(other, ExperimentalValue):
             raise IllegalArgumentError("Cannot find covariance for non-QExPy defined values")
+        if isinstance(other, DerivedValue):
+            return other.get_covariance(self)
         if not isinstance(other, MeasuredValue):
-            return 0  # only covariance between measurements is supported.
+            return 0  # constants don't correlate with anyone
 
         if self.std == 0 or other.std == 0:
             return 0  # constants don't correlate with anyone
@@ -441,11 +619,8 @@ class MeasuredValue(ExperimentalValue):
             # The covariance between a measurement and itself is the variance
             return self.std ** 2
 
-        id_string = "_".join(sorted([str(self._id), str(other._id)]))
-        if id_string in ExperimentalValue._correlations:
-            return ExperimentalValue._correlations[id_string].covariance
-
-        return 0
+        record = ExperimentalValue._correlations.get(self._id, other._id)
+        return record.covariance if record else 0
 
     def set_covariance(self, other: "ExperimentalValue", cov: float = None):
         """Sets the covariance of this value with another value"""
@@ -467,27 +642,27 @@ class MeasuredValue(ExperimentalValue):
             raise ValueError("The covariance: {} is non-physical".format(cov))
 
         # register the correlation between these measurements
-        id_string = "_".join(sorted([str(self._id), str(other._id)]))
-        correlation_record = Correlation(corr, cov)
-        ExperimentalValue._correlations[id_string] = correlation_record
+        ExperimentalValue._correlations.set(self, other, Correlation(corr, cov))
+        self._invalidate_dependents()
+        other._invalidate_dependents()  # pylint: disable=protected-access
 
     def get_correlation(self, other: "ExperimentalValue") -> float:
         """Gets the correlation factor of this value with another value"""
 
         if not isinstance(other, ExperimentalValue):
             raise IllegalArgumentError("Can't find correlation for non-QExPy defined values")
+        if isinstance(other, DerivedValue):
+            return other.get_correlation(self)
         if not isinstance(other, MeasuredValue):
-            return 0  # only covariance between measurements is supported.
+            return 0  # constants don't correlate with anyone
 
         if self.std == 0 or other.std == 0:
             return 0  # constants don't correlate with anyone
         if self._id == other._id:
             return 1  # values have unit correlation with themselves
 
-        id_string = "_".join(sorted([str(self._id), str(other._id)]))
-        if id_string in ExperimentalValue._correlations:
-            return ExperimentalValue._correlations[id_string].correlation
-        return 0
+        record = ExperimentalValue._correlations.get(self._id, other._id)
+        return record.correlation if record else 0
 
     def set_correlation(self, other: "ExperimentalValue", corr: float = None):
         """Sets the correlation factor of this value with another value"""
@@ -509,9 +684,45 @@ class MeasuredValue(ExperimentalValue):
         cov = corr * (self.std * other.std)
 
         # register the correlation between these measurements
-        id_string = "_".join(sorted([str(self._id), str(other._id)]))
-        correlation_record = Correlation(corr, cov)
-        ExperimentalValue._correlations[id_string] = correlation_record
+        ExperimentalValue._correlations.set(self, other, Correlation(corr, cov))
+        self._invalidate_dependents()
+        other._invalidate_dependents()  # pylint: disable=protected-access
+
+
+class ColumnElement(MeasuredValue):
+    """A measurement materialized from a column of measurements
+
+    The element is the same measurement as the one recorded in the buffers of the column, so
+    a new value or error assigned to the element is written back to the column.
+
+    Keyword Args:
+        column (MeasuredValueColumn): The column in which the measurement is recorded
+        position (int): The position of the measurement in the column
+
+    """
+
+    # pylint: disable=protected-access
+
+    __slots__ = ()
+
+    def __init__(self, data, error=None, **kwargs):
+        super().__init__(data, error, **kwargs)
+        self._column, self._position = kwargs["column"], kwargs["position"]
+
+    @MeasuredValue.value.setter
+    def value(self, value: Real):
+        MeasuredValue.value.fset(self, value)
+        self._column._values[self._position] = self._value
+
+    @MeasuredValue.error.setter
+    def error(self, error: Real):
+        MeasuredValue.error.fset(self, error)
+        self._column._errors[self._position] = self._error
+
+    @MeasuredValue.relative_error.setter
+    def relative_error(self, relative_error: Real):
+        MeasuredValue.relative_error.fset(self, relative_error)
+        self._column._errors[self._position] = self._error
 
 
 class RepeatedlyMeasuredValue(MeasuredValue):
@@ -562,6 +773,8 @@ class RepeatedlyMeasuredValue(MeasuredValue):
 
         """
 
+    __slots__ = ()
+
     def __init__(self, data: List, error: Union[List, Real] = None, **kwargs):
         """Constructor of a RepeatedlyMeasuredValue"""
 
@@ -569,18 +782,15 @@ class RepeatedlyMeasuredValue(MeasuredValue):
         if isinstance(error, ARRAY_TYPES) and len(error) != len(data):
             raise ValueError("The lengths of uncertainties and data do not match")
 
-        # pylint: disable=cyclic-import
-        from .datasets import ExperimentalValueArray
-
-        # Initialize raw data and its uncertainties. Internally, the raw data is implemented
-        # as an ExperimentalValueArray. However, in principle, the ExperimentalValueArray
-        # should only be used for an array of measurements of different quantities.
-        self._raw_data = ExperimentalValueArray(data, error, save=False, **kwargs)
+        # The raw data is kept as plain float arrays, and the statistics are found with numpy
+        # directly, so that no ExperimentalValue is created for the individual samples.
+        self._raw_data = _create_raw_data(data, error, kwargs.pop("relative_error", None))
+        values = self._raw_data.values
 
         # Calculate its statistical properties
-        self._mean = self._raw_data.mean().value
-        self._std = self._raw_data.std(ddof=1)
-        self._error_on_mean = self._raw_data.error_on_mean()
+        self._mean = float(np.mean(values))
+        self._std = float(np.std(values, ddof=1))
+        self._error_on_mean = self._std / np.sqrt(len(values))
 
         # Call parent constructor with mean and error on mean as value and uncertainty
         super().__init__(self._mean, self._error_on_mean, **kwargs)
@@ -599,12 +809,20 @@ class RepeatedlyMeasuredValue(MeasuredValue):
             "measurements. This value is now considered a single Measurement.")
         self.__class__ = MeasuredValue
         self._value = new_value
+        self._invalidate_dependents()
 
     @property
     def raw_data(self):
         """np.ndarray: The raw data that was used to generate this measurement"""
-        return self._raw_data.values if all(
-            x.error == 0 for x in self._raw_data) else self._raw_data
+        values, errors, array = self._raw_data
+        if errors is None:
+            return values
+        if array is None:
+            from .datasets import ExperimentalValueArray  # pylint: disable=cyclic-import
+            array = ExperimentalValueArray(
+                values, errors, save=False, unit=self.unit, name=self.name)
+            self._raw_data = self._raw_data._replace(array=array)
+        return array
 
     @property
     def std(self):
@@ -624,26 +842,44 @@ class RepeatedlyMeasuredValue(MeasuredValue):
     @property
     def error_weighted_mean(self):
         """float: Error weighted mean if individual errors are specified"""
-        return self._raw_data.error_weighted_mean()
+        result, _ = self.__weighted_mean()
+        if np.isnan(result):
+            warnings.warn(
+                "One or more errors are 0, the error weighted mean cannot be calculated.")
+        return result
 
     @property
     def propagated_error(self):
         """float: Error propagated with errors passed in if present"""
-        return self._raw_data.propagated_error()
+        _, error = self.__weighted_mean()
+        if np.isnan(error):
+            warnings.warn(
+                "One or more errors are 0, the propagated error cannot be calculated.")
+        return error
+
+    def __weighted_mean(self) -> Tuple[float, float]:
+        """Finds the error weighted mean of the raw data and its propagated error"""
+        values, errors, _ = self._raw_data
+        if errors is None:
+            return np.nan, np.nan
+        return utils.calculate_weighted_mean(values, errors)
 
     def use_std_for_uncertainty(self):
         """Sets the uncertainty of this value to the standard deviation"""
         self._error = self._std
+        self._invalidate_dependents()
 
     def use_error_on_mean_for_uncertainty(self):
         """Sets the uncertainty of this value to the error on the mean"""
         self._error = self._error_on_mean
+        self._invalidate_dependents()
 
     def use_error_weighted_mean_as_value(self):
         """Sets the value of this object to the error weighted mean"""
         error_weighted_mean = self.error_weighted_mean
         if not np.isnan(error_weighted_mean):
             self._value = error_weighted_mean
+            self._invalidate_dependents()
         else:  # pragma: no cover
             warnings.warn("The error weighted mean is not valid")
 
@@ -652,6 +888,7 @@ class RepeatedlyMeasuredValue(MeasuredValue):
         propagated_error = self.propagated_error
         if not np.isnan(propagated_error):
             self._error = propagated_error
+            self._invalidate_dependents()
         else:  # pragma: no cover
             warnings.warn("The propagated error is not valid")
 
@@ -665,7 +902,8 @@ class RepeatedlyMeasuredValue(MeasuredValue):
 
         if cov is None and isinstance(other, RepeatedlyMeasuredValue):
             try:
-                cov = utils.calculate_covariance(self.raw_data, other.raw_data)
+                # pylint: disable=protected-access
+                cov = utils.calculate_covariance(self._raw_data.values, other._raw_data.values)
             except ValueError:
                 cov = None
 
@@ -681,7 +919,8 @@ class RepeatedlyMeasuredValue(MeasuredValue):
 
         if corr is None and isinstance(other, RepeatedlyMeasuredValue):
             try:
-                cov = utils.calculate_covariance(self.raw_data, other.raw_data)
+                # pylint: disable=protected-access
+                cov = utils.calculate_covariance(self._raw_data.values, other._raw_data.values)
                 corr = cov / (self.std * other.std)
             except ValueError:
                 corr = None
@@ -749,25 +988,42 @@ class DerivedValue(ExperimentalValue):
 
     """
 
+    __slots__ = ()
+
+    # Static table of the derived values by the operator and the IDs of the operands of their
+    # formulas, used to share one formula between structurally identical derived values.
+    _formulas = weakref.WeakValueDictionary()  # type: Dict[tuple, "DerivedValue"]
+
     def __init__(self, formula: Formula):
         """Constructor for a DerivedValue"""
 
         # The error method used for error propagation of this value
-        self.__error_method = ErrorMethod.AUTO  # type: ErrorMethod
-
-        # The expression tree representing how this value is derived.
+        self._error_method = ErrorMethod.AUTO  # type: ErrorMethod
+
+        # The expression tree representing how this value is derived. If another derived
+        # value has the same operator and operands, its formula is reused, so that the
+        # evaluators, which memoize sub-expressions by identity, compute it only once.
+        key = formula.operator, tuple(operand._id for operand in formula.operands)
+        existing = DerivedValue._formulas.get(key)
+        if isinstance(existing, DerivedValue):
+            formula = existing._formula
+        else:
+            DerivedValue._formulas[key] = self
         self._formula = formula  # type: Formula
 
-        # The objects used to evaluate the formula with the appropriate error methods
-        self.__evaluators = {
-            lit.DERIVATIVE: op.DerivativeEvaluator(),
-            lit.MONTE_CARLO: op.MonteCarloEvaluator()
-        }  # type: Dict[str, op.Evaluator]
+        # The objects used to evaluate the formula with the appropriate error methods, which
+        # are created when first used, since most intermediate results are never evaluated.
+        self._evaluators = None  # type: Dict[str, op.Evaluator]
 
         super().__init__(save=True)
 
         self._unit = op.propagate_units(formula)
 
+        # Constants never change, so they do not have to keep track of their dependents
+        for operand in formula.operands:
+            if not isinstance(operand, Constant):
+                operand._add_dependent(self)
+
     @property
     def value(self):
         return self.__get_value_error_pair().value
@@ -831,37 +1087,39 @@ class DerivedValue(ExperimentalValue):
         be different from the global settings.
 
         """
-        if self.__error_method == ErrorMethod.AUTO:
+        if self._error_method == ErrorMethod.AUTO:
             return sts.get_settings().error_method
-        return self.__error_method
+        return self._error_method
 
     @error_method.setter
     def error_method(self, new_error_method: Union[ErrorMethod, str]):
         if isinstance(new_error_method, ErrorMethod):
-            self.__error_method = new_error_method
+            self._error_method = new_error_method
         elif new_error_method in [lit.MONTE_CARLO, lit.DERIVATIVE]:
-            self.__error_method = ErrorMethod(new_error_method)
+            self._error_method = ErrorMethod(new_error_method)
         else:
             raise ValueError("Invalid error method!")
 
     @property
     def mc(self):
         """dut.MonteCarloSettings: The settings object for customizing Monte Carlo"""
-        evaluator = self.__evaluators[lit.MONTE_CARLO]
+        evaluator = self._get_evaluator(lit.MONTE_CARLO)
         assert isinstance(evaluator, op.MonteCarloEvaluator)
         evaluator.regenerate_samples(self._formula)
         return evaluator.settings
 
     def reset_error_method(self):
         """Resets the default error method for this value to follow the global settings"""
-        self.__error_method = ErrorMethod.AUTO
+        self._error_method = ErrorMethod.AUTO
 
     def recalculate(self):
         """Recalculates the value
 
-        A DerivedValue instance preserves information on how the value was derived. If values
-        of the original measurements are changed, and you wish to update the derived value
-        using the exact same formula, this method can be used.
+        A DerivedValue instance preserves information on how the value was derived. When the
+        value, the uncertainty or the correlations of a measurement it is derived from are
+        changed, the derived value is marked as out of date, and it is recalculated with the
+        exact same formula the next time it is accessed. This method discards the results
+        and updates the units right away, such as after the unit of a measurement is changed.
 
         Examples:
 
@@ -876,25 +1134,84 @@ class DerivedValue(ExperimentalValue):
 
             >>> # Now we change the value of a
             >>> a.value = 8
-            >>> c.recalculate()
             >>> c
             DerivedValue(12.0 +/- 0.2)
 
+            >>> # The units are only updated when recalculated
+            >>> a.unit, b.unit = "m", "m"
+            >>> c.recalculate()
+            >>> print(c)
+            12.0 +/- 0.2 [m]
+
         """
-        for evaluator in self.__evaluators.values():
-            evaluator.clear()
+        self._clear_results()
         self._unit = op.propagate_units(self._formula)
 
+    def _clear_results(self):
+        """Discards the results of the evaluators, which are recalculated when next accessed"""
+        for evaluator in (self._evaluators or {}).values():
+            evaluator.clear()
+
     def derivative(self, other: ExperimentalValue) -> float:
+        if isinstance(other, cols.ExperimentalValueColumn):
+            return 0  # a single derived value is not derived from a column
         if not isinstance(other, ExperimentalValue):
             raise IllegalArgumentError(
                 "You can only find derivative with respect to another ExperimentalValue")
         return 1 if self._id == other._id else op.differentiate(self._formula, other)
 
+    def get_covariance(self, other: "ExperimentalValue") -> float:
+        """Gets the covariance of this value with another value
+
+        The covariance is found with the derivative method, as J * S * J^T, where J holds the
+        derivatives of both values with respect to their source measurements, and S is the
+        covariance matrix of those measurements. The covariance between two derived values
+        is cached until either of them is recalculated.
+
+        Examples:
+            >>> import qexpy as q
+            >>> a = q.Measurement(5, 0.2)
+            >>> b = q.Measurement(4, 0.1)
+
+            >>> # Values derived from the same measurements are correlated
+            >>> (a + b).get_covariance(a - b)
+            0.030000000000000006
+
+        """
+
+        if not isinstance(other, ExperimentalValue):
+            raise IllegalArgumentError("Cannot find covariance for non-QExPy defined values")
+        if not isinstance(other, (MeasuredValue, DerivedValue)):
+            return 0  # constants don't correlate with anyone
+
+        if isinstance(other, DerivedValue):
+            # pylint: disable=protected-access
+            cached = self._get_evaluator(lit.DERIVATIVE).covariances.get(other._id)
+            if cached is not None and self._id in other._get_evaluator(
+                    lit.DERIVATIVE).covariances:
+                return cached
+        return propagate([self, other], ErrorMethod.DERIVATIVE).covariance[0, 1]
+
+    def get_correlation(self, other: "ExperimentalValue") -> float:
+        """Gets the correlation factor of this value with another value
+
+        The correlation factor is found from the covariance between the two values, and their
+        uncertainties propagated with the derivative method.
+
+        """
+
+        covariance = self.get_covariance(other)
+        # pylint: disable=protected-access
+        errors = list(x._get_evaluator(lit.DERIVATIVE).evaluate(x._formula).error if isinstance(
+            x, DerivedValue) else x.error for x in (self, other))
+        if errors[0] == 0 or errors[1] == 0:
+            return 0
+        return covariance / (errors[0] * errors[1])
+
     def show_error_contributions(self):  # pragma: no cover
         """Displays measurements' contribution to the final uncertainty"""
         import matplotlib.pyplot as plt
-        evaluator = self.__evaluators[lit.DERIVATIVE]
+        evaluator = self._get_evaluator(lit.DERIVATIVE)
         assert isinstance(evaluator, op.DerivativeEvaluator)
         evaluator.evaluate(self._formula)
         measurements, contributions = evaluator.measurements, evaluator.error_contributions
@@ -907,7 +1224,16 @@ class DerivedValue(ExperimentalValue):
     def __get_value_error_pair(self) -> ValueWithError:
         """Gets the value-error pair for the current specified error method"""
         error_method = self.error_method.value
-        return self.__evaluators[error_method].evaluate(self._formula)
+        return self._get_evaluator(error_method).evaluate(self._formula)
+
+    def _get_evaluator(self, error_method: str) -> "op.Evaluator":
+        """Gets the evaluator for an error method, which is created when first used"""
+        if self._evaluators is None:
+            self._evaluators = {}
+        if error_method not in self._evaluators:
+            self._evaluators[error_method] = op.DerivativeEvaluator() \
+                if error_method == lit.DERIVATIVE else op.MonteCarloEvaluator()
+        return self._evaluators[error_method]
 
 
 def get_covariance(var1: ExperimentalValue, var2: ExperimentalValue) -> float:
@@ -928,11 +1254,7 @@ def get_covariance(var1: ExperimentalValue, var2: ExperimentalValue) -> float:
         raise IllegalArgumentError(
             "Cannot find covariance between non-QExPy defined variables")
 
-    # As of now, only covariance between measurements are supported.
-    if isinstance(var1, MeasuredValue) and isinstance(var2, MeasuredValue):
-        return var1.get_covariance(var2)
-
-    return 0
+    return var1.get_covariance(var2)
 
 
 def set_covariance(var1: ExperimentalValue, var2: ExperimentalValue, cov: Real = None):
@@ -981,11 +1303,7 @@ def get_correlation(var1: ExperimentalValue, var2: ExperimentalValue) -> float:
         raise IllegalArgumentError(
             "Cannot find correlation between non-QExPy defined variables")
 
-    # As of now, only covariance between measurements are supported.
-    if isinstance(var1, MeasuredValue) and isinstance(var2, MeasuredValue):
-        return var1.get_correlation(var2)
-
-    return 0
+    return var1.get_correlation(var2)
 
 
 def set_correlation(var1: MeasuredValue, var2: MeasuredValue, corr: Real = None):
@@ -1007,9 +1325,134 @@ def set_correlation(var1: MeasuredValue, var2: MeasuredValue, corr: Real = None)
 
 def reset_correlations():
     """resets all correlation settings"""
-    ExperimentalValue._correlations.clear()  # pylint: disable=protected-access
+    # pylint: disable=protected-access
+    for _id in ExperimentalValue._correlations.clear():
+        variable = get_variable_by_id(_id)
+        if variable is not None:
+            variable._invalidate_dependents()
+
 
+def propagate(values: List[ExperimentalValue],
+              method: Union[ErrorMethod, str] = None) -> Propagation:
+    """Evaluates many values at once, and finds the covariance matrix between them
 
-def get_variable_by_id(variable_id: uuid.UUID) -> ExperimentalValue:
+    Reading the value and uncertainty of each value separately evaluates each formula on its
+    own. Instead, this function finds the source measurements of all values once, evaluates
+    shared sub-expressions once, and with the Monte Carlo method, draws one block of samples
+    for all values. The results are also stored in the values, so that reading their value
+    and uncertainty afterwards with the same error method does not evaluate them again.
+
+    Args:
+        values (List[ExperimentalValue]): the measurements and derived values to evaluate
+        method (ErrorMethod|str): the error method used for all values, by default the one in
+            the global settings. With the Monte Carlo method, the global sample size and seed
+            are used.
+
+    Returns:
+        The values, the uncertainties, and the covariance matrix of the values, as arrays.
+
+    Examples:
+        >>> import qexpy as q
+
+        >>> a = q.Measurement(5, 0.2)
+        >>> b = q.Measurement(4, 0.1)
+
+        >>> result = q.propagate([a + b, a - b])
+        >>> result.values
+        array([9., 1.])
+        >>> result.covariance
+        array([[0.05, 0.03],
+               [0.03, 0.05]])
+
+    """
+
+    if any(not isinstance(value, (MeasuredValue, DerivedValue)) for value in values):
+        raise IllegalArgumentError("Only measurements and derived values can be propagated")
+
+    if method is None:
+        method = sts.get_settings().error_method
+    elif not isinstance(method, ErrorMethod):
+        if method not in [lit.MONTE_CARLO, lit.DERIVATIVE]:
+            raise ValueError("Invalid error method!")
+        method = ErrorMethod(method)
+
+    # pylint: disable=protected-access
+    formulas = list(value._formula if isinstance(value, DerivedValue) else value
+                    for value in values)
+    evaluators = list(value._get_evaluator(method.value) if isinstance(
+        value, DerivedValue) else None for value in values)
+
+    if method == ErrorMethod.MONTE_CARLO:
+        centers, covariance = op.propagate_with_monte_carlo(formulas, evaluators)
+    else:
+        centers, covariance = op.propagate_with_derivatives(formulas, evaluators)
+        derived = list((row, value._id) for row, value in enumerate(values)
+                       if isinstance(value, DerivedValue))
+        for row, _ in derived:
+            evaluators[row].covariances.update(
+                (_id, covariance[row, column]) for column, _id in derived)
+    return Propagation(centers, np.sqrt(np.diagonal(covariance)), covariance)
+
+
+def find_correlated_pairs(measurements: List[ExperimentalValue]) -> List[Tuple[int, int]]:
+    """Internal method used to find the positions of the correlated pairs in a list of values"""
+    return ExperimentalValue._correlations.find_pairs(  # pylint: disable=protected-access
+        list(measurement._id for measurement in measurements))  # pylint: disable=protected-access
+
+
+@contextmanager
+def session():
+    """Scopes the values created inside a block
+
+    When the block exits, the correlations of all values created inside it are cleared, and
+    so are the cached offsets of the derived values. This frees the memory taken by a batch
+    of calculations in a long running process. The values themselves are only held weakly by
+    the register, so they are freed once they are no longer referenced, and the values that
+    are still referenced can be used after the block exits, without their correlations.
+
+    Examples:
+        >>> import qexpy as q
+
+        >>> with q.session():
+        ...     a = q.Measurement(5, 0.5)
+        ...     b = q.Measurement(4, 0.2)
+        ...     q.set_correlation(a, b, 0.5)
+        ...     print(a * b)
+        20 +/- 3
+
+    """
+
+    ids = []
+    ExperimentalValue._sessions.append(ids)  # pylint: disable=protected-access
+    try:
+        yield
+    finally:
+        ExperimentalValue._sessions.pop()  # pylint: disable=protected-access
+        for _id in ids:
+            ExperimentalValue._correlations.remove(_id)  # pylint: disable=protected-access
+        dut.clear_offset_cache()
+
+
+def get_variable_by_id(variable_id: int) -> ExperimentalValue:
     """Internal method used to retrieve an ExperimentalValue instance with its ID"""
     return ExperimentalValue.get(variable_id)
+
+
+def _create_raw_data(data: List, error: Union[List, Real], rel_error: Union[List, Real]):
+    """Internal method used to store the raw data of a repeatedly measured value"""
+
+    if all(isinstance(x, ExperimentalValue) for x in data):
+        data, error = [x.value for x in data], [x.error for x in data]
+
+    values = np.asarray(data)
+    if values.dtype.kind not in "biuf":
+        raise TypeError("Some values in the array are not real numbers")
+    values = values.astype(float)
+    values.flags.writeable = False  # the statistics are found once from the raw data
+
+    if error is None and rel_error is None:
+        return RawData(values, None, None)
+
+    from .datasets import _get_error_array_helper  # pylint: disable=cyclic-import
+    errors = np.asarray(_get_error_array_helper(values, error, rel_error), dtype=float)
+    return RawData(values, errors if np.any(errors) else None, None)
@@ -2,16 +2,18 @@
 
 import re
 import warnings
+import functools
 
 import numpy as np
 import math as m
 
 from typing import List  # pylint: disable=unused-import
-from numbers import Real
+from numbers import Real, Integral
 
 from qexpy.utils import IllegalArgumentError
 
 from . import data as dt
+from . import columns as cols
 from . import utils as dut
 
 import qexpy.utils as utils
@@ -19,6 +21,18 @@ import qexpy.utils as utils
 ARRAY_TYPES = np.ndarray, list
 
 
+def _calculate_with_columns(operator):
+    """Calculates an operator with measurement arrays for all elements at once if possible"""
+
+    @functools.wraps(operator)
+    def wrapper(array, *other):
+        result = dut.calculate_with_item_columns(
+            getattr(cols.ExperimentalValueColumn, operator.__name__), array, *other)
+        return operator(array, *other) if result is None else result
+
+    return wrapper
+
+
 class ExperimentalValueArray(np.ndarray):
     """An array of experimental values, alias: MeasurementArray
 
@@ -38,6 +52,8 @@ class ExperimentalValueArray(np.ndarray):
         relative_error (Real|List): the relative uncertainties on the measurements
         unit (str): the unit of the measurement
         name (str): the name of the measurement
+        columnar (bool): if True, the measurements are stored in contiguous buffers and a
+            :py:class:`~qexpy.data.columns.MeasuredValueColumn` is returned instead
 
     Examples:
         >>> import qexpy as q
@@ -93,17 +109,14 @@ class ExperimentalValueArray(np.ndarray):
                     MeasuredValue(11.0 +/- 0.3)], dtype=object)
 
         >>> # The ExperimentalValueArray object is vectorized just like numpy.ndarray. You
-        >>> # can perform basic arithmetic operations as well as functions with them and get
-        >>> # back ExperimentalValueArray objects
+        >>> # can perform basic arithmetic operations as well as functions with them. With
+        >>> # the derivative method, the results are calculated for all items at once, and
+        >>> # returned as a DerivedValueColumn
         >>> a = q.MeasurementArray([0, 1, 2], 0.5)
         >>> a + 2
-        ExperimentalValueArray([DerivedValue(2.0 +/- 0.5),
-                        DerivedValue(3.0 +/- 0.5),
-                        DerivedValue(4.0 +/- 0.5)], dtype=object)
+        DerivedValueColumn([ 2.0 +/- 0.5, 3.0 +/- 0.5, 4.0 +/- 0.5 ])
         >>> q.sin(a)
-        ExperimentalValueArray([DerivedValue(0.0 +/- 0.5),
-                        DerivedValue(0.8 +/- 0.3),
-                        DerivedValue(0.9 +/- 0.2)], dtype=object)
+        DerivedValueColumn([ 0.0 +/- 0.5, 0.8 +/- 0.3, 0.9 +/- 0.2 ])
 
     See Also:
         numpy.ndarray
@@ -112,6 +125,12 @@ class ExperimentalValueArray(np.ndarray):
 
     # pylint: disable=no-member,arguments-differ,too-many-function-args
 
+    # The name of the array is kept on the array itself. The items are named after it and
+    # their positions when they are added to the array, when the array is renamed, and when
+    # insert and delete shift them to new positions. Reads and slices leave the names of the
+    # items as they are. If the name is None, it is found from the name of the first item.
+    _name = None  # type: str
+
     def __new__(cls, *args, **kwargs):
         """Constructor for an ExperimentalValueArray
 
@@ -129,6 +148,9 @@ class ExperimentalValueArray(np.ndarray):
         error = kwargs.pop("error", args[1] if len(args) > 1 else None)
         relative_error = kwargs.pop("relative_error", None)
 
+        if kwargs.pop("columnar", False):
+            return cols.MeasuredValueColumn(data, error, relative_error, **kwargs)
+
         error_array = _get_error_array_helper(data, error, relative_error)
 
         if all(isinstance(x, dt.ExperimentalValue) for x in data):
@@ -149,6 +171,7 @@ class ExperimentalValueArray(np.ndarray):
 
         # Added so that subclasses of this are of the correct type
         obj.__class__ = cls
+        obj._name = kwargs.get("name", "")
 
         return obj
 
@@ -167,51 +190,65 @@ class ExperimentalValueArray(np.ndarray):
             if self.name:
                 self[key].name = "{}_{}".format(self.name, key)
 
+    @_calculate_with_columns
+    def __neg__(self):
+        return super().__neg__()
+
+    @_calculate_with_columns
     def __pow__(self, power):
         if isinstance(power, ARRAY_TYPES):
             return super().__pow__(power)
         return super().__pow__(dut.wrap_in_experimental_value(power))
 
+    @_calculate_with_columns
     def __rpow__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__rpow__(other)
         return super().__rpow__(dut.wrap_in_experimental_value(other))
 
+    @_calculate_with_columns
     def __add__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__add__(other)
         return super().__add__(dut.wrap_in_experimental_value(other))
 
+    @_calculate_with_columns
     def __radd__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__radd__(other)
         return super().__radd__(dut.wrap_in_experimental_value(other))
 
+    @_calculate_with_columns
     def __sub__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__sub__(other)
         return super().__sub__(dut.wrap_in_experimental_value(other))
 
+    @_calculate_with_columns
     def __rsub__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__rsub__(other)
         return super().__rsub__(dut.wrap_in_experimental_value(other))
 
+    @_calculate_with_columns
     def __mul__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__mul__(other)
         return super().__mul__(dut.wrap_in_experimental_value(other))
 
+    @_calculate_with_columns
     def __rmul__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__rmul__(other)
         return super().__rmul__(dut.wrap_in_experimental_value(other))
 
+    @_calculate_with_columns
     def __truediv__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__truediv__(other)
         return super().__truediv__(dut.wrap_in_experimental_value(other))
 
+    @_calculate_with_columns
     def __rtruediv__(self, other):
         if isinstance(other, ARRAY_TYPES):
             return super().__rtruediv__(other)
@@ -219,33 +256,53 @@ class ExperimentalValueArray(np.ndarray):
 
     def __array_finalize__(self, obj):
         """wrap up array initialization"""
-        if obj is None or not (self.shape and isinstance(self[0], dt.ExperimentalValue)):
-            return  # Skip if this is not a regular array of ExperimentalValue objects
-        if hasattr(obj, "name"):
-            name = getattr(obj, "name", "")
-        else:
-            name = getattr(self, "name", "")
-        # re-index the names of the measurements
-        for index, measurement in enumerate(self):
-            measurement.name = "{}_{}".format(name, index) if name else ""
+        self._name = getattr(obj, "_name", None)
+
+    def __array_wrap__(self, array, *args, **kwargs):
+        """wrap up the result of a ufunc, naming the new values after their positions
+
+        Some ufuncs, such as numpy.maximum, return the existing items of this array, which
+        keep their names. Only the values derived by the ufunc are named.
+
+        """
+        result = super().__array_wrap__(array, *args, **kwargs)
+        if isinstance(result, ExperimentalValueArray) and result.name:
+            # pylint: disable=protected-access
+            existing = set(id(item) for item in self.view(np.ndarray).flat)
+            for index, item in enumerate(result.view(np.ndarray)):
+                if isinstance(item, dt.DerivedValue) and id(item) not in existing:
+                    item._name = "{}_{}".format(result.name, index)
+        return result
 
     @property
     def name(self):
         """str: Name of this array of values
 
-        A name can be given to this data set, and each measurement within this list will be
+        A name can be given to this data set, and each measurement added to this list will be
         named in the form of "name_index". For example, if the name is specified as "length",
         the items in this array will be named "length_0", "length_1", "length_2", ...
 
+        The measurements of a slice of the array keep the names they have in the array. The
+        names after their positions in the slice are found in :py:attr:`names` instead.
+
         """
-        return re.sub(r"_[0-9]+$", "", self[0].name)
+        if self._name is None:
+            return re.sub(r"_[0-9]+$", "", self.__items()[0].name) if self.size else ""
+        return self._name
 
     @name.setter
     def name(self, new_name: str):
         if not isinstance(new_name, str):
             raise TypeError("Cannot set name to \"{}\"!".format(type(new_name).__name__))
-        for index, measurement in enumerate(self):
-            measurement.name = "{}_{}".format(new_name, index)
+        self._name = new_name
+        for index, measurement in enumerate(self.__items()):
+            measurement._name = "{}_{}".format(new_name, index)  # pylint: disable=protected-access
+
+    @property
+    def names(self) -> List[str]:
+        """List[str]: The names of the items after the name of this array and their positions"""
+        name = self.name
+        return list("{}_{}".format(name, index) if name else "" for index in range(self.size))
 
     @property
     def unit(self):
@@ -268,16 +325,19 @@ class ExperimentalValueArray(np.ndarray):
     @property
     def values(self):
         """np.ndarray: An array consisting of the center values of each item"""
-        return np.asarray(list(data.value for data in self))
+        return self.__get_buffers()[0]
 
     @property
     def errors(self):
         """np.ndarray: An array consisting of the uncertainties of each item"""
-        return np.asarray(list(data.error for data in self))
+        return self.__get_buffers()[1]
 
     def append(self, value) -> "ExperimentalValueArray":
         """Adds a value to the end of this array and returns the new array
 
+        To build an array by appending to it one value at a time, use a
+        :py:class:`.MeasurementArrayBuilder` instead, which does not copy the array each time.
+
         Args:
             value: The value to be appended to this array. This can be a real number, a pair
                 of value and error in a tuple, an ExperimentalValue instance, or an array
@@ -287,12 +347,24 @@ class ExperimentalValueArray(np.ndarray):
             The new ExperimentalValueArray instance
 
         """
-        value = dut.wrap_in_value_array(value, unit=self.unit, name=self.name)
-        result = np.append(self, value).view(ExperimentalValueArray)
-        for index, measurement in enumerate(result):
-            measurement.name = "{}_{}".format(self.name, index)
-            measurement.unit = self.unit
-        return result
+        return self.__concatenate(np.asarray(dut.wrap_in_value_array(value), dtype=object))
+
+    def extend(self, data, error=None, relative_error=None) -> "ExperimentalValueArray":
+        """Adds a series of measurements to the end of this array and returns the new array
+
+        This is the bulk counterpart of :py:meth:`append`, which takes the center values and
+        uncertainties of the new measurements in separate arrays, just like the constructor.
+
+        Args:
+            data (List): an array of real numbers representing the center values
+            error (Real|List): the uncertainties on the measurements
+            relative_error (Real|List): the relative uncertainties on the measurements
+
+        Returns:
+            The new ExperimentalValueArray instance
+
+        """
+        return self.__concatenate(_make_measurements(data, error, relative_error))
 
     def insert(self, index: int, value) -> "ExperimentalValueArray":
         """adds a value to a position in this array and returns the new array
@@ -307,12 +379,9 @@ class ExperimentalValueArray(np.ndarray):
             The new ExperimentalValueArray instance
 
         """
-        value = dut.wrap_in_value_array(value, unit=self.unit, name=self.name)
-        result = np.insert(self, index, value).view(ExperimentalValueArray)
-        for idx, measurement in enumerate(result):
-            measurement.name = "{}_{}".format(self.name, idx)
-            measurement.unit = self.unit
-        return result
+        value = np.asarray(dut.wrap_in_value_array(value), dtype=object)
+        self.__adopt(value)
+        return self.__derive(np.insert(self.__items(), index, value), self.__start(index))
 
     def delete(self, index: int) -> "ExperimentalValueArray":
         """deletes the value on the requested position and returns the new array
@@ -324,27 +393,25 @@ class ExperimentalValueArray(np.ndarray):
             The new ExperimentalValueArray instance
 
         """
-        result = np.delete(self, index).view(ExperimentalValueArray)
-        for idx, measurement in enumerate(result):
-            measurement.name = "{}_{}".format(self.name, idx)
-        return result
+        return self.__derive(np.delete(self.__items(), index), self.__start(index))
 
     def mean(self, **_) -> "dt.ExperimentalValue":  # pylint:disable=arguments-differ
         """The mean of the array"""
-        result = np.mean(self.values)
-        error = self.error_on_mean()
+        values, _ = self.__get_buffers()
+        error = float(np.std(values, ddof=1)) / m.sqrt(self.size)
         name = "mean of {}".format(self.name) if self.name else ""
-        return dt.MeasuredValue(float(result), error, unit=self.unit, name=name)
+        return dt.MeasuredValue(float(np.mean(values)), error, unit=self.unit, name=name)
 
     def std(self, ddof=1, **_) -> float:  # pylint:disable=arguments-differ
         """The standard deviation of this array"""
-        return float(np.std(self.values, ddof=ddof))
+        return float(np.std(self.__get_buffers()[0], ddof=ddof))
 
     def sum(self, **_) -> "dt.ExperimentalValue":  # pylint:disable=arguments-differ
         """The sum of the array"""
-        result = np.sum(self.values)
-        error = np.sqrt(np.sum(self.errors ** 2))
-        return dt.MeasuredValue(float(result), float(error), unit=self.unit, name=self.name)
+        values, errors = self.__get_buffers()
+        error = np.sqrt(np.dot(errors, errors))
+        return dt.MeasuredValue(
+            float(np.sum(values)), float(error), unit=self.unit, name=self.name)
 
     def error_on_mean(self) -> float:
         """The error on the mean of this array"""
@@ -352,21 +419,64 @@ class ExperimentalValueArray(np.ndarray):
 
     def error_weighted_mean(self) -> float:
         """The error weighted mean of this array"""
-        if any(err == 0 for err in self.errors):
+        result, _ = utils.calculate_weighted_mean(*self.__get_buffers())
+        if np.isnan(result):
             warnings.warn(
                 "One or more errors are 0, the error weighted mean cannot be calculated.")
-            return np.nan
-        weights = np.asarray(list(1 / (err ** 2) for err in self.errors))
-        return float(np.sum(weights * self.values) / np.sum(weights))
+        return result
 
     def propagated_error(self) -> float:
         """The propagated error from the error weighted mean calculation"""
-        if any(err == 0 for err in self.errors):
+        _, error = utils.calculate_weighted_mean(*self.__get_buffers())
+        if np.isnan(error):
             warnings.warn(
                 "One or more errors are 0, the propagated error cannot be calculated.")
-            return np.nan
-        weights = np.asarray(list(1 / (err ** 2) for err in self.errors))
-        return 1 / np.sqrt(np.sum(weights))
+        return error
+
+    def __get_buffers(self) -> (np.ndarray, np.ndarray):
+        """The values and errors of the items, collected in one pass over the items"""
+        buffers = np.fromiter(
+            (x for data in self.__items() for x in (data.value, data.error)), dtype=float,
+            count=2 * self.size).reshape(-1, 2)
+        return buffers[:, 0].copy(), buffers[:, 1].copy()
+
+    def __items(self) -> np.ndarray:
+        """The items of this array, as a plain array which is indexed without naming them"""
+        return self.view(np.ndarray)
+
+    def __derive(self, items: np.ndarray, start: int = None) -> "ExperimentalValueArray":
+        """Creates a new array of items with the same name as this array
+
+        If a start is given, the items from the start onwards are named after their positions.
+
+        """
+        # pylint: disable=protected-access
+        result = items.view(ExperimentalValueArray)
+        result._name = name = self.name
+        if start is not None and name:
+            for index in range(start, len(items)):
+                items[index]._name = "{}_{}".format(name, index)
+        return result
+
+    def __start(self, index) -> int:
+        """The first position changed by inserting or deleting items at an index"""
+        if isinstance(index, Integral):
+            return max(index if index >= 0 else index + self.size, 0)
+        return 0
+
+    def __adopt(self, items: np.ndarray, start: int = None):
+        """Gives the unit of this array to new items, and names them after their positions"""
+        # pylint: disable=protected-access
+        unit = self.__items()[0]._unit if self.size else {}
+        for index, item in enumerate(items):
+            item._unit = unit
+            if start is not None and self.name:
+                item._name = "{}_{}".format(self.name, start + index)
+
+    def __concatenate(self, items: np.ndarray) -> "ExperimentalValueArray":
+        """Creates a new array with the items added to the end of this array"""
+        self.__adopt(items, start=self.size)
+        return self.__derive(np.concatenate((self.__items(), items)))
 
     @classmethod
     def __wrap(cls, data, **kwargs):
@@ -390,9 +500,96 @@ class ExperimentalValueArray(np.ndarray):
 
         obj = data.view(ExperimentalValueArray)
         obj.__class__ = cls
+        obj._name = name  # pylint: disable=protected-access
         return obj
 
 
+class MeasurementArrayBuilder:
+    """A growable buffer for building a MeasurementArray one value at a time
+
+    An ExperimentalValueArray is a fixed size numpy array, so :py:meth:`.append` copies the
+    whole array to return a new one. The builder instead keeps its items in a buffer with room
+    to spare, which is only reallocated when it is full, so each value is added in amortized
+    constant time. The buffer is never shared with the arrays built from it.
+
+    Args:
+        unit (str): The unit of the measurements
+        name (str): The name of the measurements
+
+    Examples:
+        >>> import qexpy as q
+
+        >>> builder = q.MeasurementArrayBuilder(unit="m", name="length")
+        >>> for reading in [10, 9.8, 9.9]:
+        ...     builder.append((reading, 0.1))
+        >>> builder.extend([10.1, 10.2], 0.1)
+        >>> a = builder.build()
+        >>> print(a[-1])
+        length_4 = 10.2 +/- 0.1 [m]
+
+    """
+
+    def __init__(self, unit: str = "", name: str = ""):
+        """Constructor for MeasurementArrayBuilder"""
+
+        if not isinstance(unit, str):
+            raise TypeError("The unit provided is not a string!")
+        if not isinstance(name, str):
+            raise TypeError("The name provided is not a string!")
+        self.name = name
+        self._unit = utils.parse_unit_string(unit) if unit else {}
+
+        self._items = np.empty(16, dtype=object)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, value):
+        """Adds a value to the end of the array being built
+
+        Args:
+            value: The value to be added. This can be a real number, a pair of value and
+                error in a tuple, an ExperimentalValue instance, or an array consisting of
+                any of the above.
+
+        """
+        self.__push(np.asarray(dut.wrap_in_value_array(value), dtype=object))
+
+    def extend(self, data, error=None, relative_error=None):
+        """Adds a series of measurements to the end of the array being built
+
+        Args:
+            data (List): an array of real numbers representing the center values
+            error (Real|List): the uncertainties on the measurements
+            relative_error (Real|List): the relative uncertainties on the measurements
+
+        """
+        self.__push(_make_measurements(data, error, relative_error))
+
+    def build(self) -> ExperimentalValueArray:
+        """Creates an ExperimentalValueArray of the values added so far"""
+        result = self._items[:self._size].copy().view(ExperimentalValueArray)
+        result._name = self.name  # pylint: disable=protected-access
+        return result
+
+    def __push(self, items: np.ndarray):
+        """Adds items to the end of the buffer, which is reallocated when it is full"""
+
+        size, count = self._size, len(items)
+        if size + count > len(self._items):
+            buffer = np.empty(2 * (size + count), dtype=object)
+            buffer[:size] = self._items[:size]
+            self._items = buffer
+
+        # pylint: disable=protected-access
+        for index, item in enumerate(items):
+            item._unit = self._unit
+            item._name = "{}_{}".format(self.name, size + index) if self.name else ""
+        self._items[size:size + count] = items
+        self._size = size + count
+
+
 class XYDataSet:
     """A pair of ExperimentalValueArray objects
 
@@ -546,6 +743,9 @@ class XYDataSet:
     def __wrap_data(data, error, unit, name) -> ExperimentalValueArray:
         """Wraps the data set into ExperimentalValueArray objects"""
 
+        if isinstance(data, cols.ExperimentalValueColumn):
+            # The data set holds the same measurements as the column
+            data = ExperimentalValueArray(list(data))
         if isinstance(data, ExperimentalValueArray):
             if name:
                 data.name = name
@@ -562,6 +762,19 @@ class XYDataSet:
         raise IllegalArgumentError("Cannot create XYDataSet with the given arguments.")
 
 
+def _make_measurements(data, error, rel_error) -> np.ndarray:
+    """Helper method that creates new measurements from arrays of values and errors"""
+
+    data = np.asarray(data)
+    if data.dtype.kind not in "biuf":
+        raise TypeError("Some values in the array are not real numbers")
+    error_array = _get_error_array_helper(data, error, rel_error)
+    items = np.empty(len(data), dtype=object)
+    items[:] = list(dt.MeasuredValue(float(val), float(err))
+                    for val, err in zip(data, error_array))
+    return items
+
+
 def _get_error_array_helper(data, error, rel_error):
     """Helper method that produces an error array for an ExperimentalValueArray"""
 
@@ -582,7 +795,7 @@ def _get_error_array_helper(data, error, rel_error):
     else:
         raise TypeError("The error or relative error provided is invalid!")
 
-    if any(err < 0 for err in error_array):
+    if np.any(np.asarray(error_array) < 0):
         raise ValueError("The uncertainty of any measurement cannot be negative!")
 
     return error_array
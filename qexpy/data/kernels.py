@@ -0,0 +1,228 @@
+"""Compiles formulas into flat lists of instructions for repeated evaluation
+
+The Monte Carlo method evaluates a formula on large arrays of samples, and evaluates it
+again every time the samples are regenerated. Interpreting the expression tree allocates a
+new temporary array at every node. Instead, the formula is lowered once into a flat list of
+instructions over a small number of scratch buffers, which are allocated once and reused by
+every run, with each instruction writing its result in place using the "out" argument of
+numpy ufuncs.
+
+"""
+
+import numpy as np
+
+from typing import List
+from numbers import Real
+from collections import namedtuple
+
+import qexpy.settings.literals as lit
+
+from . import data as dt  # pylint: disable=cyclic-import
+from . import simplify as sp  # pylint: disable=cyclic-import
+
+# The kinds of arguments of an instruction. An argument refers to the samples of a source
+# measurement, a scratch buffer that holds the result of a previous instruction, or a
+# constant which is passed to the ufunc as is.
+INPUT, SCRATCH, CONSTANT = "input", "scratch", "constant"
+
+# A single step in a compiled formula. The "operator" is applied to the "args", which are
+# pairs of (kind, reference), and the result is written to the scratch buffer at "out".
+Instruction = namedtuple("Instruction", "operator, out, args")
+
+
+class Kernel:
+    """A formula compiled into a flat list of instructions
+
+    The kernel only depends on the structure of the formula, not on the values of the
+    measurements in it, so it can be run again with new samples after the measurements are
+    changed, or with a different sample size.
+
+    Args:
+        formula (dt.Formula): the formula to be compiled
+
+    Attributes:
+        sources (List[int]): the IDs of the source measurements of the formula, in the order
+            in which their samples are passed to :py:meth:`run`
+        instructions (List[Instruction]): the instructions of the kernel
+
+    """
+
+    def __init__(self, formula: "dt.Formula"):
+        """Constructor for Kernel"""
+
+        self.sources = []
+        self.instructions = []  # type: List[Instruction]
+
+        # The formula is simplified first, with the derived values in it inlined
+        simplified = sp.simplify(formula)
+
+        # The derived values compiled in line with the rest of the formula
+        self.__derived_values = simplified.derived_values  # type: List[dt.DerivedValue]
+
+        self.__result, self.__buffer_count = self.__compile(simplified.formula)
+
+        # The scratch buffers are allocated when the kernel is first run
+        self.__buffers = []  # type: List[np.ndarray]
+
+    def __getstate__(self):
+        # Copies of the kernel, such as the ones sent to the workers of a parallel Monte Carlo
+        # simulation, get scratch buffers of their own, and leave the expression tree behind.
+        state = self.__dict__.copy()
+        state["_Kernel__buffers"] = []
+        state["_Kernel__derived_values"] = []
+        return state
+
+    @property
+    def buffer_count(self) -> int:
+        """int: The number of scratch buffers used by the kernel"""
+        return self.__buffer_count
+
+    def is_valid(self) -> bool:
+        """Checks if the kernel still matches the structure of the formula
+
+        A DerivedValue is casted to a MeasuredValue when its value or error is overridden,
+        after which it should be treated as a source measurement, and the formula has to be
+        compiled again.
+
+        """
+        return all(isinstance(value, dt.DerivedValue) for value in self.__derived_values)
+
+    def run(self, samples: List[np.ndarray], size: int) -> np.ndarray:
+        """Runs the kernel with samples of the source measurements
+
+        Args:
+            samples (List[np.ndarray]): the samples of each source measurement
+            size (int): the size of the samples
+
+        Returns:
+            The result of the formula. This may be one of the scratch buffers of the kernel,
+            which is overwritten the next time the kernel is run.
+
+        """
+
+        # The buffers are reused for smaller sizes, such as the last of a series of chunks
+        if not self.__buffers or len(self.__buffers[0]) < size:
+            self.__buffers = [np.empty(size) for _ in range(self.__buffer_count)]
+        buffers = list(buffer[:size] for buffer in self.__buffers)
+
+        def fetch(kind, ref):
+            if kind == INPUT:
+                return samples[ref]
+            return buffers[ref] if kind == SCRATCH else ref
+
+        with np.errstate(all="ignore"):
+            for instruction in self.instructions:
+                args = (fetch(kind, ref) for kind, ref in instruction.args)
+                KERNEL_OPERATIONS[instruction.operator](buffers[instruction.out], *args)
+
+        return fetch(*self.__result)
+
+    def __compile(self, formula: "dt.Formula"):
+        """Lowers the formula into instructions, then assigns scratch buffers to them"""
+
+        registers = []  # the virtual registers written by the instructions, in order
+        refs = {}  # the argument referring to the result of each node
+        inputs = {}  # the index of each source measurement in the samples
+
+        def lower(node):
+            if id(node) in refs:
+                return refs[id(node)]
+            if isinstance(node, dt.MeasuredValue):
+                if node._id not in inputs:
+                    inputs[node._id] = len(self.sources)
+                    self.sources.append(node._id)
+                ref = INPUT, inputs[node._id]
+            elif isinstance(node, dt.Constant):
+                value = node.value
+                ref = CONSTANT, float(value) if isinstance(value, Real) else value
+            elif isinstance(node, dt.DerivedValue):
+                self.__derived_values.append(node)
+                ref = lower(node._formula)
+            else:
+                args = [lower(operand) for operand in node.operands]
+                ref = SCRATCH, len(registers)
+                registers.append(Instruction(node.operator, len(registers), args))
+            refs[id(node)] = ref
+            return ref
+
+        result = lower(formula)
+        self.instructions, result, count = _allocate_buffers(registers, result)
+        return result, count
+
+
+def _allocate_buffers(registers: List[Instruction], result: tuple):
+    """Assigns scratch buffers to the virtual registers written by a list of instructions
+
+    A buffer is released after the last instruction that reads its register, so that it can
+    be reused, including for the output of that same instruction, which is safe because numpy
+    ufuncs work element-wise. The register holding the result is never released.
+
+    Returns:
+        The instructions writing to buffers, the argument referring to the result, and the
+        number of buffers needed.
+
+    """
+
+    last_use = {}
+    for index, instruction in enumerate(registers):
+        for kind, ref in instruction.args:
+            if kind == SCRATCH:
+                last_use[ref] = index
+    if result[0] == SCRATCH:
+        last_use[result[1]] = len(registers)
+
+    instructions, buffers, free, count = [], {}, [], 0
+    for index, instruction in enumerate(registers):
+        args = [(kind, buffers[ref] if kind == SCRATCH else ref)
+                for kind, ref in instruction.args]
+        for ref in {ref for kind, ref in instruction.args if kind == SCRATCH}:
+            if last_use[ref] == index:
+                free.append(buffers[ref])
+        if not free:
+            free.append(count)
+            count += 1
+        buffers[instruction.out] = free.pop()
+        instructions.append(Instruction(instruction.operator, buffers[instruction.out], args))
+
+    if result[0] == SCRATCH:
+        result = SCRATCH, buffers[result[1]]
+    return instructions, result, count
+
+
+def _affine(out, x, scale, shift):
+    """x * scale + shift, written to an output buffer that may be shared with x"""
+    np.multiply(x, scale, out=out)
+    return np.add(out, shift, out=out)
+
+
+def _log(out, base, x):
+    """log with a base, written to an output buffer that may be shared with its base"""
+    denominator = np.log(base)
+    np.log(x, out=out)
+    return np.divide(out, denominator, out=out)
+
+
+# The in-place counterparts of operations.OPERATIONS, with the output buffer first.
+KERNEL_OPERATIONS = {
+    lit.NEG: lambda out, x: np.negative(x, out=out),
+    lit.ADD: lambda out, a, b: np.add(a, b, out=out),
+    lit.SUB: lambda out, a, b: np.subtract(a, b, out=out),
+    lit.MUL: lambda out, a, b: np.multiply(a, b, out=out),
+    lit.DIV: lambda out, a, b: np.divide(a, b, out=out),
+    lit.AFFINE: _affine,
+    lit.SQRT: lambda out, x: np.sqrt(x, out=out),
+    lit.EXP: lambda out, x: np.exp(x, out=out),
+    lit.SIN: lambda out, x: np.sin(x, out=out),
+    lit.COS: lambda out, x: np.cos(x, out=out),
+    lit.TAN: lambda out, x: np.tan(x, out=out),
+    lit.ASIN: lambda out, x: np.arcsin(x, out=out),
+    lit.ACOS: lambda out, x: np.arccos(x, out=out),
+    lit.ATAN: lambda out, x: np.arctan(x, out=out),
+    lit.SEC: lambda out, x: np.reciprocal(np.cos(x, out=out), out=out),
+    lit.CSC: lambda out, x: np.reciprocal(np.sin(x, out=out), out=out),
+    lit.COT: lambda out, x: np.reciprocal(np.tan(x, out=out), out=out),
+    lit.POW: lambda out, x, a: np.power(x, a, out=out),
+    lit.LOG: _log,
+    lit.LOG10: lambda out, x: np.log10(x, out=out),
+    lit.LN: lambda out, x: np.log(x, out=out)
+}
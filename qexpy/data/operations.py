@@ -1,16 +1,18 @@
 """Defines arithmetic and math operations with ExperimentalValue objects"""
 
+import copy
+import functools
 import itertools
 import warnings
 import numpy as np
 
 from abc import ABC, abstractmethod
-from typing import Dict, Callable, List, Set, Generator
+from typing import Dict, Callable, List, Set, Generator, Union, Tuple
 from numbers import Real
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from qexpy.utils import UndefinedOperationError, UndefinedActionError
-from uuid import UUID
 
 import qexpy.utils as utils
 import qexpy.settings as sts
@@ -18,6 +20,9 @@ import qexpy.settings.literals as lit
 
 from . import data as dt  # pylint: disable=cyclic-import
 from . import datasets as dts  # pylint: disable=cyclic-import
+from . import columns as cols  # pylint: disable=cyclic-import
+from . import kernels as kn  # pylint: disable=cyclic-import
+from . import simplify as sp  # pylint: disable=cyclic-import
 from . import utils as dut
 
 pi, e = np.pi, np.e
@@ -47,15 +52,28 @@ class DerivativeEvaluator(Evaluator):
         self.measurements = []
         self.error_contributions = []
 
+        # The simplified formula, which is kept when the results are cleared
+        self.simplified = None  # type: sp.Simplified
+
+        # The covariance with other derived values, keyed by their IDs
+        self.covariances = {}  # type: Dict[int, float]
+
     def evaluate(self, formula: "dt.Formula") -> "dt.ValueWithError":
         if not self.result:
-            self.result = self.__evaluate(formula)
+            self.result = self.__evaluate(self.simplify(formula))
         return self.result
 
+    def simplify(self, formula: "dt.Formula") -> "dt.Formula":
+        """Finds the simplified formula, which is only simplified again if it is outdated"""
+        if self.simplified is None or not sp.is_valid(self.simplified):
+            self.simplified = sp.simplify(formula)
+        return self.simplified.formula
+
     def clear(self):
         self.result = ()
         self.measurements = []
         self.error_contributions = []
+        self.covariances = {}
 
     def __evaluate(self, formula: "dt.Formula"):
         """Executes an operation with propagated results using the derivative method
@@ -66,21 +84,28 @@ class DerivativeEvaluator(Evaluator):
 
         """
 
+        # Values of sub-expressions are shared between the following steps
+        memo = {}
+
         # Execute the operation
-        result_value = _evaluate_formula(formula)
+        result_value = _evaluate_formula(formula, memo=memo)
 
         # Find measurements that this formula is derived from
-        source_meas_ids = _find_source_measurement_ids(formula)  # type: Set[UUID]
+        source_meas_ids = _find_source_measurement_ids(formula, memo)  # type: Set[int]
         sources = list(dt.get_variable_by_id(_id) for _id in source_meas_ids)
 
         # record source measurements
         self.measurements = sources
 
+        # Find the derivatives with respect to all sources in one backward sweep
+        gradient = _reverse_differentiate(formula, memo)
+        derivatives = list(gradient.get(id(x), 0) for x in sources)
+
         # Find the quadrature terms
-        quads = list(map(lambda x: (x.error * differentiate(formula, x)) ** 2, sources))
+        quads = list((x.error * d) ** 2 for x, d in zip(sources, derivatives))
 
         # Handle covariance between measurements
-        covariance_terms = DerivativeEvaluator.__find_cov_terms(formula, sources)
+        covariance_terms = DerivativeEvaluator.__find_cov_terms(sources, derivatives)
 
         # Calculate the result
         result_sums = sum(quads) + sum(covariance_terms)
@@ -100,9 +125,11 @@ class DerivativeEvaluator(Evaluator):
         return dt.ValueWithError(result_value, result_error)
 
     @staticmethod
-    def __find_cov_terms(_formula: "dt.Formula", _measurements: List) -> Generator:
+    def __find_cov_terms(_measurements: List, _derivatives: List) -> Generator:
         """Finds the contributing covariance terms for the quadrature method"""
-        for var1, var2 in itertools.combinations(_measurements, 2):
+        for i, j in dt.find_correlated_pairs(_measurements):
+            var1, var2 = _measurements[i], _measurements[j]
+            d1, d2 = _derivatives[i], _derivatives[j]
             corr = dt.get_correlation(var1, var2)
             # Re-calculate the covariance between two measurements, because in the case of
             # repeated measurements, sometimes the covariance is calculated from the raw
@@ -115,7 +142,7 @@ class DerivativeEvaluator(Evaluator):
             # measurements. This would make the most physical sense.
             cov = corr * var1.error * var2.error
             if cov != 0:
-                yield 2 * cov * differentiate(_formula, var1) * differentiate(_formula, var2)
+                yield 2 * cov * d1 * d2
 
 
 class MonteCarloEvaluator(Evaluator):
@@ -126,6 +153,19 @@ class MonteCarloEvaluator(Evaluator):
         self.values = {}
         self.settings = dut.MonteCarloSettings(self)
 
+        # The summary of the samples when they are processed in chunks
+        self.statistics = None  # type: dut.MonteCarloAccumulator
+
+        # The compiled formula, which is kept when the results are cleared
+        self.kernel = None  # type: kn.Kernel
+
+        # The number of samples drawn, which may vary with an adaptive sample size
+        self.samples_used = 0
+
+        # The workers and the pool that the samples were drawn with, which may be changed
+        # in the global settings after the samples are drawn
+        self.workers_used = None
+
     @property
     def samples(self):
         """np.ndarray: the raw samples of this simulation"""
@@ -134,6 +174,13 @@ class MonteCarloEvaluator(Evaluator):
         xrange = self.settings.xrange
         return np.ma.masked_outside(self.raw_samples, xrange[0], xrange[1], copy=False)
 
+    @property
+    def is_chunked(self) -> bool:
+        """bool: True if the samples are processed in chunks"""
+        if self.settings.is_adaptive:
+            return 0 < self.settings.chunk_size < self.settings.max_sample_size
+        return 0 < self.settings.chunk_size < self.settings.sample_size
+
     def evaluate(self, formula: "dt.Formula") -> "dt.ValueWithError":
 
         self.regenerate_samples(formula)
@@ -145,42 +192,69 @@ class MonteCarloEvaluator(Evaluator):
             self.settings.use_mean_and_std()
 
         if strategy == lit.MC_MEAN_AND_STD not in self.values:
-            result = dt.ValueWithError(np.mean(self.samples), np.std(self.samples, ddof=1))
+            if self.is_chunked:
+                result = dt.ValueWithError(self.statistics.mean, self.statistics.std)
+            else:
+                result = dt.ValueWithError(np.mean(self.samples), np.std(self.samples, ddof=1))
             self.values[strategy] = result
 
         if strategy == lit.MC_MODE_AND_CONFIDENCE not in self.values:
-            n, bins = np.histogram(self.samples, bins=100)
+            if self.is_chunked:
+                n, bins = self.statistics.counts, self.statistics.edges
+            else:
+                n, bins = np.histogram(self.samples, bins=100)
             value, error = utils.find_mode_and_uncertainty(n, bins, self.settings.confidence)
             self.values[strategy] = dt.ValueWithError(value, error)
 
         return self.values[strategy]
 
     def regenerate_samples(self, formula):
-        """generates raw samples if none is present"""
-        if not self.raw_samples.size:
+        """generates raw samples if none is present
+
+        When the samples are processed in chunks, only the statistics of the samples are
+        computed, which are regenerated if the xrange has changed. The samples are also
+        regenerated if the number of workers or the kind of pool has changed.
+
+        """
+        workers = self.settings.workers
+        workers = workers, self.settings.pool if workers > 1 else None
+        if workers != self.workers_used:
+            self.clear()
+            self.workers_used = workers
+        if not self.is_chunked and not self.raw_samples.size:
             self.raw_samples = self.__compute_samples(formula)
+        if self.is_chunked and (
+                self.statistics is None or self.statistics.xrange != self.settings.xrange):
+            self.statistics = self.__accumulate_samples(formula)
 
     def clear(self):
         self.raw_samples = np.empty(0)
+        self.statistics = None
         self.values.clear()
 
     def show_histogram(self, bins=100, **kwargs):  # pragma: no cover
         """Shows the distribution of the Monte Carlo simulated samples"""
 
-        samples = self.samples
-        if "range" in kwargs:
-            xrange = kwargs.pop('range')
-            samples = np.ma.masked_outside(samples, xrange[0], xrange[1], copy=False)
-
         import matplotlib.pyplot as plt
-        n, edges, _ = plt.hist(samples, bins=bins, **kwargs)
+
+        if self.is_chunked:
+            # plot the accumulated histogram, since the raw samples are not kept
+            edges = self.statistics.edges
+            n, edges, _ = plt.hist(edges[:-1], edges, weights=self.statistics.counts, **kwargs)
+        else:
+            samples = self.samples
+            if "range" in kwargs:
+                xrange = kwargs.pop('range')
+                samples = np.ma.masked_outside(samples, xrange[0], xrange[1], copy=False)
+            n, edges, _ = plt.hist(samples, bins=bins, **kwargs)
 
         if self.settings.strategy == lit.MC_MODE_AND_CONFIDENCE:
             value, error = utils.find_mode_and_uncertainty(n, edges, self.settings.confidence)
             value_label = "mode = {:.2f}".format(value)
             plt.title("MC with {:.1f}% confidence".format(self.settings.confidence * 100))
         else:
-            value, error = np.mean(samples), np.std(samples, ddof=1)
+            value, error = (self.statistics.mean, self.statistics.std) if self.is_chunked \
+                else (np.mean(self.samples), np.std(self.samples, ddof=1))
             value_label = "mean = {:.2f}".format(value)
             plt.title("MC highlighting mean and standard deviation")
 
@@ -202,46 +276,447 @@ class MonteCarloEvaluator(Evaluator):
 
         """
 
-        sample_size = self.settings.sample_size
+        streams = self.__create_streams(formula, continued=self.settings.is_adaptive)
+        statistics = dut.MonteCarloAccumulator()
+
+        batches = []
+        for batch, sample_size in self.__batch_sizes(statistics):
+            if self.settings.workers > 1:
+                _, result_data_set = self.__simulate_in_parallel(formula, sample_size, batch)
+            else:
+                result_data_set = self.__simulate(formula, sample_size, streams)
+
+            # Check the quality of the result data
+            assert isinstance(result_data_set, np.ndarray)
+
+            # First remove undefined values
+            result_data_set = result_data_set[np.isfinite(result_data_set)]
+            if self.settings.is_adaptive:
+                statistics.add(result_data_set)
+            batches.append(result_data_set)
+
+        result_data_set = np.concatenate(batches)
+        _check_sample_quality(len(result_data_set), self.samples_used)
+
+        # return the result data set
+        return result_data_set
+
+    def __accumulate_samples(self, formula: "dt.Formula") -> "dut.MonteCarloAccumulator":
+        """Executes the Monte Carlo simulation chunk by chunk, keeping only the statistics"""
+
+        chunk_size = self.settings.chunk_size
+        statistics = dut.MonteCarloAccumulator(self.settings.xrange)
+        streams = self.__create_streams(formula, continued=True)
+
+        valid_samples = 0
+        for batch, sample_size in self.__batch_sizes(statistics):
+            if self.settings.workers > 1:
+                valid_samples += self.__simulate_in_parallel(
+                    formula, sample_size, batch, statistics)[0]
+            else:
+                for start in range(0, sample_size, chunk_size):
+                    size = min(chunk_size, sample_size - start)
+                    chunk = self.__simulate(formula, size, streams)
+                    chunk = chunk[np.isfinite(chunk)]
+                    valid_samples += len(chunk)
+                    statistics.add(chunk)
+
+        _check_sample_quality(valid_samples, self.samples_used)
+        return statistics
+
+    def __batch_sizes(self, statistics: "dut.MonteCarloAccumulator"):
+        """Yields the index and size of each batch of samples to be drawn
+
+        With a fixed sample size, all samples are drawn in a single batch. With an adaptive
+        sample size, batches are drawn until the statistics of the samples drawn so far meet
+        the target precision, or the maximum sample size is reached. The first batch is of the
+        sample size, and each following batch is of the number of samples estimated to still
+        be missing, but at most as many as have been drawn so far.
+
+        """
+
+        if not self.settings.is_adaptive:
+            self.samples_used = self.settings.sample_size
+            yield 0, self.settings.sample_size
+            return
+
+        budget = self.settings.max_sample_size
+        self.samples_used, size, batch = 0, min(self.settings.sample_size, budget), 0
+        while size > 0:
+            yield batch, size
+            self.samples_used += size
+            missing = _required_sample_size(statistics, self.settings.precision)
+            missing = missing - self.samples_used if np.isfinite(missing) else self.samples_used
+            size = int(min(missing, self.samples_used, budget - self.samples_used))
+            batch += 1
+
+    def __create_streams(self, formula: "dt.Formula", continued: bool):
+        """Creates the streams that the offsets of a simulation are drawn from
+
+        Quasi-random offsets are always drawn from a stream. With a seed, pseudo-random
+        offsets drawn in more than one go, in chunks or batches, are drawn one after another
+        from the same generators. Otherwise, None is returned, and the offsets are drawn at
+        once by dut.generate_offset_matrix.
+
+        """
+
+        sampling, seed = self.settings.sampling, self.settings.seed
+        if sampling == lit.PSEUDO_RANDOM and (seed is None or not continued):
+            return None
+
+        measurements = list(dt.get_variable_by_id(_id) for _id in self.compile(formula).sources)
+        if sampling == lit.PSEUDO_RANDOM:
+            return dut.OffsetStreams(measurements, seed)
+        return dut.QuasiRandomStream(measurements, sampling, np.random.default_rng(
+            _resolve_seed(seed)))
+
+    def __simulate(self, formula: "dt.Formula", sample_size: int, streams=None) -> np.ndarray:
+        """Evaluates the formula with a set of random samples of its source measurements
+
+        The offsets are drawn from the streams if specified. The result may be a buffer of the
+        compiled kernel, which is overwritten the next time the kernel is run.
+
+        """
+
+        kernel = self.compile(formula)
 
         # Find measurements that this formula is derived from
-        source_meas_ids = _find_source_measurement_ids(formula)  # type: Set[UUID]
+        source_meas_ids = kernel.sources  # type: List[int]
         source_measurements = list(dt.get_variable_by_id(_id) for _id in source_meas_ids)
 
+        # Generate a sample matrix with 0 mean and unit variance, correlated if applicable
+        if streams is not None:
+            sample_set = streams.draw(sample_size)
+        else:
+            sample_set = dut.generate_offset_matrix(
+                source_measurements, sample_size, self.settings.seed)
+
         # Each source measurement is assigned a set of normally distributed values with the
         # mean and standard deviation of the measurement's center value and uncertainty.
-        data_sets = {}  # type: Dict[UUID, np.ndarray]
+        data_sets = list(_generate_random_data_set(_id, sample)
+                         for _id, sample in zip(source_meas_ids, sample_set))
 
-        # Generate a sample matrix with 0 mean and unit variance, correlated if applicable
-        sample_set = dut.generate_offset_matrix(source_measurements, sample_size)
-        for _id, sample in zip(source_meas_ids, sample_set):
-            # Apply each sample to the desired mean and standard deviation of the measurement
-            data_sets[_id] = _generate_random_data_set(_id, sample)
+        return kernel.run(data_sets, sample_size)
 
-        result_data_set = _evaluate_formula(formula, data_sets)
+    def __simulate_in_parallel(self, formula: "dt.Formula", sample_size: int, batch: int,
+                               statistics: "dut.MonteCarloAccumulator" = None):
+        """Splits a batch of samples between a pool of workers
 
-        # Check the quality of the result data
-        assert isinstance(result_data_set, np.ndarray)
+        The samples are split evenly between the workers, each of which draws from its own
+        generator, spawned from a seed sequence seeded with the seed of the simulation, or by
+        the global random state, and the index of the batch, so that the result is
+        reproducible for the same seed and number of workers.
 
-        # First remove undefined values
-        result_data_set = result_data_set[np.isfinite(result_data_set)]
+        If statistics are given, the samples are processed in chunks, and the statistics of
+        the workers are merged into them. The initial bin edges of the histograms are then
+        chosen from a pilot chunk, drawn with a generator of its own, so that the histograms
+        share a grid, and can be merged after each of them has grown to cover its samples.
 
-        if len(result_data_set) / sts.get_settings().monte_carlo_sample_size < 0.9:
-            # If over 10% of the results calculated are invalid
-            warnings.warn(
-                "Over 10 percent of the random samples generated for the Monte Carlo "
-                "simulation falls outside the domain on which the function is defined. "
-                "Check the error or the standard deviation of the measurements passed in, "
-                "it is possible that the domain of this function is too narrow compared to "
-                "the standard deviation of the measurements.")
+        Returns:
+            The number of valid samples, and the valid samples or the merged statistics.
+
+        """
+
+        workers = self.settings.workers
+        shares = [sample_size // workers + (i < sample_size % workers) for i in range(workers)]
+        task = self.__prepare_task(formula, 0 if statistics is None else self.settings.chunk_size)
+
+        seeds = np.random.SeedSequence(
+            _resolve_seed(self.settings.seed), spawn_key=(batch,)).spawn(workers + 1)
+
+        accumulators = [None] * workers
+        if statistics is not None:
+            if statistics.edges is None:
+                statistics.edges = self.__find_bin_edges(task, seeds[-1])
+            accumulators = [dut.MonteCarloAccumulator(self.settings.xrange, edges=statistics.edges)
+                            for _ in shares]
+
+        with (ThreadPoolExecutor if self.settings.pool == lit.THREADS
+              else ProcessPoolExecutor)(max_workers=workers) as pool:
+            results = list(pool.map(_run_monte_carlo_worker, itertools.repeat(task), shares,
+                                    seeds[:workers], accumulators))
+
+        valid_samples = sum(valid for valid, _ in results)
+        if statistics is None:
+            return valid_samples, np.concatenate([samples for _, samples in results])
+
+        # The statistics are merged in the order of the workers, to be reproducible
+        for _, result in results:
+            statistics.merge(result)
+        return valid_samples, statistics
+
+    def __prepare_task(self, formula: "dt.Formula", chunk_size: int) -> "_SimulationTask":
+        """Gathers the plain data needed by the workers of a parallel simulation"""
+        kernel = self.compile(formula)
+        measurements = list(dt.get_variable_by_id(_id) for _id in kernel.sources)
+        centers = np.array([measurement.value for measurement in measurements], dtype=float)
+        errors = np.array([measurement.error for measurement in measurements], dtype=float)
+        factor = dut.find_correlation_factor(measurements)
+        return _SimulationTask(
+            kernel, centers, errors, factor, chunk_size, self.settings.sampling)
+
+    def __find_bin_edges(self, task: "_SimulationTask", seed: np.random.SeedSequence):
+        """Chooses the initial bin edges of the histograms of a parallel simulation"""
+        xrange = self.settings.xrange
+        _, pilot = _run_monte_carlo_worker(task, task.chunk_size, seed)
+        if xrange:
+            pilot = pilot[(pilot >= xrange[0]) & (pilot <= xrange[1])]
+        if not pilot.size:
+            return np.histogram_bin_edges(pilot, bins=100, range=xrange if xrange else None)
+        return np.histogram_bin_edges(pilot, bins=100)
+
+    def compile(self, formula: "dt.Formula") -> "kn.Kernel":
+        """Finds the compiled kernel of the formula
+
+        The formula is compiled the first time samples are computed, and the same kernel is
+        reused after the values are recalculated or the sample size is changed.
+
+        """
+        if self.kernel is None or not self.kernel.is_valid():
+            self.kernel = kn.Kernel(formula)
+        return self.kernel
+
+
+def propagate_with_derivatives(formulas: List, evaluators: List) -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluates a list of formulas at once with the derivative method
+
+    The values of sub-expressions shared between the formulas are computed once, and the
+    covariance matrix of the results is found as J * S * J^T, where J is the Jacobian of the
+    formulas with respect to the union of their source measurements, and S is the covariance
+    matrix of those measurements.
+
+    Args:
+        formulas (List): the formulas to be evaluated, or measurements
+        evaluators (List[DerivativeEvaluator]): the evaluators in which the result of each
+            formula is stored, or None for measurements
+
+    Returns:
+        The values of the formulas, and the covariance matrix between them.
+
+    """
+
+    memo = {}
+    formulas = list(formula if evaluator is None else evaluator.simplify(formula)
+                    for formula, evaluator in zip(formulas, evaluators))
+    centers = np.array([_evaluate_formula(formula, memo=memo) for formula in formulas])
+
+    source_ids = list(_find_source_measurement_ids(formula, memo) for formula in formulas)
+    sources = list(dt.get_variable_by_id(_id) for _id in sorted(set().union(*source_ids)))
+
+    jacobian = _find_jacobian(formulas, sources, memo)
+    covariance = jacobian @ dut.find_covariance_matrix(sources) @ jacobian.T
+    if np.any(np.diagonal(covariance) < 0):  # pragma: no cover
+        raise UndefinedActionError(
+            "The error propagated for the given operation is negative. This is likely "
+            "to be incorrect! Check your values, maybe you have unphysical covariance.")
+
+    errors = np.array([source.error for source in sources])
+    for row, evaluator in enumerate(evaluators):
+        if evaluator is None:
+            continue
+        variance = covariance[row, row]
+        columns = list(index for index, x in enumerate(sources) if x._id in source_ids[row])
+        quads = (errors[columns] * jacobian[row, columns]) ** 2
+        evaluator.result = dt.ValueWithError(centers[row], np.sqrt(variance))
+        evaluator.measurements = list(sources[column] for column in columns)
+        evaluator.error_contributions = quads / variance if variance > 0 else np.zeros(
+            len(quads))
+
+    return centers, covariance
+
+
+def _find_jacobian(formulas: List, sources: List, memo: Dict) -> np.ndarray:
+    """Finds the derivatives of each formula with respect to each source measurement"""
+    positions = {id(source): index for index, source in enumerate(sources)}
+    jacobian = np.zeros((len(formulas), len(sources)))
+    for row, formula in enumerate(formulas):
+        for key, derivative in _reverse_differentiate(formula, memo).items():
+            jacobian[row, positions[key]] = derivative
+    return jacobian
+
+
+def propagate_with_monte_carlo(formulas: List, evaluators: List) -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluates a list of formulas at once with the Monte Carlo method
+
+    One block of correlated samples is drawn for the union of the source measurements of the
+    formulas, with the global sample size and seed, and all formulas are evaluated on it, so
+    that the covariance matrix of the results can be found from their samples. Samples where
+    any of the results is undefined are left out.
+
+    Args:
+        formulas (List): the formulas to be evaluated, or measurements
+        evaluators (List[MonteCarloEvaluator]): the evaluators in which the samples of each
+            formula are stored, or None for measurements
+
+    Returns:
+        The mean values of the formulas, and the covariance matrix between them.
+
+    """
+
+    settings = sts.get_settings()
+    size, seed = settings.monte_carlo_sample_size, settings.monte_carlo_seed
+
+    kernels = list(kn.Kernel(formula) if evaluator is None else evaluator.compile(formula)
+                   for formula, evaluator in zip(formulas, evaluators))
+    source_ids = sorted(set().union(*(kernel.sources for kernel in kernels)))
+    sources = list(dt.get_variable_by_id(_id) for _id in source_ids)
+
+    offsets = dut.generate_offset_matrix(sources, size, seed)
+    samples = {_id: _generate_random_data_set(_id, offset)
+               for _id, offset in zip(source_ids, offsets)}
+
+    # The results are copied, since they may be buffers overwritten by the next run
+    results = np.vstack([np.array(kernel.run([samples[_id] for _id in kernel.sources], size))
+                         for kernel in kernels])
+    valid = np.all(np.isfinite(results), axis=0)
+    _check_sample_quality(np.count_nonzero(valid), size)
+
+    for result, evaluator in zip(results, evaluators):
+        if evaluator is not None and _shares_samples(evaluator, size, seed):
+            evaluator.clear()
+            evaluator.raw_samples = result[np.isfinite(result)]
+            evaluator.samples_used, evaluator.workers_used = size, (1, None)
+
+    return np.mean(results[:, valid], axis=1), np.atleast_2d(np.cov(results[:, valid]))
 
-        # return the result data set
-        return result_data_set
 
+def _shares_samples(evaluator: MonteCarloEvaluator, size: int, seed: int) -> bool:
+    """Checks if the evaluator would have drawn samples like a joint simulation"""
+    settings = evaluator.settings
+    if evaluator.is_chunked or settings.is_adaptive:
+        return False
+    return (settings.sample_size, settings.seed, settings.sampling, settings.workers) == (
+        size, seed, lit.PSEUDO_RANDOM, 1)
 
-def differentiate(formula: "dt.Formula", variable: "dt.ExperimentalValue") -> float:
-    """Find the derivative of a formula with respect to a variable"""
-    return __differentiator(formula.operator)(variable, *formula.operands)
+
+def differentiate(formula: "dt.Formula", variable: "dt.ExperimentalValue",
+                  memo: Dict = None) -> float:
+    """Find the derivative of a formula with respect to a variable
+
+    The values and derivatives of sub-expressions are recorded in a memo table keyed by the
+    identity of the nodes, so each node in the expression DAG is computed only once. The
+    table can be shared with _evaluate_formula and _find_source_measurement_ids.
+
+    """
+    memo = {} if memo is None else memo
+    key = ("derivative", id(formula), id(variable))
+    if key not in memo:
+        operands = (_MemoizedOperand(operand, memo) for operand in formula.operands)
+        memo[key] = __differentiator(formula.operator)(variable, *operands)
+    return memo[key]
+
+
+class _MemoizedOperand:
+    """Stands in for an operand of a formula, with its value and derivatives memoized"""
+
+    def __init__(self, operand, memo: Dict):
+        self.__operand = operand
+        self.__memo = memo
+
+    @property
+    def value(self):
+        """The value of the operand"""
+        return _evaluate_formula(self.__operand, memo=self.__memo)
+
+    def derivative(self, other) -> float:
+        """The derivative of the operand with respect to another value"""
+        operand = self.__operand
+        if operand is other:
+            return 1
+        if isinstance(operand, (dt.DerivedValue, cols.DerivedValueColumn)):
+            return differentiate(operand._formula, other, self.__memo)
+        if isinstance(operand, dt.Formula):
+            return differentiate(operand, other, self.__memo)
+        return operand.derivative(other)
+
+
+class _Seed:  # pylint: disable=too-few-public-methods
+    """Stands in for an operand when finding the local partial derivatives of an operator
+
+    The derivative of a seed with respect to anything is set by hand, so that calling the
+    differentiator of an operator with seeds gives the partial derivative with respect to
+    the operand whose seed is set to 1.
+
+    """
+
+    def __init__(self, value):
+        self.value = value
+        self.seed = 0
+
+    def derivative(self, _) -> int:
+        """Returns the seed, regardless of the target"""
+        return self.seed
+
+
+def _reverse_differentiate(formula: "dt.Formula",
+                           memo: Dict = None) -> Dict[int, Union[float, np.ndarray]]:
+    """Finds the derivatives of a formula with respect to all its measurements at once
+
+    This is reverse mode (adjoint) differentiation. The expression DAG is visited once in
+    reverse topological order. The derivative of the formula with respect to each node (its
+    adjoint) is passed down to the operands of the node, multiplied by the local partial
+    derivatives of the operator, so all derivatives are found in a single backward sweep.
+
+    Args:
+        formula (dt.Formula): the formula to be differentiated
+        memo (Dict): the memo table of the values of sub-expressions
+
+    Returns:
+        The derivatives with respect to each MeasuredValue or MeasuredValueColumn in the
+        formula, keyed by the id() of the object.
+
+    """
+
+    memo = {} if memo is None else memo
+    adjoints = {id(formula): 1}
+    derivatives = {}
+
+    for node in reversed(_topological_order(formula)):
+        adjoint = adjoints.pop(id(node), 0)
+        if isinstance(node, dt.Formula):
+            for operand, partial in zip(node.operands, _local_partials(node, memo)):
+                adjoints[id(operand)] = adjoints.get(id(operand), 0) + adjoint * partial
+        elif isinstance(node, (dt.DerivedValue, cols.DerivedValueColumn)):
+            adjoints[id(node._formula)] = adjoints.get(id(node._formula), 0) + adjoint
+        elif isinstance(node, (dt.MeasuredValue, cols.MeasuredValueColumn)):
+            derivatives[id(node)] = adjoint
+
+    return derivatives
+
+
+def _topological_order(formula: "dt.Formula") -> List:
+    """Lists the nodes of an expression DAG, with every node after all of its operands"""
+
+    def operands_of(node):
+        if isinstance(node, dt.Formula):
+            return node.operands
+        if isinstance(node, (dt.DerivedValue, cols.DerivedValueColumn)):
+            return [node._formula]
+        return []
+
+    order, visited = [], set()
+    stack = [(formula, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+        elif id(node) not in visited:
+            visited.add(id(node))
+            stack.append((node, True))
+            stack.extend((operand, False) for operand in operands_of(node))
+    return order
+
+
+def _local_partials(formula: "dt.Formula", memo: Dict) -> List:
+    """Finds the partial derivatives of an operator with respect to each of its operands"""
+
+    seeds = list(_Seed(_evaluate_formula(operand, memo=memo)) for operand in formula.operands)
+    partials = []
+    for seed in seeds:
+        seed.seed = 1
+        partials.append(DIFFERENTIATORS[formula.operator](None, *seeds))
+        seed.seed = 0
+    return partials
 
 
 def propagate_units(formula: "dt.Formula") -> Dict[str, dict]:
@@ -250,9 +725,13 @@ def propagate_units(formula: "dt.Formula") -> Dict[str, dict]:
     operator = formula.operator
     operands = formula.operands
 
-    # the power operator is different, treat separately
-    if operator == lit.POW and isinstance(operands[1], dt.Constant):
-        power = operands[1].value
+    # the power operator is different, treat separately. A column can be raised to an array
+    # of powers, which gives the elements the same unit only if the powers are all equal.
+    power = operands[1].value if operator == lit.POW and isinstance(
+        operands[1], dt.Constant) else None
+    if isinstance(power, np.ndarray) and power.size and np.all(power == power[0]):
+        power = float(power[0])
+    if isinstance(power, Real):
         return OrderedDict([
             (unit, count * power) for unit, count in operands[0]._unit.items()])
 
@@ -264,109 +743,201 @@ def propagate_units(formula: "dt.Formula") -> Dict[str, dict]:
     return {}
 
 
-@utils.vectorize
+def evaluate_column(formula: "dt.Formula") -> np.ndarray:
+    """Evaluates a formula over columns for all elements at once"""
+    return np.asarray(_evaluate_formula(formula), dtype=float)
+
+
+def propagate_column_error(formula: "dt.Formula", size: int) -> np.ndarray:
+    """Propagates errors through a formula over columns with the derivative method
+
+    The errors of all elements are calculated at once with vectorized operations. Each
+    element of a measured column is an independent measurement, which only contributes to
+    the elements derived from it. Scalar measurements in the formula are shared by all
+    elements, and the covariance between them is taken into account as usual.
+
+    """
+
+    # Find the scalar measurements and the measured columns this formula is derived from
+    memo = {}
+    source_meas_ids = _find_source_measurement_ids(formula, memo)
+    sources = list(dt.get_variable_by_id(_id) for _id in source_meas_ids)
+    columns = _find_source_columns(formula)
+
+    result_sums = np.zeros(size)
+
+    gradient = _reverse_differentiate(formula, memo)
+    derivatives = list(gradient.get(id(x), 0) for x in sources)
+    for var1, d1 in zip(sources, derivatives):
+        result_sums += (var1.error * d1) ** 2
+    for i, j in dt.find_correlated_pairs(sources):
+        cov = dt.get_correlation(sources[i], sources[j]) * sources[i].error * sources[j].error
+        if cov != 0:
+            result_sums += 2 * cov * derivatives[i] * derivatives[j]
+
+    for term in _find_column_quad_terms(columns, gradient):
+        result_sums += term
+
+    if np.any(result_sums < 0):  # pragma: no cover
+        raise UndefinedActionError(
+            "The error propagated for the given operation is negative. This is likely "
+            "to be incorrect! Check your values, maybe you have unphysical covariance.")
+
+    return np.sqrt(result_sums)
+
+
+def has_dependent_column_elements(formula: "dt.Formula") -> bool:
+    """Checks if the elements of the measured columns in a formula depend on other values
+
+    The errors of a formula over columns are propagated for all elements at once assuming
+    that the elements of the columns are independent measurements. This is not the case if
+    an element is derived from other values, is also a scalar in the formula, or if it is
+    correlated with any other measurement in the formula.
+
+    """
+
+    # pylint: disable=protected-access
+    roots = OrderedDict((id(column._root), column._root) for column in _find_source_columns(
+        formula))
+    elements = list(element for root in roots.values() for element in root._elements.values())
+    if not elements:
+        return False
+    if not all(isinstance(element, dt.MeasuredValue) for element in elements):
+        return True
+    sources = _find_source_measurement_ids(formula)
+    if any(element._id in sources for element in elements):
+        return True
+    return bool(dt.find_correlated_pairs(
+        elements + list(dt.get_variable_by_id(_id) for _id in sources)))
+
+
+def _vectorize(func):
+    """Vectorizes a math function, calculated for all elements at once for measurement arrays
+    """
+
+    vectorized = utils.vectorize(func)
+
+    @functools.wraps(func)
+    def wrapper_vectorize(*args):
+        if any(isinstance(arg, dts.ExperimentalValueArray) for arg in args):
+            result = dut.calculate_with_item_columns(func, *args)
+            if result is not None:
+                return result
+        return vectorized(*args)
+
+    return wrapper_vectorize
+
+
+@_vectorize
 def sqrt(x):
     """square root"""
     return _execute(lit.SQRT, x)
 
 
-@utils.vectorize
+@_vectorize
 def exp(x):
     """e raised to the power of x"""
     return _execute(lit.EXP, x)
 
 
-@utils.vectorize
+@_vectorize
 def sin(x):
     """sine of x in rad"""
     return _execute(lit.SIN, x)
 
 
-@utils.vectorize
+def _to_radians(x):
+    """Converts an angle from degrees to radians, with a single node for ExperimentalValues"""
+    if isinstance(x, dt.ExperimentalValue):
+        return dut.scale_and_shift(x, np.pi / 180, 0)
+    return x / 180 * np.pi
+
+
+@_vectorize
 def sind(x):
     """sine of x in degrees"""
-    return sin(x / 180 * np.pi)
+    return sin(_to_radians(x))
 
 
-@utils.vectorize
+@_vectorize
 def cos(x):
     """cosine of x in rad"""
     return _execute(lit.COS, x)
 
 
-@utils.vectorize
+@_vectorize
 def cosd(x):
     """cosine of x in degrees"""
-    return cos(x / 180 * np.pi)
+    return cos(_to_radians(x))
 
 
-@utils.vectorize
+@_vectorize
 def tan(x):
     """tan of x in rad"""
     return _execute(lit.TAN, x)
 
 
-@utils.vectorize
+@_vectorize
 def tand(x):
     """tan of x in degrees"""
-    return tan(x / 180 * np.pi)
+    return tan(_to_radians(x))
 
 
-@utils.vectorize
+@_vectorize
 def sec(x):
     """sec of x in rad"""
     return _execute(lit.SEC, x)
 
 
-@utils.vectorize
+@_vectorize
 def secd(x):
     """sec of x in degrees"""
-    return sec(x / 180 * np.pi)
+    return sec(_to_radians(x))
 
 
-@utils.vectorize
+@_vectorize
 def csc(x):
     """csc of x in rad"""
     return _execute(lit.CSC, x)
 
 
-@utils.vectorize
+@_vectorize
 def cscd(x):
     """csc of x in degrees"""
-    return csc(x / 180 * np.pi)
+    return csc(_to_radians(x))
 
 
-@utils.vectorize
+@_vectorize
 def cot(x):
     """cot of x in rad"""
     return _execute(lit.COT, x)
 
 
-@utils.vectorize
+@_vectorize
 def cotd(x):
     """cot of x in degrees"""
-    return cot(x / 180 * np.pi)
+    return cot(_to_radians(x))
 
 
-@utils.vectorize
+@_vectorize
 def asin(x):
     """arcsine of x"""
     return _execute(lit.ASIN, x)
 
 
-@utils.vectorize
+@_vectorize
 def acos(x):
     """arccos of x"""
     return _execute(lit.ACOS, x)
 
 
-@utils.vectorize
+@_vectorize
 def atan(x):
     """arctan of x"""
     return _execute(lit.ATAN, x)
 
 
-@utils.vectorize
+@_vectorize
 def log(*args):
     """log with a base and power
 
@@ -381,7 +952,7 @@ def log(*args):
     raise TypeError("Invalid number of arguments for log().")
 
 
-@utils.vectorize
+@_vectorize
 def log10(x):
     """log with base 10 for a value"""
     return _execute(lit.LOG10, x)
@@ -389,14 +960,14 @@ def log10(x):
 
 def mean(array):
     """The mean of an array"""
-    if isinstance(array, dts.ExperimentalValueArray):
+    if isinstance(array, (dts.ExperimentalValueArray, cols.ExperimentalValueColumn)):
         return array.mean()
     return np.mean(array)
 
 
 def sum_(array):  # avoid built-in function "sum"
     """The sum of an array"""
-    if isinstance(array, dts.ExperimentalValueArray):
+    if isinstance(array, (dts.ExperimentalValueArray, cols.ExperimentalValueColumn)):
         return array.sum()
     return np.sum(array)
 
@@ -405,10 +976,12 @@ def std(array, ddof=1):
     """The standard deviation of an array"""
     if isinstance(array, dts.ExperimentalValueArray):
         return array.std()
+    if isinstance(array, cols.ExperimentalValueColumn):
+        return array.std(ddof=ddof)
     return np.std(array, ddof=ddof)
 
 
-def _evaluate_formula(formula, samples: Dict[UUID, np.ndarray] = None):
+def _evaluate_formula(formula, samples: Dict[int, np.ndarray] = None, memo: Dict = None):
     """Evaluates a Formula with original values of measurements or sample values
 
     This function evaluates the formula with the original measurements by default. If a set
@@ -417,39 +990,174 @@ def _evaluate_formula(formula, samples: Dict[UUID, np.ndarray] = None):
     Args:
         formula (Union[dt.Formula, dt.ExperimentalValue]): the formula to be evaluated
         samples (Dict): an np.ndarray of samples assigned to each source measurements's ID.
+        memo (Dict): the memo table in which the value of each node is recorded, keyed by
+            the identity of the node, so that shared sub-expressions are evaluated once.
 
     """
     np.seterr(all="ignore")  # ignore runtime warnings
-    if samples and isinstance(formula, dt.MeasuredValue) and formula._id in samples:
+    memo = {} if memo is None else memo
+    key = ("value", id(formula))
+    if key in memo:
+        return memo[key]
+
+    if isinstance(formula, cols.ExperimentalValueColumn):
+        result = formula.values
+    elif samples and isinstance(formula, dt.MeasuredValue) and formula._id in samples:
         # Use the value in the sample instead of its original value if specified
-        return samples[formula._id]
-    if isinstance(formula, dt.DerivedValue):
-        return _evaluate_formula(formula._formula, samples)
-    if isinstance(formula, (dt.MeasuredValue, dt.Constant)):
-        return formula.value
+        result = samples[formula._id]
+    elif isinstance(formula, dt.DerivedValue):
+        result = _evaluate_formula(formula._formula, samples, memo)
+    elif isinstance(formula, (dt.MeasuredValue, dt.Constant)):
+        result = formula.value
+    else:
+        operands = (_evaluate_formula(variable, samples, memo) for variable in formula.operands)
+        result = OPERATIONS[formula.operator](*operands)
 
-    operands = (_evaluate_formula(variable, samples) for variable in formula.operands)
-    return OPERATIONS[formula.operator](*operands)
+    memo[key] = result
+    return result
 
 
-def _find_source_measurement_ids(formula) -> Set[UUID]:
+def _find_source_measurement_ids(formula, memo: Dict = None) -> Set[int]:
     """Find IDs of all measurements that the given formula is derived from"""
 
+    memo = {} if memo is None else memo
+    key = ("sources", id(formula))
+    if key in memo:
+        return memo[key]
+
     if isinstance(formula, dt.Formula):
-        return set.union(
-            *(_find_source_measurement_ids(operand) for operand in formula.operands))
-    if isinstance(formula, dt.MeasuredValue):
-        return {formula._id}
-    if isinstance(formula, dt.DerivedValue):
-        return _find_source_measurement_ids(formula._formula)
-    return set()
+        result = set.union(
+            *(_find_source_measurement_ids(operand, memo) for operand in formula.operands))
+    elif isinstance(formula, dt.MeasuredValue):
+        result = {formula._id}
+    elif isinstance(formula, (dt.DerivedValue, cols.DerivedValueColumn)):
+        result = _find_source_measurement_ids(formula._formula, memo)
+    else:
+        result = set()
+
+    memo[key] = result
+    return result
+
+
+def _find_column_quad_terms(columns: List, gradient: Dict) -> Generator:
+    """Finds the quadrature terms contributed by the measurements in columns"""
+    for column in columns:
+        # Other columns can hold the same measurement as this column at some elements, such
+        # as the column itself and its reversed view. The derivative with respect to the
+        # measurement sums up the derivatives with respect to all columns holding it, and its
+        # term is split between those columns, so that it is only counted once.
+        matches = list(other.derivative(column) for other in columns)
+        derivative = sum(gradient.get(id(other), 0) * match
+                         for other, match in zip(columns, matches))
+        yield (column.errors * derivative) ** 2 / sum(matches)
+
+
+def _find_source_columns(formula) -> List["cols.MeasuredValueColumn"]:
+    """Find all measured columns that the given formula is derived from"""
 
+    if isinstance(formula, dt.Formula):
+        columns = OrderedDict()
+        for operand in formula.operands:
+            columns.update((id(column), column) for column in _find_source_columns(operand))
+        return list(columns.values())
+    if isinstance(formula, cols.MeasuredValueColumn):
+        return [formula]
+    if isinstance(formula, cols.DerivedValueColumn):
+        return _find_source_columns(formula._formula)
+    return []
+
+
+def _check_sample_quality(valid_samples: int, sample_size: int):
+    """Warns the user if too many Monte Carlo samples are undefined"""
+    if valid_samples / sample_size < 0.9:
+        # If over 10% of the results calculated are invalid
+        warnings.warn(
+            "Over 10 percent of the random samples generated for the Monte Carlo "
+            "simulation falls outside the domain on which the function is defined. "
+            "Check the error or the standard deviation of the measurements passed in, "
+            "it is possible that the domain of this function is too narrow compared to "
+            "the standard deviation of the measurements.")
+
+
+# The plain data needed by the workers of a parallel Monte Carlo simulation: a compiled
+# kernel, the center values, errors, and correlation factor of its sources, the number of
+# samples drawn at a time, or 0 to draw all samples at once, and the sampling strategy.
+_SimulationTask = namedtuple(
+    "_SimulationTask", "kernel, centers, errors, factor, chunk_size, sampling")
+
+
+def _run_monte_carlo_worker(task: _SimulationTask, sample_size: int,
+                            seed: np.random.SeedSequence,
+                            statistics: "dut.MonteCarloAccumulator" = None):
+    """Runs a share of a Monte Carlo simulation with an independent random generator
+
+    Returns:
+        The number of valid samples, and the valid samples, or the statistics updated with
+        the valid samples if specified.
+
+    """
+
+    generator = np.random.default_rng(seed)
+    kernel = copy.copy(task.kernel)  # each worker needs its own scratch buffers
+    chunk_size = task.chunk_size if task.chunk_size else sample_size
+
+    # With quasi-random sampling, each worker draws from a sequence scrambled on its own
+    engine = None if task.sampling == lit.PSEUDO_RANDOM else dut.create_qmc_engine(
+        task.sampling, len(task.centers), generator)
+
+    valid_samples, results = 0, []
+    for start in range(0, sample_size, chunk_size):
+        size = min(chunk_size, sample_size - start)
+        offsets = generator.standard_normal((len(task.centers), size)) if engine is None \
+            else dut.draw_quasi_random_offsets(engine, size)
+        if task.factor is not None:
+            offsets = np.dot(task.factor, offsets)
+        offsets *= task.errors[:, np.newaxis]
+        offsets += task.centers[:, np.newaxis]
+        chunk = kernel.run(list(offsets), size)
+        chunk = chunk[np.isfinite(chunk)]
+        valid_samples += len(chunk)
+        if statistics is None:
+            results.append(chunk)
+        else:
+            statistics.add(chunk)
+
+    if statistics is not None:
+        return valid_samples, statistics
+    return valid_samples, np.concatenate(results) if results else np.empty(0)
+
+
+def _required_sample_size(statistics: "dut.MonteCarloAccumulator", precision: float) -> float:
+    """Estimates the number of samples needed to reach a relative precision
+
+    The standard error of the mean of n samples is std / sqrt(n), and the standard error of
+    their standard deviation is about std / sqrt(2 * (n - 1)). The precision is reached when
+    both are within the given fraction of the mean and of the standard deviation respectively.
+    The mean can never be found with a relative precision if it is 0, in which case the number
+    returned is infinite.
 
-def _generate_random_data_set(measurement_id: UUID, offsets: np.ndarray):
+    """
+
+    if statistics.count < 2:
+        return np.inf
+    error_size = 1 / (2 * precision ** 2) + 1
+    if not statistics.std:
+        return statistics.count  # the samples are all the same
+    if not statistics.mean:
+        return np.inf
+    return max((statistics.std / (precision * statistics.mean)) ** 2, error_size)
+
+
+def _resolve_seed(seed: int = None) -> int:
+    """Finds the seed of a simulation, drawn from the global random state if not specified"""
+    return int(np.random.randint(2 ** 62, dtype=np.int64)) if seed is None else seed
+
+
+def _generate_random_data_set(measurement_id: int, offsets: np.ndarray):
     """Generate random simulated measurements for each MeasuredValue
 
     This method simply applies the desired mean and standard deviation to the random
-    sample set with 0 mean and unit variance
+    sample set with 0 mean and unit variance. The offsets are transformed in place.
 
     """
 
@@ -461,7 +1169,9 @@ def _generate_random_data_set(measurement_id: UUID, offsets: np.ndarray):
     _std = measurement.error
 
     center_value = measurement.value
-    return offsets * _std + center_value
+    offsets *= _std
+    offsets += center_value
+    return offsets
 
 
 def _execute(operator: str, *operands) -> "dt.DerivedValue":
@@ -472,12 +1182,19 @@ def _execute(operator: str, *operands) -> "dt.DerivedValue":
     if all(isinstance(x, Real) for x in operands):
         return OPERATIONS[operator](*operands)
 
+    # Functions of columns are evaluated for the entire column at once
+    is_column = any(isinstance(x, cols.ExperimentalValueColumn) for x in operands)
+
     try:
         # wrap all operands in ExperimentalValue objects
-        values = list(dut.wrap_in_experimental_value(x) for x in operands)
+        values = dut.wrap_in_column_operands(*operands) if is_column else list(
+            dut.wrap_in_experimental_value(x) for x in operands)
     except TypeError:
         raise UndefinedOperationError(operator, operands, "real numbers")
 
+    if is_column:
+        return cols.DerivedValueColumn(dt.Formula(operator, values))
+
     # Construct a DerivedValue object with the operator and operands
     return dt.DerivedValue(dt.Formula(operator, list(values)))
 
@@ -513,7 +1230,12 @@ def __pow_differentiator(o, x, a):
     """
     leading = x.value ** (a.value - 1)
     first = a.value * x.derivative(o)
-    second = x.value * np.log(x.value) * a.derivative(o) if a.derivative(o) != 0 else 0
+    da = a.derivative(o)
+    if isinstance(da, np.ndarray):
+        # for columns, the log term is removed for each element where the derivative is 0
+        second = np.where(da != 0, x.value * np.log(x.value) * da, 0)
+    else:
+        second = x.value * np.log(x.value) * da if da != 0 else 0
     return leading * (first + second)
 
 
@@ -523,6 +1245,7 @@ OPERATIONS = {
     lit.SUB: lambda a, b: a - b,
     lit.MUL: lambda a, b: a * b,
     lit.DIV: lambda a, b: a / b,
+    lit.AFFINE: lambda x, scale, shift: x * scale + shift,
     lit.SQRT: np.sqrt,
     lit.EXP: np.exp,
     lit.SIN: np.sin,
@@ -547,6 +1270,7 @@ DIFFERENTIATORS = {
     lit.MUL: lambda o, a, b: a.derivative(o) * b.value + b.derivative(o) * a.value,
     lit.DIV: lambda o, a, b: (b.value * a.derivative(o) - a.value * b.derivative(o)) / (
         b.value ** 2),
+    lit.AFFINE: lambda o, x, scale, shift: scale.value * x.derivative(o),  # constants
     lit.SQRT: lambda o, x: 1 / 2 / np.sqrt(x.value) * x.derivative(o),
     lit.EXP: lambda o, x: np.exp(x.value) * x.derivative(o),
     lit.SIN: lambda o, x: np.cos(x.value) * x.derivative(o),
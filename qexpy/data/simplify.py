@@ -0,0 +1,141 @@
+"""Rewrites formulas into smaller equivalent expression trees before they are evaluated
+
+A DerivedValue keeps its formula exactly as it is written, which is needed to find the
+derivative with respect to any intermediate result, and to follow an intermediate result
+that is later overridden by the user. The evaluators, however, only need the value of the
+formula in terms of its source measurements, so they work with a simplified copy of it, in
+which the derived values are inlined and the following rewrites are applied:
+
+- Subtrees with only constants in them are folded into a single constant.
+- Negations, and additions, subtractions and multiplications with a constant, are turned
+  into scaled and shifted nodes, and chains of such nodes are combined into one.
+- Identity operations, such as adding 0, multiplying by 1, or raising to the power of 1,
+  are removed.
+
+Combining a chain of scaled and shifted nodes changes the order in which the constants are
+applied, so the result may differ from the formula as written in the last digits.
+
+"""
+
+import numpy as np
+
+from typing import Dict, List
+from numbers import Real
+from collections import namedtuple
+
+import qexpy.settings.literals as lit
+
+from . import data as dt  # pylint: disable=cyclic-import
+from . import operations as op  # pylint: disable=cyclic-import
+from . import utils as dut
+
+# The simplified copy of a formula, with the derived values inlined into it. A derived value
+# is casted to a MeasuredValue when its value or error is overridden, after which it should
+# be treated as a source measurement, and the formula has to be simplified again.
+Simplified = namedtuple("Simplified", "formula, derived_values")
+
+
+def simplify(formula: "dt.Formula") -> Simplified:
+    """Rewrites a formula into a smaller expression tree with the same value
+
+    The result is always a Formula, even if the formula is reduced to a single measurement,
+    so that it can be evaluated and compiled like any other formula.
+
+    """
+
+    derived_values = []  # type: List[dt.DerivedValue]
+    result = _simplify_node(formula, {}, derived_values)
+    if not isinstance(result, dt.Formula):
+        result = _affine(result, 1, 0)
+    return Simplified(result, derived_values)
+
+
+def is_valid(simplified: Simplified) -> bool:
+    """Checks if a simplified formula still matches the structure of the original formula"""
+    return all(isinstance(value, dt.DerivedValue) for value in simplified.derived_values)
+
+
+def _simplify_node(node, memo: Dict, derived_values: List):
+    """Simplifies a node of an expression DAG, with each shared node simplified once"""
+
+    if id(node) in memo:
+        return memo[id(node)]
+
+    if isinstance(node, dt.DerivedValue):
+        derived_values.append(node)
+        result = _simplify_node(node._formula, memo, derived_values)
+    elif isinstance(node, dt.Formula):
+        operands = list(_simplify_node(operand, memo, derived_values)
+                        for operand in node.operands)
+        result = _rewrite(node, operands)
+    else:
+        result = node  # measurements, constants and columns are left as they are
+
+    memo[id(node)] = result
+    return result
+
+
+def _rewrite(formula: "dt.Formula", operands: List):
+    """Applies the rewrites to a formula of which the operands are already simplified"""
+
+    operator = formula.operator
+
+    if all(isinstance(operand, dt.Constant) for operand in operands):
+        with np.errstate(all="ignore"):
+            return dt.Constant(op.OPERATIONS[operator](*(x.value for x in operands)))
+
+    affine = _find_scale_and_shift(operator, operands)
+    if affine is not None:
+        x, scale, shift = affine
+        inner = _find_scale_and_shift(x.operator, x.operands) if isinstance(
+            x, dt.Formula) else None
+        if inner is not None:
+            x, scale, shift = inner[0], inner[1] * scale, inner[2] * scale + shift
+        return x if scale == 1 and shift == 0 else _affine(x, scale, shift)
+
+    if operator == lit.POW and _is_real_constant(operands[1]) and operands[1].value == 1:
+        return operands[0]
+
+    if all(new is old for new, old in zip(operands, formula.operands)):
+        return formula
+    return dt.Formula(operator, operands)
+
+
+def _find_scale_and_shift(operator: str, operands: List):
+    """Finds the (x, scale, shift) of an operation equivalent to "x * scale + shift"
+
+    Returns:
+        The operand x, and the scale and shift as numbers, or None if the operation is not
+        a scaled and shifted operand.
+
+    """
+
+    if operator == lit.AFFINE:
+        return operands[0], operands[1].value, operands[2].value
+    if operator == lit.NEG:
+        return operands[0], -1, 0
+
+    if operator not in (lit.ADD, lit.SUB, lit.MUL):
+        return None
+    first, second = operands
+    if _is_real_constant(second):
+        x, constant, constant_first = first, second.value, False
+    elif _is_real_constant(first):
+        x, constant, constant_first = second, first.value, True
+    else:
+        return None
+
+    if operator == lit.SUB and constant_first:
+        return x, -1, constant
+    scale, shift = {
+        lit.ADD: (1, constant), lit.SUB: (1, -constant), lit.MUL: (constant, 0)}[operator]
+    return x, scale, shift
+
+
+def _is_real_constant(operand) -> bool:
+    return isinstance(operand, dt.Constant) and isinstance(operand.value, Real)
+
+
+def _affine(x, scale: Real, shift: Real) -> "dt.Formula":
+    return dt.Formula(lit.AFFINE, [
+        x, dut.wrap_in_experimental_value(scale), dut.wrap_in_experimental_value(shift)])
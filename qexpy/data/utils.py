@@ -1,11 +1,14 @@
 """Utility methods for the data module"""
 import warnings
+import functools
 
 import numpy as np
 
+from typing import List, Callable
 from numbers import Real
+from collections import OrderedDict
 
-from . import data as dt, datasets as dts  # pylint: disable=cyclic-import
+from . import data as dt, datasets as dts, columns as cols  # pylint: disable=cyclic-import
 
 import qexpy.settings.literals as lit
 import qexpy.settings as sts
@@ -13,14 +16,32 @@ import qexpy.utils as utils
 
 ARRAY_TYPES = np.ndarray, list
 
+# The most memory taken by cached Monte Carlo offsets, in bytes
+OFFSET_CACHE_BYTES = 2 ** 27
 
-class MonteCarloSettings:
+# The number of distinct numbers for which a Constant is kept around to be reused
+CONSTANT_CACHE_SIZE = 256
+
+# The standard normal offsets of seeded simulations, keyed by (source position, sample size,
+# seed), where the position is the index of the source in the sources of the simulation
+# sorted in the order in which they are created
+_offset_cache = OrderedDict()
+
+
+class MonteCarloSettings:  # pylint: disable=too-many-public-methods
     """The object for customizing the Monte Carlo error propagation process"""
 
     def __init__(self, evaluator):
         self.__evaluator = evaluator
         self.__settings = {
             lit.MONTE_CARLO_SAMPLE_SIZE: 0,
+            lit.MONTE_CARLO_CHUNK_SIZE: None,
+            lit.MONTE_CARLO_WORKERS: None,
+            lit.MONTE_CARLO_POOL: None,
+            lit.MONTE_CARLO_SEED: None,
+            lit.MONTE_CARLO_SAMPLING: lit.PSEUDO_RANDOM,
+            lit.MONTE_CARLO_PRECISION: None,
+            lit.MONTE_CARLO_MAX_SAMPLE_SIZE: 10 ** 7,
             lit.MONTE_CARLO_STRATEGY: lit.MC_MEAN_AND_STD,
             lit.MONTE_CARLO_CONFIDENCE: 0.68,
             lit.XRANGE: ()
@@ -44,6 +65,170 @@ class MonteCarloSettings:
         """reset the sample size to default"""
         self.__settings[lit.MONTE_CARLO_SAMPLE_SIZE] = 0
 
+    @property
+    def is_adaptive(self) -> bool:
+        """bool: True if the sample size is adapted to reach a target precision"""
+        return self.__settings[lit.MONTE_CARLO_PRECISION] is not None
+
+    @property
+    def precision(self):
+        """float: The target relative precision of an adaptive sample size"""
+        return self.__settings[lit.MONTE_CARLO_PRECISION]
+
+    @property
+    def max_sample_size(self):
+        """int: The largest number of samples drawn with an adaptive sample size"""
+        return self.__settings[lit.MONTE_CARLO_MAX_SAMPLE_SIZE]
+
+    @property
+    def samples_used(self) -> int:
+        """int: The number of samples drawn in the last simulation"""
+        return self.__evaluator.samples_used
+
+    def use_adaptive_sample_size(self, precision: float, max_sample_size: int = None):
+        """Draws samples until the value and error reach a target relative precision
+
+        The samples are drawn in batches, the first of which is of the sample size, until the
+        standard error of the mean is within the precision times the mean, and the standard
+        error of the standard deviation is within the precision times the standard deviation,
+        or until the maximum sample size is reached. The number of samples drawn can be found
+        in :py:attr:`samples_used`.
+
+        Args:
+            precision (float): the target relative precision, for example, 0.001
+            max_sample_size (int): the largest number of samples to draw
+
+        """
+        if not isinstance(precision, Real) or not 0 < precision < 1:
+            raise ValueError("The precision has to be a number between 0 and 1")
+        if max_sample_size is not None:
+            if not isinstance(max_sample_size, int) or max_sample_size <= 0:
+                raise ValueError("The maximum sample size has to be a positive integer")
+            self.__settings[lit.MONTE_CARLO_MAX_SAMPLE_SIZE] = max_sample_size
+        self.__settings[lit.MONTE_CARLO_PRECISION] = precision
+        self.__evaluator.clear()
+
+    def use_fixed_sample_size(self):
+        """Draws a fixed number of samples, given by the sample size"""
+        self.__settings[lit.MONTE_CARLO_PRECISION] = None
+        self.__evaluator.clear()
+
+    @property
+    def chunk_size(self):
+        """int: The number of samples drawn at a time
+
+        When the chunk size is smaller than the sample size, the samples are drawn, evaluated
+        and summarized one chunk at a time, so that the memory used does not grow with the
+        sample size. Only the running statistics of the samples are kept in this mode, not
+        the raw samples. Set the chunk size to 0 to draw all samples at once.
+
+        """
+        set_size = self.__settings[lit.MONTE_CARLO_CHUNK_SIZE]
+        return sts.get_settings().monte_carlo_chunk_size if set_size is None else set_size
+
+    @chunk_size.setter
+    def chunk_size(self, new_size: int):
+        if not isinstance(new_size, int) or new_size < 0:
+            raise ValueError("The chunk size has to be a non-negative integer")
+        self.__settings[lit.MONTE_CARLO_CHUNK_SIZE] = new_size
+        self.__evaluator.clear()
+
+    def reset_chunk_size(self):
+        """reset the chunk size to default"""
+        self.__settings[lit.MONTE_CARLO_CHUNK_SIZE] = None
+        self.__evaluator.clear()
+
+    @property
+    def workers(self):
+        """int: The number of workers that share the simulation
+
+        With more than one worker, the samples are split between the workers of a thread or
+        process pool, each drawing from an independent random generator spawned from a common
+        seed, and the statistics of the workers are merged exactly. The result is reproducible
+        for the same seed and number of workers, but not across different numbers of workers.
+
+        """
+        workers = self.__settings[lit.MONTE_CARLO_WORKERS]
+        return sts.get_settings().monte_carlo_workers if workers is None else workers
+
+    @workers.setter
+    def workers(self, workers: int):
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError("The number of workers has to be a positive integer")
+        self.__settings[lit.MONTE_CARLO_WORKERS] = workers
+        self.__evaluator.clear()
+
+    @property
+    def pool(self):
+        """str: The kind of pool used by the workers, "threads" or "processes"
+
+        Threads are cheaper to start, and the bulk of the work is done in numpy, which releases
+        the GIL. Processes are only worth it for long simulations.
+
+        """
+        pool = self.__settings[lit.MONTE_CARLO_POOL]
+        return sts.get_settings().monte_carlo_pool if pool is None else pool
+
+    @pool.setter
+    def pool(self, pool: str):
+        if pool not in [lit.THREADS, lit.PROCESSES]:
+            raise ValueError("The pool has to be either \"threads\" or \"processes\"")
+        self.__settings[lit.MONTE_CARLO_POOL] = pool
+        self.__evaluator.clear()
+
+    def reset_workers(self):
+        """reset the number of workers and the kind of pool to default"""
+        self.__settings[lit.MONTE_CARLO_WORKERS] = None
+        self.__settings[lit.MONTE_CARLO_POOL] = None
+        self.__evaluator.clear()
+
+    @property
+    def seed(self):
+        """int: The seed of the simulation
+
+        With a seed, each source measurement draws its samples from a PCG64 generator seeded
+        with the seed and the ID of the measurement. The results are reproducible, and values
+        derived from the same measurements with the same seed share the samples of those
+        measurements, so their samples are consistently correlated. The samples drawn at once
+        are also cached, to be reused by other values instead of drawn again.
+
+        """
+        seed = self.__settings[lit.MONTE_CARLO_SEED]
+        return sts.get_settings().monte_carlo_seed if seed is None else seed
+
+    @seed.setter
+    def seed(self, seed: int):
+        if not isinstance(seed, int) or seed < 0:
+            raise ValueError("The seed has to be a non-negative integer")
+        self.__settings[lit.MONTE_CARLO_SEED] = seed
+        self.__evaluator.clear()
+
+    def reset_seed(self):
+        """reset the seed to default"""
+        self.__settings[lit.MONTE_CARLO_SEED] = None
+        self.__evaluator.clear()
+
+    @property
+    def sampling(self):
+        """str: The sampling strategy, "pseudo_random", "sobol", or "latin_hypercube"
+
+        Instead of pseudo-random samples, the simulation can be run with quasi-random samples
+        from a scrambled Sobol sequence or a Latin hypercube, which cover the space of the
+        source measurements more evenly, so the same accuracy is reached with fewer samples.
+        The Sobol sequence works best with sample sizes that are powers of 2.
+
+        """
+        return self.__settings[lit.MONTE_CARLO_SAMPLING]
+
+    @sampling.setter
+    def sampling(self, strategy: str):
+        if strategy not in [lit.PSEUDO_RANDOM, lit.SOBOL, lit.LATIN_HYPERCUBE]:
+            raise ValueError(
+                "The sampling strategy has to be one of \"pseudo_random\", \"sobol\", or "
+                "\"latin_hypercube\"")
+        self.__settings[lit.MONTE_CARLO_SAMPLING] = strategy
+        self.__evaluator.clear()
+
     @property
     def confidence(self):
         """float: The confidence level for choosing the mode of a Monte Carlo distribution"""
@@ -128,15 +313,287 @@ class MonteCarloSettings:
         return self.__evaluator.raw_samples.copy()
 
 
-def generate_offset_matrix(measurements, sample_size):
+class MonteCarloAccumulator:  # pylint: disable=too-many-instance-attributes
+    """Accumulates the statistics of Monte Carlo samples processed in chunks
+
+    The running mean and variance are combined chunk by chunk using Welford's algorithm, in
+    the parallel form given by Chan et al. The samples are also counted into a histogram, of
+    which the bin edges are chosen from the first chunk unless specified. The histogram grows
+    by whole bins to take in samples falling outside of it, and whenever it would have more
+    than twice the number of bins it was created with, neighbouring bins are merged in pairs.
+    No samples are left out of the histogram, and the number of bins stays bounded, so the
+    memory used does not depend on the number of samples.
+
+    The bins always lie on a grid starting at the first of the initial edges, with the width
+    of the initial bins times a power of two, so histograms with the same initial edges can
+    be merged after they have grown.
+
+    The bins differ from the 100 bins spanning all samples that are used when the samples are
+    kept, so the mode and confidence interval found from the histogram approximate the ones
+    found from all samples at once, to within the width of a bin.
+
+    Args:
+        xrange (tuple): the range of samples to take into account, if specified
+        bins (int): the number of bins in the histogram
+        edges (np.ndarray): the bin edges of the histogram, if known in advance
+
+    """
+
+    def __init__(self, xrange=(), bins=100, edges=None):
+        self.xrange = xrange
+        self.count = 0
+        self.mean = 0.0
+        self.sum_of_squares = 0.0  # the sum of squared differences from the mean
+        self.bins = bins if edges is None else len(edges) - 1
+        self.counts = np.zeros(self.bins, dtype=int)
+        self.grid = None  # the origin and the width of the initial bins
+        self.width = 0.0  # the width of the bins
+        self.start = 0  # the position of the first bin on the grid
+        if edges is not None:
+            self.edges = edges
+
+    @property
+    def edges(self) -> np.ndarray:
+        """np.ndarray: The bin edges of the histogram, or None if not chosen yet"""
+        if self.grid is None:
+            return None
+        return self.grid[0] + (self.start + np.arange(len(self.counts) + 1)) * self.width
+
+    @edges.setter
+    def edges(self, edges: np.ndarray):
+        if self.count:
+            raise ValueError("Cannot change the bin edges of a histogram with samples in it")
+        edges = np.asarray(edges, dtype=float)
+        self.grid, self.width, self.start = (edges[0], edges[1] - edges[0]), edges[1] - edges[0], 0
+        self.counts = np.zeros(len(edges) - 1, dtype=int)
+
+    @property
+    def std(self) -> float:
+        """float: The standard deviation of the samples"""
+        return np.sqrt(self.sum_of_squares / (self.count - 1)) if self.count > 1 else 0.0
+
+    def add(self, samples: np.ndarray):
+        """Adds a chunk of samples to the statistics"""
+
+        if self.xrange:
+            samples = samples[(samples >= self.xrange[0]) & (samples <= self.xrange[1])]
+        if not samples.size:
+            return
+
+        if self.grid is None:
+            self.edges = np.histogram_bin_edges(samples, bins=self.bins)
+        self.__cover(np.min(samples), np.max(samples))
+        self.counts += np.bincount(self.__find_bins(samples), minlength=len(self.counts))
+
+        mean = np.mean(samples)
+        self.__combine(samples.size, mean, np.sum((samples - mean) ** 2))
+
+    def merge(self, other: "MonteCarloAccumulator"):
+        """Merges the statistics of another accumulator into this one
+
+        The moments are merged exactly. The histograms can only be merged if they were
+        created with the same bin edges, which is the case when the edges are given in
+        advance. The finer of the two histograms is coarsened to match the other.
+
+        """
+
+        if not other.count:
+            return
+        if self.grid is None:
+            self.grid, self.bins, self.width, self.start = \
+                other.grid, other.bins, other.width, other.start
+            self.counts = np.zeros(len(other.counts), dtype=int)
+        elif self.grid != other.grid:
+            raise ValueError("Cannot merge histograms with different bin edges")
+
+        counts, width, start = other.counts, other.width, other.start
+        while True:
+            while width < self.width:
+                counts, width, start = _merge_bins(counts, width, start)
+            while self.width < width:
+                self.counts, self.width, self.start = _merge_bins(
+                    self.counts, self.width, self.start)
+            self.__cover(self.grid[0] + start * width,
+                         self.grid[0] + (start + len(counts)) * width)
+            if self.width == width:
+                break
+
+        offset = start - self.start
+        self.counts[offset:offset + len(counts)] += counts
+        self.__combine(other.count, other.mean, other.sum_of_squares)
+
+    def __find_bins(self, samples: np.ndarray) -> np.ndarray:
+        """Finds the bins of samples within the histogram, with the last edge included"""
+        bins = np.floor((samples - self.grid[0]) / self.width).astype(int) - self.start
+        return np.clip(bins, 0, len(self.counts) - 1)
+
+    def __cover(self, low: float, high: float):
+        """Grows the histogram until it covers a range, merging bins to keep them bounded"""
+
+        origin = self.grid[0]
+        while True:
+            first = min(self.start, int(np.floor((low - origin) / self.width)))
+            # the last edge belongs to the last bin, as in np.histogram
+            last = max(self.start + len(self.counts),
+                       int(np.ceil((high - origin) / self.width)))
+            if last - first <= 2 * self.bins:
+                break
+            self.counts, self.width, self.start = _merge_bins(
+                self.counts, self.width, self.start)
+
+        self.counts = np.concatenate([
+            np.zeros(self.start - first, dtype=int), self.counts,
+            np.zeros(last - self.start - len(self.counts), dtype=int)])
+        self.start = first
+
+    def __combine(self, count: int, mean: float, sum_of_squares: float):
+        """Combines the moments of another set of samples with the running moments"""
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.sum_of_squares += sum_of_squares + delta ** 2 * self.count * count / total
+        self.count = total
+
+
+def _merge_bins(counts: np.ndarray, width: float, start: int):
+    """Merges the bins of a histogram in pairs, keeping the new bins on the grid"""
+    if start % 2:
+        counts, start = np.concatenate([[0], counts]), start - 1
+    if len(counts) % 2:
+        counts = np.concatenate([counts, [0]])
+    return counts.reshape(-1, 2).sum(axis=1), width * 2, start // 2
+
+
+class OffsetStreams:  # pylint: disable=too-few-public-methods
+    """Independent streams of random offsets for a set of measurements
+
+    Each measurement draws from its own generator, seeded with the seed of the simulation and
+    the position of the measurement among the sources of the simulation, so the offsets are
+    reproduced when the same calculation is built again. The offsets are drawn one chunk
+    after another, and the chunks add up to the same offsets as drawing all of them at once.
+
+    Args:
+        measurements (List[dt.ExperimentalValue]): a set of measurements to simulate
+        seed (int): the seed of the simulation
+
+    """
+
+    def __init__(self, measurements, seed: int):
+        self.measurements = measurements
+        self.__generators = [_source_generator(position, seed)
+                             for position in _find_source_positions(measurements)]
+
+    def draw(self, size: int) -> np.ndarray:
+        """Draws the next chunk of offsets, correlated if applicable"""
+        offsets = np.vstack([generator.standard_normal(size) for generator in self.__generators])
+        return correlate_samples(self.measurements, offsets)
+
+
+class QuasiRandomStream:  # pylint: disable=too-few-public-methods
+    """A stream of quasi-random offsets for a set of measurements
+
+    Points are drawn from a scrambled low-discrepancy sequence in the unit hypercube, with one
+    dimension for each measurement, and transformed to standard normal offsets with the
+    inverse of the normal CDF. The Sobol sequence continues from one chunk to the next, while
+    each chunk of a Latin hypercube is stratified on its own.
+
+    Args:
+        measurements (List[dt.ExperimentalValue]): a set of measurements to simulate
+        strategy (str): the sampling strategy, "sobol" or "latin_hypercube"
+        generator (np.random.Generator): the generator used to scramble the sequence
+
+    """
+
+    def __init__(self, measurements, strategy: str, generator: np.random.Generator):
+        self.measurements = measurements
+        self.__engine = create_qmc_engine(strategy, len(measurements), generator)
+
+    def draw(self, size: int) -> np.ndarray:
+        """Draws the next chunk of offsets, correlated if applicable"""
+        return correlate_samples(self.measurements, draw_quasi_random_offsets(
+            self.__engine, size))
+
+
+def create_qmc_engine(strategy: str, dimensions: int, generator: np.random.Generator):
+    """Creates a scrambled quasi-Monte Carlo engine for a sampling strategy"""
+    from scipy.stats import qmc  # pylint: disable=import-outside-toplevel
+    engine = qmc.Sobol if strategy == lit.SOBOL else qmc.LatinHypercube
+    return engine(dimensions, seed=generator)
+
+
+def draw_quasi_random_offsets(engine, size: int) -> np.ndarray:
+    """Draws standard normal offsets from a quasi-Monte Carlo engine, one row per dimension"""
+    from scipy.stats import norm  # pylint: disable=import-outside-toplevel
+    with warnings.catch_warnings():
+        # The Sobol sequence is only balanced for sample sizes that are powers of 2, which
+        # makes it less accurate, but still valid, for other sizes.
+        warnings.simplefilter("ignore")
+        points = engine.random(size)
+    return np.ascontiguousarray(norm.ppf(points).T)
+
+
+def _find_source_positions(measurements) -> List[int]:
+    """Finds the positions of measurements when sorted in the order in which they are created
+
+    The IDs of the measurements differ from one run of a calculation to another, while the
+    order in which the measurements are created, and thus their positions, stay the same.
+
+    """
+    order = sorted(range(len(measurements)), key=lambda index: measurements[index]._id)
+    positions = [0] * len(measurements)
+    for position, index in enumerate(order):
+        positions[index] = position
+    return positions
+
+
+def _source_generator(position: int, seed: int) -> np.random.Generator:
+    """Creates the random generator of a source in a seeded simulation"""
+    sequence = np.random.SeedSequence(seed, spawn_key=(position,))
+    return np.random.Generator(np.random.PCG64(sequence))
+
+
+def _find_cached_offsets(position: int, sample_size: int, seed: int) -> np.ndarray:
+    """Finds the offsets of a source in a seeded simulation, drawn once and cached
+
+    The least recently used offsets are evicted once the cache outgrows OFFSET_CACHE_BYTES.
+    The cached arrays are read-only, since they are shared by different simulations.
+
+    """
+
+    key = position, sample_size, seed
+    if key in _offset_cache:
+        _offset_cache.move_to_end(key)
+        return _offset_cache[key]
+
+    offsets = _source_generator(position, seed).standard_normal(sample_size)
+    offsets.flags.writeable = False
+    _offset_cache[key] = offsets
+
+    cached_bytes = sum(cached.nbytes for cached in _offset_cache.values())
+    while cached_bytes > OFFSET_CACHE_BYTES:
+        _, evicted = _offset_cache.popitem(last=False)
+        cached_bytes -= evicted.nbytes
+    return offsets
+
+
+def clear_offset_cache():
+    """Clears the cached offsets of seeded Monte Carlo simulations"""
+    _offset_cache.clear()
+
+
+def generate_offset_matrix(measurements, sample_size, seed: int = None):
     """Generates offsets from mean for each measurement
 
     Each sample set generated has 0 mean and unit variance. Then covariance is applied to the
-    set of samples using the Chelosky algorithm.
+    set of samples using the Chelosky algorithm. Without a seed, the offsets are drawn from
+    the global numpy random state. With a seed, the offsets of each measurement are drawn from
+    the generator of its position among the measurements, and cached for other simulations
+    with the same seed.
 
     Args:
         measurements (List[dt.ExperimentalValue]): a set of measurements to simulate
         sample_size (int): the size of the samples
+        seed (int): the seed of the simulation, if any
 
     Returns:
         A N row times M column matrix where N is the number of measurements to simulate and
@@ -145,8 +602,12 @@ def generate_offset_matrix(measurements, sample_size):
 
     """
 
-    offset_matrix = np.vstack(
-        [np.random.normal(0, 1, sample_size) for _ in measurements])
+    if seed is None:
+        offset_matrix = np.vstack(
+            [np.random.normal(0, 1, sample_size) for _ in measurements])
+    else:
+        offset_matrix = np.vstack([_find_cached_offsets(
+            position, sample_size, seed) for position in _find_source_positions(measurements)])
     offset_matrix = correlate_samples(measurements, offset_matrix)
     return offset_matrix
 
@@ -170,21 +631,56 @@ def correlate_samples(variables, sample_vector):
 
     """
 
-    corr_matrix = np.array(
-        [[dt.get_correlation(row, col) for col in variables] for row in variables])
+    chelosky_decomposition = find_correlation_factor(variables)
+    if chelosky_decomposition is None:
+        return sample_vector
+    return np.dot(chelosky_decomposition, sample_vector)
+
+
+def find_covariance_matrix(variables) -> np.ndarray:
+    """Finds the covariance matrix of a list of measurements
+
+    The covariance between two measurements is found from their correlation factor and their
+    current uncertainties, as in the error propagation of a single value.
+
+    """
+
+    errors = np.array([variable.error for variable in variables], dtype=float)
+    cov_matrix = np.diag(errors ** 2)
+    for i, j in dt.find_correlated_pairs(variables):
+        corr = dt.get_correlation(variables[i], variables[j])
+        cov_matrix[i, j] = cov_matrix[j, i] = corr * errors[i] * errors[j]
+    return cov_matrix
+
+
+def find_correlation_factor(variables):
+    """Finds the Chelosky decomposition of the correlation matrix of a list of measurements
+
+    Returns:
+        The lower triangular factor of the correlation matrix, or None if the measurements are
+        not correlated, or if their correlation matrix is not physical.
+
+    """
+
+    pairs = dt.find_correlated_pairs(variables)
+    if not pairs:
+        return None  # if no correlations are present
+
+    corr_matrix = np.diag(np.array(
+        [dt.get_correlation(variable, variable) for variable in variables], dtype=float))
+    for i, j in pairs:
+        corr_matrix[i, j] = corr_matrix[j, i] = dt.get_correlation(variables[i], variables[j])
     if np.count_nonzero(corr_matrix - np.diag(np.diagonal(corr_matrix))) == 0:
-        return sample_vector  # if no correlations are present
+        return None  # if the correlations have been set to 0
 
     try:
-        chelosky_decomposition = np.linalg.cholesky(corr_matrix)
-        result_vector = np.dot(chelosky_decomposition, sample_vector)
-        return result_vector
-    except np.linalg.linalg.LinAlgError:  # pragma: no cover
+        return np.linalg.cholesky(corr_matrix)
+    except np.linalg.LinAlgError:  # pragma: no cover
         warnings.warn(
             "Fail to generate a physical correlation matrix for the values provided, using "
             "uncorrelated samples instead. Please check that the covariance or correlation "
             "factors assigned to the measurements are physical.")
-        return sample_vector
+        return None
 
 
 def wrap_in_experimental_value(operand) -> "dt.ExperimentalValue":
@@ -196,7 +692,7 @@ def wrap_in_experimental_value(operand) -> "dt.ExperimentalValue":
     """
 
     if isinstance(operand, Real):
-        return dt.Constant(operand)
+        return _find_cached_constant(operand)
     if isinstance(operand, dt.ExperimentalValue):
         return operand
     if isinstance(operand, tuple) and len(operand) == 2:
@@ -205,6 +701,107 @@ def wrap_in_experimental_value(operand) -> "dt.ExperimentalValue":
         "Cannot parse a {} into an ExperimentalValue".format(type(operand).__name__))
 
 
+@functools.lru_cache(maxsize=CONSTANT_CACHE_SIZE, typed=True)
+def _find_cached_constant(value: Real) -> "dt.Constant":
+    """Finds the Constant for a number, which is shared by all formulas using that number
+
+    Constants are never modified after they are created, so the same instance can appear in
+    any number of formulas. The cache is typed, so that 2 and 2.0 get different Constants.
+
+    """
+    return dt.Constant(value)
+
+
+def scale_and_shift(operand: "dt.ExperimentalValue", scale: Real, shift: Real):
+    """Builds the value of "operand * scale + shift" as a single node
+
+    This is the fast path for arithmetic between an ExperimentalValue and a plain number,
+    which would otherwise take a generic formula, and for chains of such operations with
+    numbers only, such as the conversion of angles from degrees to radians.
+
+    """
+    return dt.DerivedValue(dt.Formula(lit.AFFINE, [
+        operand, _find_cached_constant(scale), _find_cached_constant(shift)]))
+
+
+def wrap_in_column_operands(*operands) -> List:
+    """Wraps the operands of a calculation with columns in objects that can enter a Formula
+
+    Columns are returned directly, ExperimentalValueArrays are wrapped in columns over their
+    items, and arrays of numbers are wrapped in Constant objects. All other operands are
+    wrapped in ExperimentalValue objects, which are shared by all elements. The columns and
+    arrays involved must have the same length.
+
+    """
+
+    size = next(len(x) for x in operands if isinstance(x, cols.ExperimentalValueColumn))
+
+    def wrap_in_column_operand(operand):
+        if isinstance(operand, dts.ExperimentalValueArray):
+            operand = wrap_in_item_column(operand)
+        if isinstance(operand, cols.ExperimentalValueColumn):
+            if len(operand) != size:
+                raise ValueError("The lengths of the columns don't match.")
+            return operand
+        if isinstance(operand, ARRAY_TYPES):
+            values = np.asarray(operand)
+            if values.dtype.kind not in "biuf":
+                raise TypeError("Some values in the array are not real numbers")
+            if values.size != size:
+                raise ValueError("The length of the array doesn't match that of the column.")
+            return dt.Constant(values.astype(float).ravel())
+        return wrap_in_experimental_value(operand)
+
+    return [wrap_in_column_operand(operand) for operand in operands]
+
+
+def calculate_with_item_columns(function: Callable, *operands):
+    """Calculates a function of measurement arrays for all elements at once
+
+    Each ExperimentalValueArray among the operands is replaced with a column over its items,
+    so the result is a DerivedValueColumn named after the first array. This is only done for
+    one-dimensional arrays when errors are propagated with the derivative method, and when
+    the other operands can enter a calculation with columns.
+
+    Returns:
+        The result of the function, or None if it should be calculated element by element.
+
+    """
+
+    if sts.get_settings().error_method != sts.ErrorMethod.DERIVATIVE:
+        return None
+
+    arrays = list(x for x in operands if isinstance(x, dts.ExperimentalValueArray))
+    size = arrays[0].shape[0] if arrays and arrays[0].ndim == 1 else -1
+
+    def is_column_operand(operand):
+        if isinstance(operand, dts.ExperimentalValueArray):
+            return operand.shape == (size,)
+        if isinstance(operand, ARRAY_TYPES):
+            values = np.asarray(operand)
+            return values.dtype.kind in "biuf" and values.shape == (size,)
+        if isinstance(operand, cols.ExperimentalValueColumn):
+            return len(operand) == size
+        if isinstance(operand, tuple):
+            return len(operand) == 2 and all(isinstance(x, Real) for x in operand)
+        return isinstance(operand, (Real, dt.ExperimentalValue))
+
+    if not arrays or not all(is_column_operand(operand) for operand in operands):
+        return None
+
+    result = function(*(wrap_in_item_column(operand) if isinstance(
+        operand, dts.ExperimentalValueArray) else operand for operand in operands))
+    result.name = arrays[0].name or ""
+    return result
+
+
+def wrap_in_item_column(array: "dts.ExperimentalValueArray") -> "cols.ItemColumn":
+    """Wraps the items of a one-dimensional ExperimentalValueArray in a column"""
+    items = array.view(np.ndarray)
+    unit = items[0]._unit if items.size else {}  # pylint: disable=protected-access
+    return cols.ItemColumn(items, unit=unit, name=array.name or "")
+
+
 def wrap_in_measurement(value, **kwargs) -> "dt.ExperimentalValue":
     """Wraps a value in a Measurement object"""
 
@@ -12,6 +12,7 @@ from .utils import FitModelInfo, FitParamConstraints
 
 import qexpy.data.data as dt
 import qexpy.data.datasets as dts
+import qexpy.data.columns as cols
 import qexpy.settings.literals as lit
 import qexpy.utils as utils
 
@@ -46,7 +47,7 @@ class XYFitResult:
         y_err = self._dataset.ydata - y_fit_res
 
         chi2 = sum(
-            (res.value / err) ** 2 for res, err in zip(y_err, self._dataset.yerr) if err != 0)
+            (res / err) ** 2 for res, err in zip(y_err.values, self._dataset.yerr) if err != 0)
 
         self._result = FitResults(result_func, result_params, y_err, chi2, pcorr)
 
@@ -82,7 +83,7 @@ class XYFitResult:
 
     @property
     def residuals(self):
-        """dts.ExperimentalValueArray: The residuals of the fit"""
+        """cols.DerivedValueColumn: The residuals of the fit"""
         return self._result.residuals
 
     @property
@@ -164,8 +165,7 @@ def fit_to_xy_dataset(dataset: dts.XYDataSet, model, **kwargs) -> XYFitResult:
 
     xrange = kwargs.get("xrange", None)
     if xrange and utils.validate_xrange(xrange):
-        x_to_fit = dataset.xdata[(xrange[0] <= dataset.xdata) & (dataset.xdata < xrange[1])]
-        y_to_fit = dataset.ydata[(xrange[0] <= dataset.xdata) & (dataset.xdata < xrange[1])]
+        x_to_fit, y_to_fit = __select_data_in_range(dataset, xrange)
     else:
         x_to_fit = dataset.xdata
         y_to_fit = dataset.ydata
@@ -216,10 +216,10 @@ def __try_fit_to_xdata_and_ydata(*args, **kwargs):
     ydata = kwargs.pop("ydata", args[1] if len(args) > 1 else None)
     model = kwargs.pop("model", args[2] if len(args) > 2 else None)
 
-    if not isinstance(xdata, dts.ExperimentalValueArray):
+    if not isinstance(xdata, (dts.ExperimentalValueArray, cols.ExperimentalValueColumn)):
         xdata = np.asarray(xdata) if isinstance(xdata, ARRAY_TYPES) else np.empty(0)
 
-    if not isinstance(ydata, dts.ExperimentalValueArray):
+    if not isinstance(ydata, (dts.ExperimentalValueArray, cols.ExperimentalValueColumn)):
         ydata = np.asarray(ydata) if isinstance(ydata, ARRAY_TYPES) else np.empty(0)
 
     if xdata.size and ydata.size and model:
@@ -228,6 +228,14 @@ def __try_fit_to_xdata_and_ydata(*args, **kwargs):
     return None
 
 
+def __select_data_in_range(dataset: dts.XYDataSet, xrange: tuple):
+    """Selects the data points within an x range, as views of the data of the data set"""
+
+    xvalues = dataset.xvalues
+    in_range = (xrange[0] <= xvalues) & (xvalues < xrange[1])
+    return dataset.xdata[in_range], dataset.ydata[in_range]
+
+
 def __polynomial_fit(xdata, ydata, degrees, yerr) -> RawFitResults:
     """perform a polynomial fit with numpy.polyfit"""
 
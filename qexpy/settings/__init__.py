@@ -3,4 +3,5 @@
 from .settings import ErrorMethod, PrintStyle, UnitStyle, SigFigMode
 from .settings import get_settings, reset_default_configuration
 from .settings import set_sig_figs_for_value, set_sig_figs_for_error, set_error_method, \
-    set_print_style, set_unit_style, set_monte_carlo_sample_size, set_plot_dimensions
+    set_print_style, set_unit_style, set_monte_carlo_sample_size, set_plot_dimensions, \
+    set_monte_carlo_chunk_size, set_monte_carlo_workers, set_monte_carlo_seed
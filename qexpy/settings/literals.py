@@ -27,6 +27,13 @@ SIG_FIGS = "significant_figures"
 SIG_FIG_MODE = "mode"
 SIG_FIG_VALUE = "value"
 MONTE_CARLO_SAMPLE_SIZE = "monte_carlo_sample_size"
+MONTE_CARLO_CHUNK_SIZE = "monte_carlo_chunk_size"
+MONTE_CARLO_WORKERS = "monte_carlo_workers"
+MONTE_CARLO_POOL = "monte_carlo_pool"
+MONTE_CARLO_SEED = "monte_carlo_seed"
+MONTE_CARLO_SAMPLING = "monte_carlo_sampling"
+MONTE_CARLO_PRECISION = "monte_carlo_precision"
+MONTE_CARLO_MAX_SAMPLE_SIZE = "monte_carlo_max_sample_size"
 
 LATEX = "latex"
 SCIENTIFIC = "scientific"
@@ -34,6 +41,11 @@ FRACTION = "fraction"
 EXPONENTS = "exponents"
 SET_TO_VALUE = "set_to_value"
 SET_TO_ERROR = "set_to_error"
+PSEUDO_RANDOM = "pseudo_random"
+SOBOL = "sobol"
+LATIN_HYPERCUBE = "latin_hypercube"
+THREADS = "threads"
+PROCESSES = "processes"
 
 # operators
 OPERATOR = "operator"
@@ -43,6 +55,7 @@ ADD = "add"
 SUB = "sub"
 MUL = "mul"
 DIV = "div"
+AFFINE = "affine"
 SQRT = "sqrt"
 SIN = "sin"
 COS = "cos"
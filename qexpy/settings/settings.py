@@ -56,6 +56,10 @@ class Settings:
                 lit.SIG_FIG_VALUE: 1
             },
             lit.MONTE_CARLO_SAMPLE_SIZE: 100000,
+            lit.MONTE_CARLO_CHUNK_SIZE: 0,
+            lit.MONTE_CARLO_WORKERS: 1,
+            lit.MONTE_CARLO_POOL: lit.THREADS,
+            lit.MONTE_CARLO_SEED: None,
             lit.PLOT_DIMENSIONS: (6.4, 4.8)
         }
 
@@ -163,6 +167,73 @@ class Settings:
         else:
             raise ValueError("The sample size has to be a positive integer")
 
+    @property
+    def monte_carlo_chunk_size(self) -> int:
+        """int: The default number of samples drawn at a time in Monte Carlo error propagation
+
+        When the chunk size is smaller than the sample size, the samples are drawn and
+        evaluated one chunk at a time, and only the running statistics of the samples are
+        kept, so the memory used does not grow with the sample size. The raw samples are not
+        stored in this mode. A chunk size of 0 means all samples are drawn at once.
+
+        """
+        return self.__config[lit.MONTE_CARLO_CHUNK_SIZE]
+
+    @monte_carlo_chunk_size.setter
+    def monte_carlo_chunk_size(self, size: int):
+        if isinstance(size, int) and size >= 0:
+            self.__config[lit.MONTE_CARLO_CHUNK_SIZE] = size
+        else:
+            raise ValueError("The chunk size has to be a non-negative integer")
+
+    @property
+    def monte_carlo_workers(self) -> int:
+        """int: The default number of workers that share a Monte Carlo simulation
+
+        With more than one worker, the samples are split between the workers of a thread or
+        process pool, each drawing from an independent random generator. The result is
+        reproducible for the same random seed and number of workers.
+
+        """
+        return self.__config[lit.MONTE_CARLO_WORKERS]
+
+    @monte_carlo_workers.setter
+    def monte_carlo_workers(self, workers: int):
+        if isinstance(workers, int) and workers > 0:
+            self.__config[lit.MONTE_CARLO_WORKERS] = workers
+        else:
+            raise ValueError("The number of workers has to be a positive integer")
+
+    @property
+    def monte_carlo_pool(self) -> str:
+        """str: The kind of pool used by the Monte Carlo workers, threads or processes"""
+        return self.__config[lit.MONTE_CARLO_POOL]
+
+    @monte_carlo_pool.setter
+    def monte_carlo_pool(self, pool: str):
+        if pool in [lit.THREADS, lit.PROCESSES]:
+            self.__config[lit.MONTE_CARLO_POOL] = pool
+        else:
+            raise ValueError("The pool has to be either \"threads\" or \"processes\"")
+
+    @property
+    def monte_carlo_seed(self) -> int:
+        """int: The default seed of Monte Carlo simulations
+
+        When a seed is set, the samples are drawn from PCG64 generators seeded with it, so the
+        results are reproducible, and the same measurement is assigned the same samples in
+        every simulation. When the seed is None, the global numpy random state is used.
+
+        """
+        return self.__config[lit.MONTE_CARLO_SEED]
+
+    @monte_carlo_seed.setter
+    def monte_carlo_seed(self, seed: int):
+        if seed is None or isinstance(seed, int) and seed >= 0:
+            self.__config[lit.MONTE_CARLO_SEED] = seed
+        else:
+            raise ValueError("The seed has to be a non-negative integer or None")
+
     @property
     def plot_dimensions(self) -> (float, float):
         """The default dimensions of a plot in inches"""
@@ -184,6 +255,10 @@ class Settings:
         self.__config[lit.SIG_FIGS][lit.SIG_FIG_VALUE] = 1
         self.__config[lit.UNIT_STYLE] = UnitStyle.EXPONENTS
         self.__config[lit.MONTE_CARLO_SAMPLE_SIZE] = 10000
+        self.__config[lit.MONTE_CARLO_CHUNK_SIZE] = 0
+        self.__config[lit.MONTE_CARLO_WORKERS] = 1
+        self.__config[lit.MONTE_CARLO_POOL] = lit.THREADS
+        self.__config[lit.MONTE_CARLO_SEED] = None
         self.__config[lit.PLOT_DIMENSIONS] = (6.4, 4.8)
 
 
@@ -227,6 +302,23 @@ def set_monte_carlo_sample_size(size: int):
     get_settings().monte_carlo_sample_size = size
 
 
+def set_monte_carlo_chunk_size(size: int):
+    """Sets the number of samples drawn at a time in a Monte Carlo simulation"""
+    get_settings().monte_carlo_chunk_size = size
+
+
+def set_monte_carlo_workers(workers: int, pool: str = None):
+    """Sets the number of workers, and optionally the kind of pool, for Monte Carlo"""
+    get_settings().monte_carlo_workers = workers
+    if pool is not None:
+        get_settings().monte_carlo_pool = pool
+
+
+def set_monte_carlo_seed(seed: int):
+    """Sets the default seed of Monte Carlo simulations, or None to use the global state"""
+    get_settings().monte_carlo_seed = seed
+
+
 def set_plot_dimensions(new_dimensions: (float, float)):
     """Sets the default dimensions of a plot"""
     get_settings().plot_dimensions = new_dimensions
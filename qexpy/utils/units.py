@@ -370,6 +370,10 @@ def __neg(units):
     return deepcopy(units)
 
 
+def __affine(units, _scale, _shift):
+    return deepcopy(units)
+
+
 def __add_and_sub(units_var1, units_var2):
     if units_var1 and units_var2 and units_var1 != units_var2:
         warnings.warn("You're trying to add/subtract two values with mismatching units.")
@@ -415,5 +419,6 @@ UNIT_OPERATIONS = {
     lit.SUB: __add_and_sub,
     lit.MUL: __mul,
     lit.DIV: __div,
+    lit.AFFINE: __affine,
     lit.SQRT: __sqrt
 }
@@ -66,8 +66,23 @@ def calculate_covariance(arr_x, arr_y):
     """Calculates the covariance of two arrays"""
     if len(arr_x) != len(arr_y):
         raise ValueError("Cannot calculate covariance for arrays of different lengths.")
-    return 1 / (len(arr_x) - 1) * sum(
-        ((x - np.mean(arr_x)) * (y - np.mean(arr_y)) for x, y in zip(arr_x, arr_y)))
+    arr_x, arr_y = np.asarray(arr_x, dtype=float), np.asarray(arr_y, dtype=float)
+    return float(np.dot(arr_x - np.mean(arr_x), arr_y - np.mean(arr_y)) / (len(arr_x) - 1))
+
+
+def calculate_weighted_mean(values, errors) -> (float, float):
+    """Calculates the error weighted mean of an array and its propagated error
+
+    Each value is weighted by the inverse square of its error. If any of the errors is 0,
+    the weights are undefined, and both results are nan.
+
+    """
+    errors = np.asarray(errors, dtype=float)
+    if not np.all(errors):
+        return np.nan, np.nan
+    weights = 1 / errors ** 2
+    total = np.sum(weights)
+    return float(np.dot(weights, values) / total), float(1 / np.sqrt(total))
 
 
 def cov2corr(pcov: np.ndarray) -> np.ndarray:
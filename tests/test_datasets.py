@@ -7,6 +7,7 @@ import numpy as np
 from qexpy.utils.exceptions import IllegalArgumentError
 
 from qexpy.data.datasets import ExperimentalValueArray
+from qexpy.data.columns import MeasuredValueColumn
 
 
 class TestExperimentalValueArray:
@@ -71,6 +72,7 @@ class TestExperimentalValueArray:
         a = a.insert(1, (1.5, 0.5))
         assert str(a[1]) == "test_1 = 1.5 +/- 0.5 [m]"
         assert str(a[-1]) == "test_5 = 5.0 +/- 0.5 [m]"
+        assert a.names == list(item.name for item in a)
         a = a.delete(1)
         assert str(a[1]) == "test_1 = 2.0 +/- 0.5 [m]"
 
@@ -106,6 +108,69 @@ class TestExperimentalValueArray:
         a = a.append([8, 9, 10])
         assert str(a[-1]) == "speed_11 = 10 +/- 0 [m⋅s^-1]"
 
+    def test_grow_measurement_array(self):
+        """tests for building a measurement array by appending to it"""
+
+        a = q.MeasurementArray([1, 2, 3], 0.5, name="test", unit="m")
+        b = a.append(4)
+        c = b.append(5)
+        c[0] = q.Measurement(10, 1)
+        assert b[0].value == 1
+        assert a[0].value == 1
+        assert str(c[0]) == "test_0 = 10 +/- 1 [m]"
+
+        d = b.extend([5, 6], [0.1, 0.2])
+        assert len(d) == 6
+        assert all(d.errors[-2:] == [0.1, 0.2])
+        assert str(d[-1]) == "test_5 = 6.0 +/- 0.2 [m]"
+
+        with pytest.raises(TypeError):
+            d.extend([1, '2'])
+        with pytest.raises(ValueError):
+            d.extend([1, 2], [0.1])
+
+        builder = q.MeasurementArrayBuilder(unit="m", name="test")
+        for value in range(1, 101):
+            builder.append((value, 0.5))
+        builder.extend([101, 102], 0.1)
+        e = builder.build()
+        assert len(e) == 102
+        assert all(e.values == np.arange(1, 103))
+        assert str(e[-1]) == "test_101 = 102.0 +/- 0.1 [m]"
+
+        builder.append(103)
+        e[0] = (0, 0.5)
+        assert len(e) == 102
+        assert builder.build()[0].value == 1
+
+    def test_slice_measurement_array(self):
+        """tests that slicing a measurement array leaves its measurements as they are"""
+
+        a = q.MeasurementArray([1, 2, 3, 4, 5], 0.5, name="test", unit="m")
+        b = a[1:4]
+        c = a[a.values > 2]
+        assert b.name == "test"
+        assert c.name == "test"
+        assert str(b[0]) == "test_1 = 2.0 +/- 0.5 [m]"
+        assert str(c[0]) == "test_2 = 3.0 +/- 0.5 [m]"
+        assert str(a[1]) == "test_1 = 2.0 +/- 0.5 [m]"
+        assert b[0] is a[1]
+
+        b.name = "part"
+        assert str(a[1]) == "part_0 = 2.0 +/- 0.5 [m]"
+        assert b.names == ["part_0", "part_1", "part_2"]
+        assert a.names == ["test_0", "test_1", "test_2", "test_3", "test_4"]
+        assert a.name == "test"
+
+        d = a * 2
+        assert str(d[1]) == "test_1 = 4 +/- 1 [m]"
+
+        e = np.maximum(a[::-1], 2)
+        assert e[0] is a[4]
+        assert a[4].name == "test_4"
+        assert np.fmax(a, 0)[4] is a[4]
+        assert a[4].name == "test_4"
+
     def test_calculations_with_measurement_array(self):
         """tests for calculating properties of a measurement array"""
 
@@ -124,6 +189,120 @@ class TestExperimentalValueArray:
         assert b.error_weighted_mean() == pytest.approx(1.5600683241601823)
         assert b.propagated_error() == pytest.approx(0.08265842980736918)
 
+        # the values and errors follow the changes to the array and its items
+        b[0] = (2, 0.1)
+        assert b.sum() == 16
+        b[1].value = 3
+        assert b.mean() == 3.4
+        b[1:][0] = (4, 0.2)
+        assert all(b.values == [2, 4, 3, 4, 5])
+        b[4].error = 0.2
+        assert b.errors[4] == 0.2
+        b.values[0] = 10
+        assert b.values[0] == 2
+
+        c = q.MeasurementArray([3, 1, 2], [0.1, 0.2, 0.3])
+        assert c.mean() == 2
+        c.sort()
+        assert all(c.values == [1, 2, 3])
+        assert all(c.errors == [0.2, 0.3, 0.1])
+        assert c.error_weighted_mean() == pytest.approx(
+            np.average([1, 2, 3], weights=[25, 1 / 0.09, 100]))
+
+
+class TestMeasuredValueColumn:
+    """tests for the columnar storage of measurements"""
+
+    def test_record_measurement_column(self):
+        """tests for recording measurements in a column"""
+
+        a = q.MeasurementArray([1, 2, 3, 4, 5], 0.5, name="test", unit="m", columnar=True)
+        assert isinstance(a, MeasuredValueColumn)
+        assert isinstance(a, q.MeasurementColumn)
+        assert len(a) == 5
+        assert a.values.dtype == np.float64
+        assert all(a.values == [1, 2, 3, 4, 5])
+        assert all(a.errors == [0.5, 0.5, 0.5, 0.5, 0.5])
+        assert a.name == "test"
+        assert a.unit == "m"
+        assert str(a) == "test = [ 1.0 +/- 0.5, 2.0 +/- 0.5, 3.0 +/- 0.5, 4.0 +/- 0.5, " \
+                         "5.0 +/- 0.5 ] (m)"
+
+        b = q.MeasurementArray([1, 2, 3], relative_error=0.1, columnar=True)
+        assert b.errors == pytest.approx([0.1, 0.2, 0.3])
+
+        with pytest.raises(TypeError):
+            q.MeasurementArray([1, 2, '3'], columnar=True)
+        with pytest.raises(ValueError):
+            q.MeasurementArray([1, 2, 3], [0.1, 0.2], columnar=True)
+        with pytest.raises(ValueError):
+            q.MeasurementArray([1, 2, 3], -0.5, columnar=True)
+        with pytest.raises(TypeError):
+            q.MeasurementArray([1, 2, 3], '0.5', columnar=True)
+
+    def test_buffers_and_elements(self):
+        """tests that elements are materialized from the shared buffers"""
+
+        a = q.MeasurementArray([1, 2, 3, 4, 5], 0.5, name="test", unit="m", columnar=True)
+        with pytest.raises(ValueError):
+            a.values[0] = 10
+
+        assert str(a[0]) == "test_0 = 1.0 +/- 0.5 [m]"
+        assert str(a[-1]) == "test_4 = 5.0 +/- 0.5 [m]"
+        assert a[2] is a[2]
+        with pytest.raises(IndexError):
+            _ = a[5]
+
+        view = a[1:4]
+        assert isinstance(view, MeasuredValueColumn)
+        assert np.shares_memory(view.values, a.values)
+        assert view[0] is a[1]
+        assert str(view[0]) == "test_1 = 2.0 +/- 0.5 [m]"
+        assert view[::-1][0] is a[3]
+
+        a[1] = (10, 0.2)
+        assert view.values[0] == 10
+        assert a[1].value == 10
+        assert a[1].error == 0.2
+
+        element = a[2]
+        element.value = 20
+        element.error = 0.3
+        assert a.values[2] == 20
+        assert view.values[1] == 20
+        assert a.errors[2] == 0.3
+        element.relative_error = 0.1
+        assert a.errors[2] == 2
+
+        masked = a[a.values > 3]
+        assert all(masked.values == [10, 20, 4, 5])
+        assert not np.shares_memory(masked.values, a.values)
+
+    def test_calculations_with_measurement_column(self):
+        """tests for calculating properties of a measurement column"""
+
+        a = q.MeasurementArray([1, 2, 3, 4, 5], [0.1, 0.2, 0.3, 0.4, 0.5], columnar=True)
+        assert a.mean().value == 3
+        assert a.std() == pytest.approx(1.58113883008419)
+        assert a.sum().value == 15
+        assert a.error_on_mean() == pytest.approx(0.707106781186548)
+        assert a.error_weighted_mean() == pytest.approx(1.5600683241601823)
+        assert a.propagated_error() == pytest.approx(0.08265842980736918)
+
+        b = q.MeasurementArray([1, 2, 3, 4, 5], columnar=True)
+        with pytest.warns(UserWarning):
+            assert np.isnan(b.error_weighted_mean())
+
+        assert q.mean(a).value == 3
+        assert q.std(a) == pytest.approx(1.58113883008419)
+        assert q.sum(a).value == 15
+        assert q.mean(a * 2).value == 6
+
+        dataset = q.XYDataSet(a, b * 2, xname="x")
+        assert all(dataset.xvalues == [1, 2, 3, 4, 5])
+        assert all(dataset.yvalues == [2, 4, 6, 8, 10])
+        assert dataset.xdata[2] is a[2]
+
 
 class TestXYDataSet:
     """tests for the XYDataSet class"""
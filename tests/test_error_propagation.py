@@ -1,9 +1,16 @@
 """Tests for different error propagation methods"""
 
 import pytest
+import numpy as np
 import qexpy as q
 
-from qexpy.data.data import ExperimentalValue, MeasuredValue
+from qexpy.data.data import ExperimentalValue, MeasuredValue, Constant, Formula
+from qexpy.data.kernels import Kernel
+from qexpy.data.simplify import simplify
+import qexpy.data.utils as dut
+
+from qexpy.data.utils import MonteCarloAccumulator
+from qexpy.data.operations import _evaluate_formula
 from qexpy.utils.exceptions import IllegalArgumentError
 
 
@@ -26,6 +33,52 @@ class TestDerivedValue:
         assert res.error == pytest.approx(0.0719622917128924443443)
         assert str(res) == "1.87 +/- 0.07"
 
+    def test_derivative_method_with_many_sources(self):
+        """tests the derivative method on expressions with shared terms and many sources"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(2, 0.2)
+        c = q.Measurement(3, 0.3)
+        a.set_correlation(c, 0.3)
+
+        x = a * b
+        res = q.sin(x) * x / (x + c) ** c
+        expected = sum((var.error * res.derivative(var)) ** 2 for var in [a, b, c])
+        expected += 2 * a.get_covariance(c) * res.derivative(a) * res.derivative(c)
+        assert res.error == pytest.approx(expected ** 0.5)
+
+        measurements = [q.Measurement(i, 0.1) for i in range(1, 101)]
+        total = sum(var ** 2 for var in measurements)
+        assert total.error == pytest.approx(
+            sum((2 * i * 0.1) ** 2 for i in range(1, 101)) ** 0.5)
+
+    def test_shared_sub_expressions(self):
+        """tests that shared sub-expressions are handled in deep expressions"""
+
+        a = q.Measurement(1, 0.01)
+        res = a
+        for _ in range(40):
+            res = res * res / res + res - res
+
+        assert res.value == pytest.approx(1)
+        assert res.error == pytest.approx(0.01)
+        assert res.derivative(a) == pytest.approx(1)
+
+    def test_identical_sub_expressions(self):
+        """tests that structurally identical derived values share their formula"""
+
+        c = q.Measurement(4, 0.2)
+        first, second = q.sqrt(c), q.sqrt(c)
+        assert first is not second
+        assert first._formula is second._formula
+        assert len(Kernel((first + second)._formula).instructions) == 2
+
+        with pytest.warns(UserWarning):
+            first.value = 3
+        assert second.value == 2
+        third = q.sqrt(c)
+        assert q.sqrt(c)._formula is third._formula
+
     def test_monte_carlo_method(self):
         """tests error propagation using the monte carlo method"""
 
@@ -111,6 +164,318 @@ class TestDerivedValue:
         with pytest.warns(UserWarning):
             assert res.value != pytest.approx(-4.6)
 
+    def test_compiled_kernel(self):
+        """tests evaluating formulas with compiled kernels"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(2, 0.2)
+        c = q.Measurement(3, 0.1)
+
+        x = a * b
+        res = q.log(c, q.sqrt(x) + x) ** 2 / q.sec(b / 10) - q.atan(-b)
+
+        kernel = Kernel(res._formula)
+        assert sorted(kernel.sources) == sorted([a._id, b._id, c._id])
+        assert kernel.buffer_count < len(kernel.instructions)
+
+        samples = [np.random.normal(var.value, var.error, 100) for var in [a, b, c]]
+        expected = _evaluate_formula(res._formula, dict(zip(kernel.sources, samples)))
+        assert kernel.run(samples, 100) == pytest.approx(expected)
+
+        value = res.value
+        res.error_method = q.ErrorMethod.MONTE_CARLO
+        assert res.value == pytest.approx(value, rel=0.05)
+
+        # the results are updated with the same kernel after the values are changed
+        c.value = 4
+        res.recalculate()
+        assert res.value == pytest.approx(_evaluate_formula(res._formula), rel=0.05)
+
+        res.mc.sample_size = 1000
+        assert res.mc.samples().size == 1000
+
+    def test_simplified_formula(self):
+        """tests that formulas are simplified before they are evaluated"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(2, 0.1)
+
+        mid = -(-(a * 2 + 1))
+        res = (3 * (mid - 1)) ** 1 + b * 1
+
+        formula = simplify(res._formula).formula
+        assert formula.operator == "add"
+        assert formula.operands[1] is b
+        assert formula.operands[0].operator == "affine"
+        assert formula.operands[0].operands[0] is a
+        assert [x.value for x in formula.operands[0].operands[1:]] == [6, 0]
+
+        formula = simplify(Formula("add", [Constant(1), Constant(2)])).formula
+        assert formula.operands[0].value == 3
+
+        assert res.value == 32
+        assert res.error == pytest.approx(np.sqrt(3 ** 2 + 0.1 ** 2))
+        assert res.derivative(mid) == 3
+
+        # the intermediate result is followed after it is overridden
+        with pytest.warns(UserWarning):
+            mid.value = 10
+        res.recalculate()
+        assert res.value == 29
+
+    def test_chunked_monte_carlo(self):
+        """tests the monte carlo method with samples processed in chunks"""
+
+        samples = np.random.normal(0, 1, 1000)
+        statistics = MonteCarloAccumulator()
+        for chunk in np.split(samples, 4):
+            statistics.add(chunk)
+        assert statistics.count == 1000
+        assert statistics.mean == pytest.approx(np.mean(samples))
+        assert statistics.std == pytest.approx(np.std(samples, ddof=1))
+        assert np.sum(statistics.counts) == 1000
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(2, 0.2)
+        res = q.sqrt((a + b) / 2)
+        res.error_method = q.ErrorMethod.MONTE_CARLO
+
+        q.set_monte_carlo_chunk_size(10000)
+        res.mc.sample_size = 200000
+        assert res.value == pytest.approx(1.87, abs=1e-2)
+        assert res.error == pytest.approx(0.071962291712, abs=1e-3)
+        assert res.mc.samples().size == 0
+
+        res.mc.use_mode_with_confidence(0.68)
+        assert res.value == pytest.approx(1.87, abs=2e-2)
+        assert res.error == pytest.approx(0.071962291712, abs=1e-2)
+
+        res.mc.use_mean_and_std()
+        res.mc.set_xrange(1.8, 2)
+        assert 1.8 < res.value < 2
+
+        # the samples are drawn at once if the chunk size is reset to 0
+        res.mc.chunk_size = 0
+        assert res.mc.samples().size == 200000
+        res.mc.reset_chunk_size()
+        assert res.mc.chunk_size == 10000
+
+    def test_chunked_monte_carlo_confidence(self):
+        """tests that the histogram of chunked samples keeps the tails of the distribution"""
+
+        samples = np.random.normal(1, 0.5, 100000) ** 3
+        statistics = MonteCarloAccumulator()
+        for chunk in np.split(samples, 100):
+            statistics.add(chunk)
+        assert np.sum(statistics.counts) == 100000
+        assert statistics.edges[0] <= np.min(samples)
+        assert statistics.edges[-1] >= np.max(samples)
+        assert len(statistics.counts) <= 200
+
+        a = q.Measurement(1, 0.5)
+        res = a ** 3
+        res.error_method = q.ErrorMethod.MONTE_CARLO
+        res.mc.seed = 7
+        res.mc.use_mode_with_confidence(0.9973)
+        value, error = res.value, res.error
+        samples = res._evaluators["monte-carlo"].samples
+        width = (np.max(samples) - np.min(samples)) / 100
+
+        # the histograms have different bins, so the results only agree to within a bin
+        res.mc.chunk_size = 1000
+        assert res.value == pytest.approx(value, abs=width)
+        assert res.error == pytest.approx(error, abs=width)
+
+    def test_parallel_monte_carlo(self):
+        """tests the monte carlo method with samples split between workers"""
+
+        first, second = MonteCarloAccumulator(edges=np.linspace(-5, 5, 101)), \
+            MonteCarloAccumulator(edges=np.linspace(-5, 5, 101))
+        samples = np.random.normal(0, 1, 1000)
+        first.add(samples[:300])
+        second.add(samples[300:])
+        first.merge(second)
+        assert first.count == 1000
+        assert first.mean == pytest.approx(np.mean(samples))
+        assert first.std == pytest.approx(np.std(samples, ddof=1))
+        assert np.sum(first.counts) == 1000
+
+        other = MonteCarloAccumulator()
+        other.add(samples[:10])
+        with pytest.raises(ValueError):
+            first.merge(other)
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(2, 0.2)
+        q.set_covariance(a, b, 0.08)
+        res = q.sqrt((a + b) / 2)
+        res.error_method = q.ErrorMethod.MONTE_CARLO
+        res.mc.sample_size = 100001
+        res.mc.workers = 3
+
+        np.random.seed(42)
+        assert res.value == pytest.approx(1.87, abs=1e-2)
+        assert res.error == pytest.approx(0.08964214570007, abs=1e-3)
+        samples = res.mc.samples()
+        assert samples.size == 100001
+
+        # the samples are reproducible for the same seed and number of workers
+        res.recalculate()
+        np.random.seed(42)
+        assert res.value == pytest.approx(1.87, abs=1e-2)
+        assert np.array_equal(res.mc.samples(), samples)
+
+        res.mc.chunk_size = 10000
+        for pool in ["threads", "processes"]:
+            res.mc.pool = pool
+            res.recalculate()
+            np.random.seed(42)
+            assert res.value == pytest.approx(1.87, abs=1e-2)
+            assert res.error == pytest.approx(0.08964214570007, abs=1e-3)
+            res.mc.use_mode_with_confidence(0.68)
+            assert res.value == pytest.approx(1.87, abs=2e-2)
+            res.mc.use_mean_and_std()
+
+        res.mc.reset_workers()
+        assert res.mc.workers == 1
+
+        # the samples are drawn again when the workers or the pool are changed
+        res.mc.chunk_size = 0
+        res.mc.seed = 7
+        value = res.value
+        evaluator = res._evaluators["monte-carlo"]
+        assert evaluator.raw_samples.size
+        res.mc.pool = "threads"
+        assert not evaluator.raw_samples.size
+
+        value = res.value
+        q.set_monte_carlo_workers(2)
+        assert res.value != value
+        assert res.mc.workers == 2
+
+    def test_seeded_monte_carlo(self):
+        """tests the monte carlo method with seeded generators"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(2, 0.2)
+        c = q.Measurement(3, 0.3)
+
+        res1 = a * b
+        res2 = a + b + c
+        q.set_monte_carlo_seed(7)
+        res1.error_method = q.ErrorMethod.MONTE_CARLO
+        res2.error_method = q.ErrorMethod.MONTE_CARLO
+        assert res1.value == pytest.approx(10, abs=0.1)
+        assert res2.value == pytest.approx(10, abs=0.1)
+
+        # the values share the samples of their common source measurements
+        assert np.corrcoef(res1.mc.samples(), res2.mc.samples())[0][1] > 0.5
+
+        # the offsets are cached, and drawn again only with a different seed
+        cached = dut._find_cached_offsets(0, 10000, 7)
+        assert cached is dut._find_cached_offsets(0, 10000, 7)
+        samples = res1.mc.samples()
+        res1.recalculate()
+        assert res1.value == pytest.approx(10, abs=0.1)
+        assert np.array_equal(res1.mc.samples(), samples)
+        res1.mc.seed = 8
+        assert res1.value == pytest.approx(10, abs=0.1)
+        assert not np.array_equal(res1.mc.samples(), samples)
+
+        # the same samples are drawn in chunks, so only the rounding errors differ
+        res1.mc.reset_seed()
+        res1.mc.chunk_size = 1000
+        assert res1.value == pytest.approx(np.mean(samples))
+        assert res1.error == pytest.approx(np.std(samples, ddof=1))
+
+        dut.clear_offset_cache()
+        assert not dut._offset_cache
+
+        # the same calculation built again from scratch gives the same samples
+        def calculate():
+            x = q.Measurement(5, 0.5)
+            y = q.Measurement(3, 0.3)
+            result = x ** 2 / y
+            result.error_method = q.ErrorMethod.MONTE_CARLO
+            return result
+
+        first = calculate()
+        first_samples = first.mc.samples()
+        dut.clear_offset_cache()
+        second = calculate()
+        assert np.array_equal(second.mc.samples(), first_samples)
+        assert second.value == first.value
+        assert second.error == first.error
+
+    def test_quasi_monte_carlo(self):
+        """tests the monte carlo method with quasi-random samples"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(2, 0.2)
+        q.set_covariance(a, b, 0.08)
+        res = q.sqrt((a + b) / 2)
+        res.error_method = q.ErrorMethod.MONTE_CARLO
+        res.mc.sample_size = 4096
+
+        with pytest.raises(ValueError):
+            res.mc.sampling = "halton"
+
+        for strategy in ["sobol", "latin_hypercube"]:
+            res.mc.sampling = strategy
+            assert res.value == pytest.approx(1.87, abs=1e-2)
+            assert res.error == pytest.approx(0.08964214570007, abs=1e-3)
+
+        # the sample mean of a linear function is far more accurate than with random samples
+        total = a + b
+        total.error_method = q.ErrorMethod.MONTE_CARLO
+        total.mc.sample_size = 1024
+        total.mc.sampling = "sobol"
+        assert total.value == pytest.approx(7, abs=1e-3)
+        assert total.error == pytest.approx(0.67082039325, abs=1e-2)
+
+        total.mc.seed = 3
+        total.mc.chunk_size = 256
+        assert total.value == pytest.approx(7, abs=1e-3)
+        total.mc.workers = 2
+        assert total.value == pytest.approx(7, abs=1e-3)
+        assert total.error == pytest.approx(0.67082039325, abs=1e-2)
+
+    def test_adaptive_monte_carlo(self):
+        """tests the monte carlo method with an adaptive sample size"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(2, 0.2)
+        res = q.sqrt((a + b) / 2)
+        res.error_method = q.ErrorMethod.MONTE_CARLO
+
+        with pytest.raises(ValueError):
+            res.mc.use_adaptive_sample_size(2)
+        with pytest.raises(ValueError):
+            res.mc.use_adaptive_sample_size(0.01, max_sample_size=0)
+
+        # the error is the harder one to pin down, which takes about 1 / (2 * 0.01 ** 2)
+        res.mc.sample_size = 1000
+        res.mc.use_adaptive_sample_size(0.01)
+        assert res.value == pytest.approx(1.87, abs=1e-2)
+        assert res.error == pytest.approx(0.071962291712, abs=3e-3)
+        assert 5000 <= res.mc.samples_used <= 16000
+        assert res.mc.samples().size == res.mc.samples_used
+
+        res.mc.use_adaptive_sample_size(0.0001, max_sample_size=50000)
+        res.mc.chunk_size = 3000
+        res.mc.seed = 5
+        assert res.value == pytest.approx(1.87, abs=1e-2)
+        assert res.mc.samples_used == 50000
+
+        res.mc.workers = 2
+        res.mc.use_adaptive_sample_size(0.01)
+        assert res.error == pytest.approx(0.071962291712, abs=3e-3)
+        assert 5000 <= res.mc.samples_used <= 16000
+
+        res.mc.use_fixed_sample_size()
+        assert res.value == pytest.approx(1.87, abs=1e-2)
+        assert res.mc.samples_used == 1000
+
     def test_correlated_measurements(self):
         """tests error propagation for correlated measurements"""
 
@@ -125,6 +490,116 @@ class TestDerivedValue:
         res.error_method = q.ErrorMethod.MONTE_CARLO
         assert res.error == pytest.approx(0.0896421457001, abs=1e-2)
 
+    def test_lightweight_derived_value(self):
+        """tests that derived values are created without instance dicts or evaluators"""
+
+        a = q.Measurement(5, 0.5)
+        res = a * 2 + a
+
+        assert not hasattr(res, "__dict__")
+        assert not hasattr(a, "__dict__")
+        assert res._evaluators is None
+
+        assert res.value == 15
+        assert list(res._evaluators) == ["derivative"]
+        assert res.mc.sample_size == 10000
+        assert list(res._evaluators) == ["derivative", "monte-carlo"]
+
+    def test_dependency_tracking(self):
+        """tests that derived values are updated when their sources change"""
+
+        a = q.Measurement(5, 0.2)
+        b = q.Measurement(4, 0.1)
+
+        mid = a * b
+        res = mid + b
+        other = b * 2
+
+        assert res.value == 24
+        assert other.value == 8
+
+        a.value = 6
+        assert res._evaluators["derivative"].result == ()
+        assert other._evaluators["derivative"].result != ()
+        assert res.value == 28
+
+        error = res.error
+        q.set_correlation(a, b, 0.5)
+        assert res.error > error
+        q.reset_correlations()
+        assert res.error == error
+
+        with pytest.warns(UserWarning):
+            mid.value = 100
+        assert res.value == 104
+        a.value = 1
+        assert res.value == 104
+
+        # the values derived from the elements of a column follow the column
+        col = q.MeasurementColumn([1, 2, 3], 0.1)
+        element = col[1]
+        doubled = element * 2
+        assert doubled.value == 4
+        col[1] = 10
+        assert doubled.value == 20
+        col[1:] = (5, 0.5)
+        assert doubled.value == 10
+        assert doubled.error == 1
+
+        # references to discarded dependents are pruned
+        for _ in range(100):
+            _ = element + 1
+        assert len(element._dependents) < 32
+
+    def test_batch_propagation(self):
+        """tests evaluating many values at once"""
+
+        a = q.Measurement(5, 0.2)
+        b = q.Measurement(4, 0.1)
+        q.set_correlation(a, b, 0.5)
+
+        total, diff, prod = a + b, a - b, a * b
+        result = q.propagate([total, diff, prod, a])
+        assert result.values == pytest.approx([9, 1, 20, 5])
+        assert result.errors[:3] == pytest.approx([total.error, diff.error, prod.error])
+        assert result.covariance[0, 1] == pytest.approx(0.2 ** 2 - 0.1 ** 2)
+        assert result.covariance[3, 3] == pytest.approx(0.04)
+        assert total._evaluators["derivative"].measurements == [a, b]
+
+        # the results are stored in the values
+        c = a / b
+        q.propagate([c])
+        assert c._evaluators["derivative"].result != ()
+
+        q.set_monte_carlo_seed(7)
+        result = q.propagate([total, diff, a], method="monte-carlo")
+        assert result.values == pytest.approx([9, 1, 5], rel=0.01)
+        assert result.covariance[0, 1] == pytest.approx(0.03, rel=0.1)
+        assert total._evaluators["monte-carlo"].raw_samples.size == 10000
+        total.error_method = q.ErrorMethod.MONTE_CARLO
+        assert total.error == pytest.approx(result.errors[0])
+
+        with pytest.raises(ValueError):
+            q.propagate([total], method="exact")
+        with pytest.raises(IllegalArgumentError):
+            q.propagate([1, 2])
+
+    def test_covariance_between_derived_values(self):
+        """tests the covariance between values derived from the same measurements"""
+
+        a = q.Measurement(5, 0.2)
+        b = q.Measurement(4, 0.1)
+
+        total, diff = a + b, a - b
+        assert total.get_covariance(diff) == pytest.approx(0.03)
+        assert q.get_correlation(diff, total) == pytest.approx(0.6)
+        assert total._evaluators["derivative"].covariances[diff._id] == pytest.approx(0.03)
+        assert (total + diff).error == pytest.approx(np.sqrt(0.05 + 0.05 + 2 * 0.03))
+
+        b.error = 0.2
+        assert diff._evaluators["derivative"].covariances == {}
+        assert q.get_covariance(total, diff) == pytest.approx(0)
+
     def test_manipulate_derived_value(self):
         """unit tests for the derived value class"""
 
@@ -52,6 +52,13 @@ class TestFitting:
         assert result[0].value == pytest.approx(2, abs=0.15)
         assert result[1].value == pytest.approx(3, abs=0.15)
 
+        # fitting to measurement columns
+        x = q.MeasurementArray(a, 0.1, columnar=True)
+        y = q.MeasurementArray(b[:-1] + [23.16547138], 0.1, columnar=True)
+        result = q.fit(x, y, model=q.FitModel.LINEAR)
+        assert result[0].value == pytest.approx(2, abs=result[0].error)
+        assert result[1].value == pytest.approx(3, abs=result[1].error)
+
     def test_polynomial_fit(self):
         """tests for fitting to a polynomial"""
 
@@ -1,11 +1,13 @@
 """Unit tests for recording individual and arrays of measurements"""
 
+import gc
 import pytest
 
 import numpy as np
 import qexpy as q
 
 from qexpy.data.data import RepeatedlyMeasuredValue, MeasuredValue, UndefinedActionError
+from qexpy.data.data import ExperimentalValue, find_correlated_pairs, get_variable_by_id
 from qexpy.data.datasets import ExperimentalValueArray
 from qexpy.utils.exceptions import IllegalArgumentError
 
@@ -151,6 +153,36 @@ class TestMeasuredValue:
         assert isinstance(a, MeasuredValue)
         assert a.value == 15
 
+    def test_raw_data_of_repeated_measurements(self):
+        """test that the raw data of repeated measurements is stored as plain arrays"""
+
+        data = np.random.normal(10, 0.5, 10000)
+        a = q.Measurement(data, 0.5, unit="m", name="length")
+        assert a._raw_data.array is None
+        assert a.mean == pytest.approx(np.mean(data))
+        assert a.std == pytest.approx(np.std(data, ddof=1))
+        assert a.error_weighted_mean == pytest.approx(np.mean(data))
+        assert a.propagated_error == pytest.approx(0.005)
+        assert a._raw_data.array is None
+
+        raw_data = a.raw_data
+        assert isinstance(raw_data, ExperimentalValueArray)
+        assert raw_data is a.raw_data
+        assert raw_data.name == "length"
+        assert str(raw_data.unit) == "m"
+        assert all(raw_data.errors == 0.5)
+
+        b = q.Measurement([10, 9.8, 9.9, 10.1, 10.2])
+        with pytest.raises(ValueError):
+            b.raw_data[0] = 0
+        with pytest.warns(UserWarning):
+            assert np.isnan(b.error_weighted_mean)
+
+        with pytest.raises(ValueError):
+            q.Measurement([10, 9.8, 9.9], [0.5, -0.3, 0.1])
+        with pytest.raises(TypeError):
+            q.Measurement([10, "a", 9.9])
+
     def test_correlation_for_repeated_measurements(self):
         """test covariance and correlation settings between repeated measurements"""
 
@@ -196,6 +228,63 @@ class TestMeasuredValue:
         with pytest.raises(IllegalArgumentError):
             q.set_correlation(a, c)
 
+    def test_measurement_accumulator(self):
+        """test accumulating repeated measurements one reading at a time"""
+
+        data, errors = [10, 9.8, 9.9, 10.1, 10.2], [0.5, 0.3, 0.1, 0.2, 0.2]
+        expected = q.Measurement(data, errors)
+
+        a = q.MeasurementAccumulator(unit="m", name="length")
+        for value, error in zip(data[:2], errors[:2]):
+            a.add(value, error)
+        a.extend(data[2:], errors[2:])
+        assert a.count == 5
+        assert a.mean == pytest.approx(expected.mean)
+        assert a.std == pytest.approx(expected.std)
+        assert a.error_on_mean == pytest.approx(expected.error_on_mean)
+        assert a.error_weighted_mean == pytest.approx(expected.error_weighted_mean)
+        assert a.propagated_error == pytest.approx(expected.propagated_error)
+
+        snapshot = a.snapshot()
+        assert isinstance(snapshot, MeasuredValue)
+        assert snapshot.value == pytest.approx(10)
+        assert snapshot.error == pytest.approx(0.0707106781)
+        assert snapshot.name == "length"
+        assert str(snapshot.unit) == "m"
+        a.add(20, 0.1)
+        assert snapshot.value == pytest.approx(10)
+
+        b = q.MeasurementAccumulator()
+        with pytest.warns(UserWarning):
+            assert np.isnan(b.error_weighted_mean)
+        with pytest.raises(UndefinedActionError):
+            b.snapshot()
+        with pytest.raises(UndefinedActionError):
+            b.track_covariance(a)
+        with pytest.raises(ValueError):
+            b.add(1, -1)
+        with pytest.raises(ValueError):
+            b.extend([1, 2], [0.1])
+
+        c, d = q.MeasurementAccumulator(), q.MeasurementAccumulator()
+        c.track_covariance(d)
+        c.add(0.8)
+        c.add(0.9)
+        d.add(2)
+        d.extend([2.2, 2.1])
+        c.extend([1, 1.1])
+        d.add(2.3)
+        assert c.covariance(d) == pytest.approx(0.01333333333)
+        assert d.correlation(c) == pytest.approx(0.8)
+
+        c.set_correlation(d)
+        assert q.get_correlation(c._snapshot, d._snapshot) == pytest.approx(0.8)
+        e, f = c.snapshot(), d.snapshot()
+        assert q.get_correlation(e, f) == 0
+        c.set_covariance(d)
+        assert q.get_covariance(e, f) == pytest.approx(0.01333333333 / 4)
+        assert q.get_correlation(e, f) == pytest.approx(0.8)
+
     def test_correlation_for_single_measurements(self):
         """test covariance and correlation between single measurements"""
 
@@ -209,13 +298,91 @@ class TestMeasuredValue:
         assert a.get_covariance(c) == 0
         assert a.get_correlation(c) == 0
 
-        assert d.get_covariance(a) == 0
-        assert d.get_correlation(a) == 0
-        assert a.get_covariance(d) == 0
-        assert a.get_correlation(d) == 0
-        assert q.get_covariance(a, d) == 0
+        # the covariance with a derived value is found from its derivatives
+        assert d.get_covariance(a) == pytest.approx(0.25)
+        assert d.get_correlation(a) == pytest.approx(0.5 / np.sqrt(0.29))
+        assert a.get_covariance(d) == pytest.approx(0.25)
+        assert a.get_correlation(d) == pytest.approx(0.5 / np.sqrt(0.29))
+        assert q.get_covariance(a, d) == pytest.approx(0.25)
+        assert q.get_correlation(a, d) == pytest.approx(0.5 / np.sqrt(0.29))
+        assert d.get_covariance(c) == 0
+        assert d.get_correlation(c) == 0
+
+    def test_correlated_pairs(self):
+        """test finding the correlated pairs in a list of measurements"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(6, 0.2)
+        c = q.Measurement(7, 0.1)
+        d = q.Measurement(8, 0.4)
+
+        assert find_correlated_pairs([a, b, c, d]) == []
+
+        q.set_correlation(d, a, 0.5)
+        q.set_covariance(b, c, 0.01)
+        assert find_correlated_pairs([a, b, c, d]) == [(0, 3), (1, 2)]
+        assert find_correlated_pairs([c, d, a]) == [(1, 2)]
+        assert find_correlated_pairs([b]) == []
+
+        q.reset_correlations()
+        assert find_correlated_pairs([a, b, c, d]) == []
         assert q.get_correlation(a, d) == 0
 
+    def test_value_ids(self):
+        """test that values are identified by consecutive integers"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(6, 0.2)
+        assert isinstance(a._id, int)
+        assert b._id > a._id
+        assert a._uuid is None
+        assert a.uuid == a.uuid
+        assert a.uuid != b.uuid
+
+    def test_register_cleanup(self):
+        """test that values are removed from the register when no longer used"""
+
+        a = q.Measurement(5, 0.5)
+        b = q.Measurement(6, 0.2)
+        q.set_correlation(a, b, 0.5)
+        a_id, b_id = a._id, b._id
+        assert get_variable_by_id(a_id) is a
+
+        del a
+        gc.collect()
+        assert get_variable_by_id(a_id) is None
+        assert ExperimentalValue._correlations.get(a_id, b_id) is None
+        assert find_correlated_pairs([b]) == []
+
+        with q.session():
+            c = q.Measurement(5, 0.5)
+            d = q.Measurement(4, 0.2)
+            q.set_correlation(c, d, 0.5)
+            with q.session():
+                e = c * d
+            assert get_variable_by_id(e._id) is e
+            assert e.value == 20
+            assert e.error == pytest.approx(np.sqrt(7))
+            assert get_variable_by_id(c._id) is c
+        assert get_variable_by_id(c._id) is c
+        assert q.get_correlation(c, d) == 0
+        assert (c * d).error == pytest.approx(np.sqrt(5))
+        assert get_variable_by_id(b_id) is b
+
+        c_id = c._id
+        del c, e
+        gc.collect()
+        assert get_variable_by_id(c_id) is None
+
+        with q.session():
+            with q.session():
+                pass
+            f = q.Measurement(5, 0.5)
+            g = q.Measurement(4, 0.2)
+            q.set_correlation(f, g, 0.5)
+        assert q.get_correlation(f, g) == 0
+        assert not ExperimentalValue._sessions
+
     def test_illegal_correlation_settings(self):
         """test illegal correlation and covariance settings"""
 
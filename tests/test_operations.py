@@ -223,6 +223,27 @@ class TestArithmetic:
         res = (d ** 2) ** (1 / 3)
         assert res.unit == "m^(2/3)"
 
+    def test_operations_with_numbers(self):
+        """tests the single node built for arithmetic with plain numbers"""
+
+        a = q.Measurement(4, 0.5, unit="m")
+
+        res = 3 - 2 * a
+        assert res.value == -5
+        assert res.error == 1
+        assert res.unit == "m"
+        assert res._formula.operator == "affine"
+        assert res.derivative(a) == -2
+
+        res = q.sind(a * 0 + 30)
+        assert res.value == pytest.approx(0.5)
+        assert len(res._formula.operands[0]._formula.operands) == 3
+
+        # the constants are shared between formulas
+        res1, res2 = a * 2, a * 2
+        assert res1._formula.operands[1] is res2._formula.operands[1]
+        assert res1._formula.operands[1] is not (a * 2.0)._formula.operands[1]
+
 
 class TestMathFunctions:
     """tests for math function wrappers"""
@@ -329,3 +350,112 @@ class TestMathFunctions:
 
         assert q.std(b) == pytest.approx(1.58113883008419)
         assert q.sum(b) == 15
+
+
+class TestColumnOperations:
+    """tests for vectorized operations with measurement columns"""
+
+    FUNCTIONS = [
+        q.sqrt, q.exp, q.sin, q.cos, q.tan, q.sec, q.csc, q.cot,
+        q.log, q.log10, lambda x: q.log(3, x), lambda x: q.log(x, 3), lambda x: -x,
+        lambda x: x + 2, lambda x: 2 - x, lambda x: x * 3, lambda x: 3 / x, lambda x: x ** 2,
+        lambda x: 2 ** x, lambda x: x ** x
+    ]
+
+    def test_column_functions(self):
+        """tests that columns agree with the element-wise calculation for all operators"""
+
+        a = q.MeasurementArray([0.2, 0.4, 0.6], [0.01, 0.02, 0.03], columnar=True)
+        for func in self.FUNCTIONS + [q.asin, q.acos, q.atan]:
+            res = func(a)
+            assert isinstance(res, q.data.columns.DerivedValueColumn)
+            expected = [func(x) for x in a]
+            assert res.values == pytest.approx([x.value for x in expected])
+            assert res.errors == pytest.approx([x.error for x in expected])
+
+    def test_column_arithmetic(self):
+        """tests for arithmetic between columns, measurements and arrays"""
+
+        a = q.MeasurementArray([1, 2, 3, 4], 0.1, unit="m", columnar=True)
+        b = q.Measurement(2, 0.2, unit="s")
+        c = q.Measurement(3, 0.3)
+        b.set_correlation(c, 0.5)
+
+        res = (q.sin(a) * b + c) / a
+        expected = [(q.sin(x) * b + c) / x for x in a]
+        assert res.values == pytest.approx([x.value for x in expected])
+        assert res.errors == pytest.approx([x.error for x in expected])
+
+        res = a / b
+        assert res.unit == "m⋅s^-1"
+        res = [1, 2, 3, 4] * a
+        assert isinstance(res, q.data.columns.DerivedValueColumn)
+        assert res.values == pytest.approx([1, 4, 9, 16])
+        assert res.errors == pytest.approx([0.1, 0.2, 0.3, 0.4])
+
+        # the same measurements held by different columns are recognized
+        res = a * a[::-1]
+        expected = [x * y for x, y in zip(a, a[::-1])]
+        assert res.errors == pytest.approx([x.error for x in expected])
+        assert (a - a[:]).errors == pytest.approx([0, 0, 0, 0])
+        assert (a[[0, 2]] - a[::2]).errors == pytest.approx([0, 0])
+
+        with pytest.raises(ValueError):
+            _ = a + a[:2]
+        with pytest.raises(UndefinedOperationError):
+            _ = a + "a"
+
+    def test_measurement_array_operations(self):
+        """tests that calculations with measurement arrays are done with columns"""
+
+        a = q.MeasurementArray([0.2, 0.4, 0.6], [0.01, 0.02, 0.03], name="x", unit="m")
+        for func in self.FUNCTIONS:
+            res = func(a)
+            assert isinstance(res, q.data.columns.DerivedValueColumn)
+            expected = [func(x) for x in a]
+            assert res.values == pytest.approx([x.value for x in expected])
+            assert res.errors == pytest.approx([x.error for x in expected])
+
+        res = a * 2
+        assert res.unit == "m"
+        assert str(res[1]) == "x_1 = 0.80 +/- 0.04 [m]"
+        assert all((res < 1) == [True, True, False])
+
+        # measurements shared with scalars or other arrays, or correlated with each other
+        b = q.MeasurementArray([1, 2, 3], 0.1)
+        b[1].set_correlation(a[1], 0.5)
+        for res, expected in [(a * a[0], [x * a[0] for x in a]),
+                              (a[1:] - a[:2], [x - y for x, y in zip(a[1:], a[:2])]),
+                              (a + b, [x + y for x, y in zip(a, b)])]:
+            assert res.values == pytest.approx([x.value for x in expected])
+            assert res.errors == pytest.approx([x.error for x in expected])
+
+        res = q.sin(a) + b
+        a[0].value = 0.3
+        assert res.values[0] == pytest.approx(q.sin(0.3) + 1)
+
+        q.set_error_method("monte-carlo")
+        assert isinstance(a + 2, q.MeasurementArray)
+        q.reset_default_configuration()
+
+    def test_derived_column_indexing(self):
+        """tests for accessing elements of a derived column"""
+
+        a = q.MeasurementArray([1, 2, 3, 4], 0.1, columnar=True)
+        b = q.Measurement(2, 0.2)
+        res = a * b + [1, 2, 3, 4]
+
+        element = res[1]
+        assert isinstance(element, q.data.data.DerivedValue)
+        assert element.value == 6
+        assert element.error == pytest.approx(res.errors[1])
+        element.error_method = "monte-carlo"
+        assert element.value == pytest.approx(6, rel=0.05)
+
+        subset = res[1:3]
+        assert subset.values == pytest.approx([6, 9])
+        assert subset.errors == pytest.approx(res.errors[1:3])
+
+        a[1] = 3, 0.2
+        res.recalculate()
+        assert res.values[1] == 8
@@ -35,6 +35,18 @@ class TestSettings:
         sts.set_monte_carlo_sample_size(10000)
         assert sts.get_settings().monte_carlo_sample_size == 10000
 
+        sts.set_monte_carlo_chunk_size(1000)
+        assert sts.get_settings().monte_carlo_chunk_size == 1000
+        sts.set_monte_carlo_chunk_size(0)
+        assert sts.get_settings().monte_carlo_chunk_size == 0
+
+        sts.set_monte_carlo_workers(4, "processes")
+        assert sts.get_settings().monte_carlo_workers == 4
+        assert sts.get_settings().monte_carlo_pool == "processes"
+
+        sts.set_monte_carlo_seed(42)
+        assert sts.get_settings().monte_carlo_seed == 42
+
         sts.set_sig_figs_for_error(4)
         assert sts.get_settings().sig_fig_value == 4
         assert sts.get_settings().sig_fig_mode == SigFigMode.ERROR
@@ -55,6 +67,18 @@ class TestSettings:
         with pytest.raises(ValueError):
             sts.set_monte_carlo_sample_size(-1)
 
+        with pytest.raises(ValueError):
+            sts.set_monte_carlo_chunk_size(-1)
+
+        with pytest.raises(ValueError):
+            sts.set_monte_carlo_workers(0)
+
+        with pytest.raises(ValueError):
+            sts.set_monte_carlo_workers(2, "fibers")
+
+        with pytest.raises(ValueError):
+            sts.set_monte_carlo_seed(-1)
+
         with pytest.raises(ValueError):
             sts.set_plot_dimensions((0, 0))
 
@@ -78,6 +102,10 @@ class TestSettings:
         assert sts.get_settings().sig_fig_mode == SigFigMode.AUTOMATIC
         assert sts.get_settings().sig_fig_value == 1
         assert sts.get_settings().monte_carlo_sample_size == 10000
+        assert sts.get_settings().monte_carlo_chunk_size == 0
+        assert sts.get_settings().monte_carlo_workers == 1
+        assert sts.get_settings().monte_carlo_pool == "threads"
+        assert sts.get_settings().monte_carlo_seed is None
         assert sts.get_settings().unit_style == UnitStyle.EXPONENTS
         assert sts.get_settings().plot_dimensions == (6.4, 4.8)
 
@@ -86,6 +86,16 @@ class TestUtils:
         assert utils.calculate_covariance(
             np.array([1, 2, 3, 4]), np.array([4, 3, 2, 1]))  == pytest.approx(- 5 / 3)
 
+    def test_calculate_weighted_mean(self):
+        """tests the error weighted mean and its propagated error"""
+
+        mean, error = utils.calculate_weighted_mean([10, 11], [0.1, 1])
+        assert mean == pytest.approx(10.00990099009901)
+        assert error == pytest.approx(0.09950371902099892)
+
+        mean, error = utils.calculate_weighted_mean([10, 11], [0, 1])
+        assert np.isnan(mean) and np.isnan(error)
+
     def test_cov2corr(self):
         """test converting covariance matrix to correlation matrix"""
 